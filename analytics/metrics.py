@@ -0,0 +1,79 @@
+import numpy as np
+from utils.clock import interval_to_ms
+
+# 一年的毫秒數 (加密貨幣 24/7，不扣假日)
+YEAR_MS = 365 * 86_400_000
+
+
+def periods_per_year(interval):
+    """ 該 K 線週期一年有幾根 ('1h' -> 8760) """
+    return YEAR_MS / interval_to_ms(interval)
+
+
+def returns_from_equity(equity):
+    """ 資金曲線 -> 每根 K 線的報酬率 (長度少 1) """
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) < 2:
+        return np.zeros(0)
+    prev = equity[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets = np.where(prev != 0, equity[1:] / prev - 1.0, 0.0)
+    return np.nan_to_num(rets)
+
+
+def sharpe_ratio(returns, periods=8760):
+    """ 年化 Sharpe (無風險利率視為 0) """
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) < 2:
+        return 0.0
+    std = returns.std(ddof=1)
+    if std == 0 or np.isnan(std):
+        return 0.0
+    return float(returns.mean() / std * np.sqrt(periods))
+
+
+def sortino_ratio(returns, periods=8760):
+    """ 年化 Sortino (只用下行波動當分母) """
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) < 2:
+        return 0.0
+    downside = np.minimum(returns, 0.0)
+    downside_std = np.sqrt(np.mean(downside ** 2))
+    if downside_std == 0:
+        return 0.0
+    return float(returns.mean() / downside_std * np.sqrt(periods))
+
+
+def drawdown_series(equity):
+    """ 每個時間點距離前高的回撤 (負數或 0) """
+    equity = np.asarray(equity, dtype=float)
+    if len(equity) == 0:
+        return np.zeros(0)
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, equity / peak - 1.0, 0.0)
+    return dd
+
+
+def max_drawdown(equity):
+    """ 最大回撤 (回傳正數，例如 0.25 代表 -25%) """
+    dd = drawdown_series(equity)
+    if len(dd) == 0:
+        return 0.0
+    return float(-dd.min())
+
+
+def summarize(equity, periods=8760, turnover=0.0, trade_count=0):
+    """ 把資金曲線整理成一組績效指標 """
+    equity = np.asarray(equity, dtype=float)
+    rets = returns_from_equity(equity)
+    total_return = float(equity[-1] / equity[0] - 1.0) if len(equity) > 1 and equity[0] != 0 else 0.0
+    return {
+        'total_return': total_return,
+        'sharpe': sharpe_ratio(rets, periods),
+        'sortino': sortino_ratio(rets, periods),
+        'max_drawdown': max_drawdown(equity),
+        'turnover': float(turnover),
+        'trades': int(trade_count),
+        'bars': int(len(equity)),
+    }
@@ -0,0 +1,216 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics import metrics
+from analytics.performance import BUY_SIDES
+
+# 每個 chunk 的報酬矩陣 (路徑數 x 長度) 最多佔用的記憶體
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+METHODS = ('iid', 'block', 'stationary')
+
+
+# ==========================================
+#  報酬序列來源
+# ==========================================
+
+def trade_returns(trades_df, strategy=None):
+    """
+    trades 表 (或 BacktestRecorder.trades_df) -> 每筆完整來回交易的報酬率
+    同一策略內，持倉從 0 開始、回到 0 視為一筆來回，
+    報酬率 = 來回的淨現金流 / 進場名目金額；尚未平倉的最後一段不計入
+    """
+    df = trades_df
+    if strategy is not None:
+        df = df[df['strategy'] == strategy]
+    if df.empty:
+        return np.zeros(0)
+
+    df = df.sort_values(['strategy', 'timestamp'], kind='stable')
+    qty = df['quantity'].to_numpy(dtype=float)
+    price = df['price'].to_numpy(dtype=float)
+    fee = df['fee'].fillna(0).to_numpy(dtype=float) if 'fee' in df.columns else np.zeros(len(df))
+    is_buy = df['side'].isin(BUY_SIDES).to_numpy()
+    signed = np.where(is_buy, qty, -qty)
+
+    frame = pd.DataFrame({
+        'strategy': df['strategy'].to_numpy(),
+        'flow': -signed * price - fee,
+        'entry': np.where(is_buy, qty * price, 0.0),
+        'signed': signed,
+    })
+    # 持倉回到 0 的那一筆是來回的最後一筆，下一筆開始新的來回
+    position = frame.groupby('strategy')['signed'].cumsum().to_numpy()
+    flat = np.isclose(position, 0.0, atol=1e-9)
+    frame['closed'] = flat
+    frame['trip'] = frame.groupby('strategy')['closed'].cumsum().to_numpy() - flat
+
+    trips = frame.groupby(['strategy', 'trip']).agg(flow=('flow', 'sum'), entry=('entry', 'sum'),
+                                                      closed=('closed', 'any'))
+    trips = trips[trips['closed'] & (trips['entry'] > 0)]
+    return (trips['flow'] / trips['entry']).to_numpy(dtype=float)
+
+
+def bar_returns(equity):
+    """ 回測資金曲線 (BacktestResult.equity['equity'] 或 analytics 的 equity_curve) -> 逐根報酬 """
+    return metrics.returns_from_equity(equity)
+
+
+# ==========================================
+#  重抽樣索引 (全部向量化，一次產生整批路徑)
+# ==========================================
+
+def block_indices(rng, n, n_paths, block_len):
+    """ 環狀移動區塊 bootstrap：每條路徑由固定長度的連續區塊拼接，block_len=1 即為 iid """
+    block_len = max(1, min(int(block_len), n))
+    n_blocks = -(-n // block_len)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_len)) % n
+    return idx.reshape(n_paths, -1)[:, :n]
+
+
+def stationary_indices(rng, n, n_paths, mean_block):
+    """
+    Politis-Romano stationary bootstrap：區塊長度服從平均為 mean_block 的幾何分布
+    每個位置以 1/mean_block 的機率開新區塊，否則接續上一個位置 (環狀)
+    實作：找出每個位置所屬區塊的起點 t0，索引 = start[t0] + (t - t0)
+    """
+    p = 1.0 / max(float(mean_block), 1.0)
+    t = np.arange(n)
+    new_block = rng.random((n_paths, n)) < p
+    new_block[:, 0] = True
+    block_start = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+    starts = rng.integers(0, n, size=(n_paths, n))
+    origin = np.take_along_axis(starts, block_start, axis=1)
+    return (origin + (t - block_start)) % n
+
+
+def default_block_len(n):
+    """ 常用的經驗值 n^(1/3) """
+    return max(1, int(round(n ** (1.0 / 3.0))))
+
+
+# ==========================================
+#  路徑統計
+# ==========================================
+
+def path_statistics(paths, periods):
+    """
+    paths: (路徑數 x 長度) 的報酬矩陣，逐列計算
+    回傳 total_return / sharpe / sortino / max_drawdown 四個一維陣列
+    """
+    equity = np.cumprod(1.0 + paths, axis=1)
+    peak = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+    max_dd = -(equity / peak - 1.0).min(axis=1)
+
+    mean = paths.mean(axis=1)
+    std = paths.std(axis=1, ddof=1) if paths.shape[1] > 1 else np.zeros(len(paths))
+    downside = np.sqrt(np.mean(np.minimum(paths, 0.0) ** 2, axis=1))
+    scale = np.sqrt(periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * scale, 0.0)
+        sortino = np.where(downside > 0, mean / downside * scale, 0.0)
+
+    return {
+        'total_return': equity[:, -1] - 1.0,
+        'sharpe': sharpe,
+        'sortino': sortino,
+        'max_drawdown': np.maximum(max_dd, 0.0),
+    }
+
+
+def _simulate_chunk(returns, method, block_len, n_paths, seed, periods):
+    """ worker：產生一批路徑並只回傳每條路徑的統計量 (記憶體只跟 chunk 大小有關) """
+    rng = np.random.default_rng(seed)
+    n = len(returns)
+    if method == 'stationary':
+        idx = stationary_indices(rng, n, n_paths, block_len)
+    else:
+        idx = block_indices(rng, n, n_paths, 1 if method == 'iid' else block_len)
+    return path_statistics(returns[idx], periods)
+
+
+class MonteCarloResult:
+    def __init__(self, stats, observed, method, block_len, elapsed):
+        self.stats = stats
+        self.observed = observed
+        self.method = method
+        self.block_len = block_len
+        self.elapsed = elapsed
+
+    @property
+    def n_paths(self):
+        return len(self.stats)
+
+    def bands(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """ 各指標的分位數 (信賴區間)，index 為分位數 """
+        return self.stats.quantile(list(quantiles))
+
+    def probability(self, column, threshold, above=True):
+        """ 例如 probability('max_drawdown', 0.3) -> 回撤超過 30% 的機率 """
+        values = self.stats[column].to_numpy()
+        return float(np.mean(values > threshold) if above else np.mean(values < threshold))
+
+    def log_report(self, quantiles=(0.05, 0.5, 0.95)):
+        bands = self.bands(quantiles)
+        logging.info(f"[MC] {self.n_paths} 條路徑 | {self.method} (block={self.block_len}) | 耗時 {self.elapsed:.2f}s")
+        for column in ('sharpe', 'max_drawdown', 'total_return'):
+            band = ' / '.join(f"{q:.0%}: {bands.at[q, column]:.4f}" for q in bands.index)
+            logging.info(f"[MC] {column:<13} 實際 {self.observed[column]:.4f} | {band}")
+        logging.info(f"[MC] Sharpe <= 0 的機率: {self.probability('sharpe', 0.0, above=False):.2%}")
+
+
+class MonteCarlo:
+    """
+    報酬序列的平行 bootstrap
+    用法：
+        mc = MonteCarlo(trade_returns(db_trades, 'Strategy9_Mom_VROC_Shock'), periods=trades_per_year)
+        result = mc.run(20000)
+        result.log_report()
+
+    :param method: 'iid' / 'block' (固定長度區塊) / 'stationary' (幾何分布區塊長度)
+    :param block_len: 區塊 (平均) 長度，預設 n^(1/3)
+    :param periods: 年化用的每年期數 (逐根 K 線用 metrics.periods_per_year，逐筆交易用每年交易數)
+    :param chunk_bytes: 每個 chunk 的報酬矩陣上限，決定一次產生多少條路徑
+    """
+
+    def __init__(self, returns, method='stationary', block_len=None, periods=8760,
+                 workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        if method not in METHODS:
+            raise ValueError(f"不支援的抽樣方式: {method}，可用: {METHODS}")
+        self.returns = np.ascontiguousarray(np.nan_to_num(np.asarray(returns, dtype=float)))
+        if len(self.returns) < 2:
+            raise ValueError("報酬序列至少需要 2 筆")
+        self.method = method
+        self.block_len = block_len or default_block_len(len(self.returns))
+        self.periods = periods
+        self.workers = workers or os.cpu_count() or 1
+        # 索引 (int64) + 報酬 + 權益 + 峰值，約為每條路徑 4 個 n x 8 bytes
+        self.chunk_paths = max(1, int(chunk_bytes // (len(self.returns) * 8 * 4)))
+
+    def observed(self):
+        return {k: float(v[0]) for k, v in path_statistics(self.returns[None, :], self.periods).items()}
+
+    def run(self, n_paths=10000, seed=None):
+        started = time.perf_counter()
+        sizes = [min(self.chunk_paths, n_paths - i) for i in range(0, n_paths, self.chunk_paths)]
+        # 每個 chunk 一個獨立的子亂數流，結果與 worker 數量無關
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = (self.returns, self.method, self.block_len)
+
+        if self.workers == 1 or len(sizes) == 1:
+            parts = [_simulate_chunk(*args, size, s, self.periods) for size, s in zip(sizes, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(sizes))) as pool:
+                futures = [pool.submit(_simulate_chunk, *args, size, s, self.periods)
+                           for size, s in zip(sizes, seeds)]
+                parts = [f.result() for f in futures]
+
+        stats = pd.DataFrame({k: np.concatenate([p[k] for p in parts]) for k in parts[0]})
+        return MonteCarloResult(stats, self.observed(), self.method, self.block_len,
+                                time.perf_counter() - started)
@@ -0,0 +1,235 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from analytics import metrics
+from utils.clock import interval_to_ms
+
+# 視為加倉的 side (trades 表的 side 欄位存的是策略動作)
+BUY_SIDES = ('LONG', 'BUY')
+TRADE_COLUMNS = ('timestamp', 'symbol', 'side', 'price', 'quantity', 'fee', 'strategy')
+
+
+class PerformanceAnalyzer:
+    """
+    直接讀 trading_data.db 的 trades / signals / snapshots 計算績效
+    - 全部以 numpy / pandas 向量化運算
+    - update() 只讀 id 比上次大的新資料 (走主鍵)，以及上次處理之後的新 K 線，
+      累積狀態保存在物件內，不會每次重掃整張表
+
+    用法：
+        analyzer = PerformanceAnalyzer(DatabaseHandler("trading_data.db"), 'BTCUSDT', '1h')
+        analyzer.update()
+        print(analyzer.summary())
+        print(analyzer.attribution())
+    """
+
+    def __init__(self, db, symbol='BTCUSDT', interval='1h', initial_capital=1000.0, tz=None):
+        """
+        :param initial_capital: 計算報酬率用的本金 (USDT)
+        :param tz: trades 表 timestamp 的時區 (datetime.now() 寫入，預設為本機時區)
+        """
+        self.db = db
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.initial_capital = float(initial_capital)
+        self.tz = tz or datetime.now().astimezone().tzinfo
+
+        self._last_ids = {'trades': 0, 'signals': 0, 'snapshots': 0}
+        self._last_bar_time = -1
+
+        # 帳戶層級的累積狀態 (所有策略合計)
+        self._total_qty = 0.0
+        self._total_cash = 0.0
+        self._pending_steps = pd.DataFrame(columns=['time', 'qty', 'cash'])
+        self._last_step = (0.0, 0.0)
+
+        # 策略層級的累積狀態
+        self._strategy_state = pd.DataFrame(
+            columns=['trades', 'qty', 'cash', 'fees', 'notional'], dtype=float
+        )
+        self._signal_counts = None
+
+        # 逐根 K 線的資金曲線 (分段累積，讀取時才合併)
+        self._equity_chunks = []
+        self._time_chunks = []
+        self._equity_cache = None
+        self._last_close = None
+
+        self._snapshots = []
+
+    # ==========================================
+    #  增量更新
+    # ==========================================
+
+    def update(self):
+        """ 讀入新資料並更新所有累積狀態，回傳本次新增的 (trades, signals, bars) 筆數 """
+        n_trades = self._update_trades()
+        n_signals = self._update_signals()
+        self._update_snapshots()
+        n_bars = self._update_equity()
+        if n_trades or n_bars:
+            self._equity_cache = None
+        return n_trades, n_signals, n_bars
+
+    def _to_utc_ms(self, timestamps):
+        """ DB 的本地時間字串 -> UTC 毫秒 (與 market_data 的 open_time 同單位) """
+        ts = pd.to_datetime(timestamps, format='ISO8601')
+        if ts.dt.tz is None:
+            ts = ts.dt.tz_localize(self.tz)
+        return (ts.dt.tz_convert('UTC') - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+
+    def _update_trades(self):
+        df = self.db.load_rows_since('trades', self._last_ids['trades'], columns=TRADE_COLUMNS)
+        if df.empty:
+            return 0
+        self._last_ids['trades'] = int(df['id'].max())
+        df = df[df['symbol'] == self.symbol]
+        if df.empty:
+            return 0
+
+        qty = df['quantity'].to_numpy(dtype=float)
+        price = df['price'].to_numpy(dtype=float)
+        fee = df['fee'].fillna(0).to_numpy(dtype=float) if 'fee' in df.columns else np.zeros(len(df))
+        signed = np.where(df['side'].isin(BUY_SIDES).to_numpy(), qty, -qty)
+        flow = -signed * price - fee
+        notional = np.abs(qty * price)
+
+        # 1. 策略歸因：groupby 一次彙總再加到既有狀態上
+        grouped = pd.DataFrame({
+            'strategy': df['strategy'].to_numpy(), 'trades': 1.0, 'qty': signed,
+            'cash': flow, 'fees': fee, 'notional': notional
+        }).groupby('strategy').sum()
+        self._strategy_state = self._strategy_state.add(grouped, fill_value=0.0)
+
+        # 2. 帳戶層級的持倉 / 現金階梯函數 (之後用 merge_asof 對齊到 K 線)
+        steps = pd.DataFrame({
+            'time': self._to_utc_ms(df['timestamp']).to_numpy(),
+            'qty': self._total_qty + np.cumsum(signed),
+            'cash': self._total_cash + np.cumsum(flow),
+        }).sort_values('time', kind='stable')
+        self._total_qty = float(steps['qty'].iloc[-1])
+        self._total_cash = float(steps['cash'].iloc[-1])
+        self._pending_steps = pd.concat([self._pending_steps, steps], ignore_index=True) \
+            if not self._pending_steps.empty else steps
+        return len(df)
+
+    def _update_signals(self):
+        df = self.db.load_rows_since('signals', self._last_ids['signals'], columns=('strategy', 'action'))
+        if df.empty:
+            return 0
+        self._last_ids['signals'] = int(df['id'].max())
+        counts = df.groupby(['strategy', 'action']).size()
+        self._signal_counts = counts if self._signal_counts is None else \
+            self._signal_counts.add(counts, fill_value=0)
+        return len(df)
+
+    def _update_snapshots(self):
+        df = self.db.load_rows_since('snapshots', self._last_ids['snapshots'],
+                                     columns=('timestamp', 'total_balance', 'unrealized_pnl'))
+        if df.empty:
+            return 0
+        self._last_ids['snapshots'] = int(df['id'].max())
+        self._snapshots.append(pd.DataFrame({
+            'time': self._to_utc_ms(df['timestamp']).to_numpy(),
+            'equity': (df['total_balance'].fillna(0) + df['unrealized_pnl'].fillna(0)).to_numpy(dtype=float),
+        }))
+        return len(df)
+
+    def _update_equity(self):
+        """ 只處理上次之後的新 K 線：持倉 x 收盤價 + 現金 = 權益 """
+        bars = self.db.load_market_data_range(self.symbol, self.interval, start_time=self._last_bar_time + 1)
+        if bars.empty:
+            return 0
+
+        close_time = bars['open_time'].to_numpy(dtype='int64') + self.interval_ms
+        close = bars['close'].to_numpy(dtype=float)
+        left = pd.DataFrame({'time': close_time})
+
+        steps = self._pending_steps
+        if steps.empty:
+            qty = np.full(len(bars), self._last_step[0])
+            cash = np.full(len(bars), self._last_step[1])
+        else:
+            steps = steps.astype({'time': 'int64', 'qty': float, 'cash': float})
+            merged = pd.merge_asof(left, steps, on='time', direction='backward')
+            qty = merged['qty'].fillna(self._last_step[0]).to_numpy()
+            cash = merged['cash'].fillna(self._last_step[1]).to_numpy()
+            # 已經被 K 線涵蓋的成交不用再保留，只留最後一階當作下一批的起點
+            consumed = steps['time'].to_numpy() <= close_time[-1]
+            if consumed.any():
+                last = steps[consumed].iloc[-1]
+                self._last_step = (float(last['qty']), float(last['cash']))
+            self._pending_steps = steps[~consumed].reset_index(drop=True)
+
+        self._equity_chunks.append(self.initial_capital + cash + qty * close)
+        self._time_chunks.append(bars['open_time'].to_numpy(dtype='int64'))
+        self._last_bar_time = int(bars['open_time'].iloc[-1])
+        self._last_close = float(close[-1])
+        return len(bars)
+
+    # ==========================================
+    #  查詢
+    # ==========================================
+
+    def equity_curve(self):
+        """ 逐根 K 線的權益 (DataFrame: open_time, equity, drawdown) """
+        if self._equity_cache is None:
+            if not self._equity_chunks:
+                self._equity_cache = pd.DataFrame(columns=['open_time', 'equity', 'drawdown'])
+            else:
+                # 合併後縮成單一 chunk，下次只需要接新的部分
+                equity = np.concatenate(self._equity_chunks)
+                times = np.concatenate(self._time_chunks)
+                self._equity_chunks, self._time_chunks = [equity], [times]
+                self._equity_cache = pd.DataFrame({
+                    'open_time': times, 'equity': equity, 'drawdown': metrics.drawdown_series(equity)
+                })
+        return self._equity_cache
+
+    def snapshot_equity(self):
+        """ snapshots 表記錄的帳戶權益 (餘額 + 未實現損益) """
+        if not self._snapshots:
+            return pd.DataFrame(columns=['time', 'equity'])
+        if len(self._snapshots) > 1:
+            self._snapshots = [pd.concat(self._snapshots, ignore_index=True)]
+        return self._snapshots[0]
+
+    def summary(self):
+        curve = self.equity_curve()
+        equity = np.concatenate(([self.initial_capital], curve['equity'].to_numpy(dtype=float)))
+        state = self._strategy_state
+        result = metrics.summarize(
+            equity,
+            periods=metrics.periods_per_year(self.interval),
+            turnover=state['notional'].sum() / self.initial_capital if not state.empty else 0.0,
+            trade_count=int(state['trades'].sum()) if not state.empty else 0,
+        )
+        result['fees'] = float(state['fees'].sum()) if not state.empty else 0.0
+        result['position'] = self._total_qty
+        return result
+
+    def attribution(self):
+        """
+        各策略的損益歸因 (以最新收盤價計算未平倉部位)
+        pnl = 現金流 (賣出 - 買入 - 手續費) + 剩餘持倉 x 最新收盤價
+        """
+        state = self._strategy_state.copy()
+        if state.empty:
+            return state
+        mark = self._last_close if self._last_close is not None else 0.0
+        state['pnl'] = state['cash'] + state['qty'] * mark
+        state['turnover'] = state['notional'] / self.initial_capital
+        if self._signal_counts is not None:
+            signals = self._signal_counts.unstack(fill_value=0)
+            signals.columns = [f'signals_{c.lower()}' for c in signals.columns]
+            state = state.join(signals, how='left').fillna(0)
+        state.index.name = 'strategy'
+        return state.sort_values('pnl', ascending=False)
+
+    def log_report(self):
+        for key, value in self.summary().items():
+            logging.info(f"[PERF] {key}: {value}")
@@ -0,0 +1,3 @@
+from .engine import BacktestEngine, BacktestDataManager, BacktestResult
+from .executor import BacktestExecutor
+from .recorder import BacktestRecorder
@@ -0,0 +1,164 @@
+import logging
+import time
+import numpy as np
+import pandas as pd
+
+from managers import DataManager, StrategyManager, TradeManager
+from utils.clock import SimulatedClock, interval_to_ms
+from utils.config_loader import ConfigLoader
+from utils.database import DatabaseHandler
+from backtest.executor import BacktestExecutor
+from execution.symbol_rules import SymbolTicks
+from backtest.recorder import BacktestRecorder
+from analytics import metrics
+
+
+class BacktestDataManager(DataManager):
+    """
+    回測版 DataManager
+    一次把整段 market_data 讀進記憶體並用 attach_external_data 對齊外部數據，
+    之後 check_new_candle / update_etl_process 只是在記憶體裡逐根往前推，
+    介面與實盤完全相同，所以 TradingBot.run 的流程可以原封不動地重播
+    """
+
+    def __init__(self, db, symbol, interval, start_time=None, end_time=None, lookback=200):
+        super().__init__(None, db, symbol, interval, fetchers={})
+        self.lookback = lookback
+
+        # start_time 之前的資料也要讀進來，當作第一根 K 線的回看視窗
+        history = db.load_market_data_range(symbol, interval, None, end_time)
+        if not history.empty:
+            history = self.attach_external_data(history.sort_values('open_time'))
+        self.history = history.reset_index(drop=True)
+        self.open_times = self.history['open_time'].values if not self.history.empty else np.zeros(0, dtype=np.int64)
+
+        start = 0
+        if start_time is not None and len(self.open_times):
+            start = int(np.searchsorted(self.open_times, start_time, side='left'))
+        self.start_cursor = start
+        self.cursor = start
+
+    @property
+    def total_bars(self):
+        return max(0, len(self.history) - self.start_cursor)
+
+    def get_history_klines(self, limit=1500):
+        """ 熱機資料：起始點之前的歷史 (多給一根，因為 warm_up_all 會排除最後一根) """
+        end = self.start_cursor + 1
+        return self.history.iloc[max(0, end - limit):end]
+
+    def check_new_candle(self):
+        if self.cursor >= len(self.history):
+            return False, 0, None
+        closed_time = int(self.open_times[self.cursor])
+        return True, closed_time, self.history.iloc[self.cursor:self.cursor + 1]
+
+    def update_etl_process(self, closed_time, df_to_save):
+        """ 回測不需要寫 DB、也不抓外部數據，直接切出策略視窗 """
+        end = self.cursor + 1
+        strategy_df = self.history.iloc[max(0, end - self.lookback):end].reset_index(drop=True)
+        self.cursor = end
+        self.last_processed_time = closed_time
+        return strategy_df
+
+
+class BacktestResult:
+    def __init__(self, equity_df, trades_df, signals_df, summary, elapsed):
+        self.equity = equity_df
+        self.trades = trades_df
+        self.signals = signals_df
+        self.summary = summary
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        s = self.summary
+        return (f"BacktestResult(bars={s['bars']}, return={s['total_return']:.2%}, "
+                f"sharpe={s['sharpe']:.2f}, mdd={s['max_drawdown']:.2%}, trades={s['trades']}, "
+                f"elapsed={self.elapsed:.2f}s)")
+
+
+class BacktestEngine:
+    """
+    事件驅動回測引擎
+    從 SQLite 重播 market_data / external_data，走真正的
+    DataManager -> StrategyManager -> TradeManager 流程，
+    時鐘為 SimulatedClock，所有 sleep 都只是推進模擬時間
+    """
+
+    def __init__(self, symbol, interval, strategy_names, db_name="trading_data.db",
+                 start_time=None, end_time=None, initial_cash=10000.0,
+                 fee_rate=0.0004, slippage_bps=0.0, fixed_amount=100, leverage=1, lookback=200,
+                 symbol_rules=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.initial_cash = initial_cash
+
+        self.clock = SimulatedClock()
+        self.db = DatabaseHandler(db_name)
+        self.recorder = BacktestRecorder(self.clock)
+        # symbol_rules: parse_symbol() 格式的交易規則，有的話成交數量照交易所精度捨去
+        ticks = SymbolTicks(symbol_rules) if symbol_rules else None
+        self.executor = BacktestExecutor(self.clock, initial_cash=initial_cash,
+                                         fee_rate=fee_rate, slippage_bps=slippage_bps, ticks=ticks)
+        config = ConfigLoader.from_dict({
+            'risk': {'leverage': leverage, 'fixed_amount': fixed_amount}
+        })
+
+        self.data_manager = BacktestDataManager(self.db, symbol, interval, start_time, end_time, lookback)
+        self.strategy_manager = StrategyManager(strategy_names)
+        self.trade_manager = TradeManager(
+            None, self.recorder, config, symbol, is_paper=True,
+            executor=self.executor, clock=self.clock, notify=False
+        )
+
+    def run(self, quiet=True):
+        """
+        :param quiet: 回測時關掉 INFO 日誌 (每根 K 線都寫 log 會拖慢好幾倍)
+        """
+        started = time.perf_counter()
+        if quiet:
+            logging.disable(logging.INFO)
+
+        times, equity = [], []
+        try:
+            self.strategy_manager.warm_up_all(self.data_manager.get_history_klines())
+
+            # 與 TradingBot.run 相同的流程，只是沒有 sleep
+            while True:
+                is_new, closed_time, df_to_save = self.data_manager.check_new_candle()
+                if not is_new:
+                    break
+
+                # 時鐘跳到這根 K 線收盤的時間點
+                self.clock.set_time_ms(closed_time + self.interval_ms)
+                strategy_df = self.data_manager.update_etl_process(closed_time, df_to_save)
+                if strategy_df.empty:
+                    continue
+
+                ref_price = strategy_df['close'].iloc[-1]
+                self.executor.mark_to_market(self.symbol, ref_price)
+                self.trade_manager.log_snapshot(ref_price)
+
+                signals = self.strategy_manager.generate_signals(strategy_df)
+                self.trade_manager.process_signals(signals)
+
+                times.append(closed_time)
+                equity.append(self.executor.equity())
+        finally:
+            if quiet:
+                logging.disable(logging.NOTSET)
+
+        elapsed = time.perf_counter() - started
+        equity_df = pd.DataFrame({'open_time': times, 'equity': equity})
+        curve = np.concatenate(([self.initial_cash], equity_df['equity'].values))
+        summary = metrics.summarize(
+            curve,
+            periods=metrics.periods_per_year(self.interval),
+            turnover=self.executor.turnover / self.initial_cash,
+            trade_count=self.executor.fill_count
+        )
+        summary['fees'] = self.executor.total_fees
+
+        logging.info(f"[BACKTEST] {self.symbol} {self.interval} | {summary['bars']} 根 K 線 | 耗時 {elapsed:.2f}s")
+        return BacktestResult(equity_df, self.recorder.trades_df(), self.recorder.signals_df(), summary, elapsed)
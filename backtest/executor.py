@@ -0,0 +1,102 @@
+import logging
+from execution.mock_executor import MockExecutor
+
+
+class BacktestExecutor(MockExecutor):
+    """
+    回測用的成交模擬器 (以 MockExecutor 為基礎)
+    - 不 sleep (latency=0，且搭配 SimulatedClock)
+    - 成交價加入滑價、扣除手續費
+    - 追蹤現金、持倉均價，能算出每根 K 線的權益
+    - 有 ticks 時數量依交易所 step 捨去、低於最小名目金額的單不成交 (與實盤相同)
+    """
+
+    def __init__(self, clock, initial_cash=10000.0, fee_rate=0.0004, slippage_bps=0.0, ticks=None):
+        """
+        :param fee_rate: 手續費率 (幣安 USDT 永續 taker 預設 0.04%)
+        :param slippage_bps: 每筆成交的滑價 (基點)
+        :param ticks: (選填) 該交易對的 SymbolTicks
+        """
+        super().__init__(clock=clock, latency=0)
+        self.ticks = ticks
+        self.cash = float(initial_cash)
+        self.fee_rate = fee_rate
+        self.slippage_bps = slippage_bps
+        self.entry_prices = {}
+        self.marks = {}
+        self.total_fees = 0.0
+        self.turnover = 0.0 # 累計成交金額
+        self.fill_count = 0
+
+    def _fill_price(self, side, market_price):
+        price = super()._fill_price(side, market_price)
+        slip = price * self.slippage_bps / 10000.0
+        return price + slip if side == 'BUY' else price - slip
+
+    def execute_order(self, symbol, side, quantity, reduce_only=False, market_price=None, client_order_id=None):
+        if self.ticks is not None:
+            quantity = float(self.ticks.round_quantities(quantity))
+            if quantity <= 0:
+                return None
+            if not reduce_only and not self.ticks.notional_ok(quantity, market_price or 0.0):
+                return None
+        before = self.positions.get(symbol, 0.0)
+        response = super().execute_order(symbol, side, quantity, reduce_only=reduce_only,
+                                         market_price=market_price, client_order_id=client_order_id)
+        after = self.positions[symbol]
+
+        # reduce_only 可能被截斷，以實際持倉變化為準
+        filled = abs(after - before)
+        if filled <= 0:
+            return None
+        fill_price = self._fill_price(side, market_price)
+        notional = filled * fill_price
+        fee = notional * self.fee_rate
+
+        signed = filled if side == 'BUY' else -filled
+        self.cash -= signed * fill_price + fee
+        self.total_fees += fee
+        self.turnover += notional
+        self.fill_count += 1
+        self._update_entry_price(symbol, before, after, fill_price)
+
+        response['executedQty'] = filled
+        response['cumQuote'] = notional
+        return response
+
+    def _update_entry_price(self, symbol, before, after, fill_price):
+        """ 加倉時更新持倉均價，減倉不變，歸零時清掉 """
+        if after == 0:
+            self.entry_prices.pop(symbol, None)
+        elif before == 0 or (before > 0) != (after > 0):
+            self.entry_prices[symbol] = fill_price
+        elif abs(after) > abs(before):
+            old = self.entry_prices.get(symbol, fill_price)
+            self.entry_prices[symbol] = (old * abs(before) + fill_price * (abs(after) - abs(before))) / abs(after)
+
+    def mark_to_market(self, symbol, price):
+        """ 每根 K 線收盤時由回測引擎更新標記價格 """
+        self.marks[symbol] = price
+
+    def get_position_details(self, symbol):
+        amt = self.positions.get(symbol, 0.0)
+        entry = self.entry_prices.get(symbol, 0.0)
+        mark = self.marks.get(symbol, entry)
+        return {
+            'amt': amt,
+            'entryPrice': entry,
+            'unRealizedProfit': amt * (mark - entry) if amt else 0.0,
+            'leverage': 1
+        }
+
+    def equity(self):
+        """ 權益 = 現金 + 所有持倉的市值 """
+        value = self.cash
+        for symbol, amt in self.positions.items():
+            if amt:
+                value += amt * self.marks.get(symbol, self.entry_prices.get(symbol, 0.0))
+        return value
+
+    def set_leverage(self, symbol, leverage):
+        logging.debug(" [CONFIG] (Backtest) 忽略槓桿設定 %s %sx", symbol, leverage)
+        return {'symbol': symbol, 'leverage': leverage}
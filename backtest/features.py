@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import indicators as ind
+
+
+class FeatureCache:
+    """
+    在整段歷史上計算因子，並依 (因子名稱, 參數) 快取
+    參數掃描時，不同組參數常常共用同一個中間因子 (例如 mad(10)、同一個 window 的分位數)，
+    同一個 worker 內只會算一次
+
+    注意：這裡是在「整段歷史」上一次算完，實盤則是每根 K 線用最近 200 根重算；
+    兩者對 SMA / 分位數這類只看過去的因子是等價的 (OBV 只差一個常數位移，不影響比較)
+    """
+
+    def __init__(self, open_time, open_, high, low, close, volume, max_entries=512):
+        self.open_time = open_time
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.close)
+
+    def _get(self, key, compute):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+        self.misses += 1
+        value = compute()
+        self._cache[key] = value
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return value
+
+    # ==========================================
+    #  基礎因子 (全部走 AlphaLibrary，與策略一致)
+    # ==========================================
+
+    def mad(self, period):
+        return self._get(('mad', period), lambda: ind.AlphaLibrary.calc_mad(self.close, window=period))
+
+    def bs_ratio(self):
+        return self._get(('bs_ratio',), lambda: ind.AlphaLibrary.calc_bs_ratio(self.high, self.low, self.close))
+
+    def atr(self, window):
+        return self._get(('atr', window), lambda: ind.AlphaLibrary.calc_custom_atr(self.high, self.low, self.close, window))
+
+    def obv(self, window):
+        return self._get(('obv', window), lambda: ind.AlphaLibrary.calc_smooth_obv(self.close, self.volume, window))
+
+    def momentum(self, period, smooth):
+        return self._get(('momentum', period, smooth),
+                         lambda: ind.AlphaLibrary.calc_smooth_momentum(self.close, mom_period=period, smooth_period=smooth))
+
+    def vroc(self, period):
+        return self._get(('vroc', period), lambda: ind.AlphaLibrary.calc_vroc(self.volume, window=period))
+
+    def feature(self, spec):
+        """ 用 spec 取得因子，例如 ('mad', 10) -> self.mad(10) """
+        name, *args = spec
+        return getattr(self, name)(*args)
+
+    def sma(self, spec, window):
+        """ 對另一個因子取 SMA """
+        return self._get(('sma', spec, window), lambda: ind.AlphaLibrary.calc_sma(self.feature(spec), window))
+
+    def volume_sma_diff(self, window):
+        return self._get(('volume_sma_diff', window), lambda: ind.AlphaLibrary.calc_difference(
+            ind.AlphaLibrary.calc_sma(self.volume, window)))
+
+    def quantile(self, spec, window, q):
+        """ 對另一個因子取滾動分位數 (參數掃描中最常被重複使用的中間結果) """
+        return self._get(('quantile', spec, window, q),
+                         lambda: ind.AlphaLibrary.calc_rolling_quantile(self.feature(spec), window, q))
+
+    def us_market_open(self):
+        """ 向量化版的 add_us_market_open_flag (美東 09:00 - 16:00，週一到週五) """
+        def compute():
+            ts = pd.to_datetime(self.open_time.astype('int64'), unit='ms', utc=True).tz_convert('US/Eastern')
+            minutes = ts.hour * 60 + ts.minute
+            is_open = (ts.weekday < 5) & (minutes >= 9 * 60) & (minutes <= 16 * 60)
+            return np.asarray(is_open, dtype=bool)
+        return self._get(('us_market_open',), compute)
@@ -0,0 +1,61 @@
+import json
+import sqlite3
+import pandas as pd
+from utils.database import DatabaseHandler
+
+
+class BacktestRecorder:
+    """
+    給回測用的 "假 DB"
+    介面與 DatabaseHandler 的 log_signal / log_trade / log_snapshot 相同，
+    但只寫進記憶體 (每筆都開關 SQLite 連線太慢)，時間戳記來自模擬時鐘
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.signals = []
+        self.trades = []
+        self.snapshots = []
+
+    def log_trade(self, strategy, symbol, side, price, quantity, order_id, notional):
+        self.trades.append((self.clock.now(), symbol, strategy, side, price, quantity, notional, order_id))
+
+    def log_signal(self, strategy, symbol, action, price, reason):
+        self.signals.append((self.clock.now(), strategy, symbol, action, price, reason))
+
+    def log_snapshot(self, balance, unrealized_pnl, btc_price, positions):
+        self.snapshots.append((self.clock.now(), balance, unrealized_pnl, btc_price, json.dumps(positions)))
+
+    def load_strategy_positions(self, symbol):
+        """ 回測從空手開始 """
+        return {}
+
+    def trades_df(self):
+        return pd.DataFrame(self.trades, columns=[
+            'timestamp', 'symbol', 'strategy', 'side', 'price', 'quantity', 'notional', 'order_id'
+        ])
+
+    def signals_df(self):
+        return pd.DataFrame(self.signals, columns=[
+            'timestamp', 'strategy', 'symbol', 'action', 'signal_price', 'reason'
+        ])
+
+    def save(self, db_name):
+        """ 回測結束後一次批量寫入 (表結構與實盤 trading_data.db 相同，方便共用分析工具) """
+        DatabaseHandler(db_name) # 確保表已建立
+        conn = sqlite3.connect(db_name)
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO trades (timestamp, symbol, strategy, side, price, quantity, notional, order_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', self.trades)
+        cursor.executemany('''
+            INSERT INTO signals (timestamp, strategy, symbol, action, signal_price, reason)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', self.signals)
+        cursor.executemany('''
+            INSERT INTO snapshots (timestamp, total_balance, unrealized_pnl, btc_price, positions_json)
+            VALUES (?, ?, ?, ?, ?)
+        ''', self.snapshots)
+        conn.commit()
+        conn.close()
@@ -0,0 +1,177 @@
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from analytics import metrics
+from backtest.features import FeatureCache
+from backtest.vectorized import SIGNAL_SPECS, default_params, evaluate
+
+OHLCV_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+
+
+class SharedOHLCV:
+    """
+    把 OHLCV 放進一塊 SharedMemory (6 x n 的 float64)
+    worker 只拿到名稱與長度，直接 attach 成 numpy view，不需要 pickle 整份資料
+    """
+
+    def __init__(self, df):
+        data = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64).T.copy()
+        self.length = data.shape[1]
+        self.shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        view = np.ndarray(data.shape, dtype=np.float64, buffer=self.shm.buf)
+        view[:] = data
+
+    @property
+    def handle(self):
+        return (self.shm.name, self.length)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- worker 端的全域狀態 (每個 process 一份) ---
+_worker = {}
+
+
+def attach_shared(handle):
+    """ ProcessPoolExecutor 的 initializer：attach 共享記憶體並建立該 process 的 FeatureCache """
+    name, length = handle
+    shm = shared_memory.SharedMemory(name=name)
+    arrays = np.ndarray((len(OHLCV_COLUMNS), length), dtype=np.float64, buffer=shm.buf)
+    _worker['shm'] = shm # 保留參照，避免被回收
+    _worker['features'] = FeatureCache(*arrays)
+
+
+def worker_features():
+    return _worker['features']
+
+
+def _evaluate_chunk(strategy_name, param_sets, start, end, fee_rate, periods):
+    fc = worker_features()
+    rows = []
+    for params in param_sets:
+        try:
+            result, _ = evaluate(fc, strategy_name, params, start, end, fee_rate, periods)
+        except Exception as e:
+            logging.error(f"[SWEEP] 參數 {params} 評估失敗: {e}")
+            continue
+        rows.append({**params, **result})
+    return rows
+
+
+def grid(param_grid):
+    """ {'window': [25, 50], 'th1': [0.7, 0.8]} -> 所有組合 """
+    keys = list(param_grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def random_search(param_space, n, seed=None):
+    """
+    隨機抽樣參數
+    param_space 的值可以是 list (從中挑一個) 或 (low, high) tuple
+    (兩端都是 int 就抽整數，否則抽浮點數並取到小數第 2 位)
+    """
+    rng = random.Random(seed)
+    samples, seen = [], set()
+    attempts = 0
+    while len(samples) < n and attempts < n * 20:
+        attempts += 1
+        params = {}
+        for key, space in param_space.items():
+            if isinstance(space, tuple):
+                low, high = space
+                if isinstance(low, int) and isinstance(high, int):
+                    params[key] = rng.randint(low, high)
+                else:
+                    params[key] = round(rng.uniform(low, high), 2)
+            else:
+                params[key] = rng.choice(list(space))
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            samples.append(params)
+    return samples
+
+
+def _chunk(param_sets, chunk_size):
+    """
+    依參數排序後切塊：共用同一組因子參數的組合會被排在一起，
+    送到同一個 worker 時 FeatureCache 的命中率最高
+    """
+    ordered = sorted(param_sets, key=lambda p: tuple(sorted((k, str(v)) for k, v in p.items())))
+    return [ordered[i:i + chunk_size] for i in range(0, len(ordered), chunk_size)]
+
+
+class ParameterSweep:
+    """
+    多核心參數掃描
+    用法：
+        sweep = ParameterSweep('PriceVolume9', df, interval='1h')
+        table = sweep.run(grid({'window': [60, 90, 120], 'th1': [0.7, 0.8, 0.9]}))
+        sweep.save(table, 'sweep_pv9.csv')
+    """
+
+    def __init__(self, strategy_name, ohlcv_df, interval='1h', fee_rate=0.0004, workers=None):
+        if strategy_name not in SIGNAL_SPECS:
+            raise KeyError(f"策略 {strategy_name} 沒有向量化規格，可用: {list(SIGNAL_SPECS.keys())}")
+        self.strategy_name = strategy_name
+        self.df = ohlcv_df.sort_values('open_time').reset_index(drop=True)
+        self.interval = interval
+        self.fee_rate = fee_rate
+        self.workers = workers or os.cpu_count() or 1
+
+    def run(self, param_sets, metric='sharpe', start=0, end=None, chunk_size=None):
+        """ 平行評估所有參數組合，回傳依 metric 由高到低排序的結果表 """
+        if not param_sets:
+            return pd.DataFrame()
+        started = time.perf_counter()
+        periods = metrics.periods_per_year(self.interval)
+        chunk_size = chunk_size or max(1, min(64, len(param_sets) // (self.workers * 4) or 1))
+        chunks = _chunk(param_sets, chunk_size)
+
+        rows = []
+        with SharedOHLCV(self.df) as shared:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_shared,
+                                     initargs=(shared.handle,)) as pool:
+                futures = [
+                    pool.submit(_evaluate_chunk, self.strategy_name, chunk, start, end, self.fee_rate, periods)
+                    for chunk in chunks
+                ]
+                for future in futures:
+                    rows.extend(future.result())
+
+        table = rank(pd.DataFrame(rows), metric)
+        logging.info(f"[SWEEP] {self.strategy_name} | {len(param_sets)} 組參數 | "
+                     f"{self.workers} 核心 | 耗時 {time.perf_counter() - started:.2f}s")
+        return table
+
+    def defaults(self):
+        return default_params(self.strategy_name)
+
+    @staticmethod
+    def save(table, path):
+        table.to_csv(path, index_label='rank')
+        logging.info(f"[SWEEP] 結果已寫入 {path}")
+
+
+def rank(table, metric='sharpe'):
+    if table.empty:
+        return table
+    table = table.sort_values(metric, ascending=False).reset_index(drop=True)
+    table.index = table.index + 1
+    return table
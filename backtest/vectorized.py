@@ -0,0 +1,142 @@
+import numpy as np
+from analytics import metrics
+
+# ==========================================
+#  向量化訊號規格
+#  每個策略對應：(預設參數, 最少 K 線數, 訊號函數)
+#  訊號函數輸入 FeatureCache 與參數，回傳整段歷史的 (long, exit) 布林陣列
+#  邏輯與 strategies/ 內各策略的 generate_signal 逐條對應
+# ==========================================
+
+
+def _pv1(fc, p):
+    mad_spec = ('mad', p['mad_ma_period'])
+    mad, bs = fc.feature(mad_spec), fc.bs_ratio()
+    mad_th = fc.quantile(mad_spec, p['window'], p['th1'])
+    bs_th = fc.quantile(('bs_ratio',), p['window'], p['th2'])
+    trade_time = fc.us_market_open()
+    long = (mad > mad_th) & (bs > bs_th) & trade_time
+    exit_ = ((mad < mad_th) | (bs < bs_th)) & trade_time
+    return long, exit_
+
+
+def _pv2(fc, p):
+    atr_spec, obv_spec = ('atr', p['atr_window']), ('obv', p['obv_window'])
+    atr, obv = fc.feature(atr_spec), fc.feature(obv_spec)
+    obv_ma = fc.sma(obv_spec, p['signal_obv_ma'])
+    atr_ma = fc.sma(atr_spec, p['signal_atr_ma'])
+    long = (obv > obv_ma) & (atr > atr_ma)
+    exit_ = (obv < obv_ma) | (atr < atr_ma)
+    return long, exit_
+
+
+def _two_factor(spec1_fn, spec2_fn, exit_any):
+    """
+    產生 "因子 A > 分位數(th1) 且 因子 B > 分位數(th2)" 這一類策略的訊號函數
+    exit_any=True 代表出場條件是 OR，否則為 AND
+    """
+    def signal(fc, p):
+        spec1, spec2 = spec1_fn(p), spec2_fn(p)
+        f1, f2 = fc.feature(spec1), fc.feature(spec2)
+        th1 = fc.quantile(spec1, p['window'], p['th1'])
+        th2 = fc.quantile(spec2, p['window'], p['th2'])
+        long = (f1 > th1) & (f2 > th2)
+        if exit_any:
+            exit_ = (f1 < th1) | (f2 < th2)
+        else:
+            exit_ = (f1 < th1) & (f2 < th2)
+        return long, exit_
+    return signal
+
+
+def _pv10(fc, p):
+    diff_spec = ('volume_sma_diff', p['mean_window'])
+    diff = fc.feature(diff_spec)
+    upper = fc.quantile(diff_spec, p['upper_window'], p['upper_q'])
+    lower = fc.quantile(diff_spec, p['lower_window'], p['lower_q'])
+    not_us_time = ~fc.us_market_open()
+    long = (diff < lower) & not_us_time
+    exit_ = (diff > upper) & not_us_time
+    return long, exit_
+
+
+SIGNAL_SPECS = {
+    'PriceVolume1': ({'window': 25, 'th1': 0.8, 'th2': 0.9, 'mad_ma_period': 10}, 50, _pv1),
+    'PriceVolume2': ({'atr_window': 16, 'obv_window': 20, 'signal_obv_ma': 5, 'signal_atr_ma': 30}, 60, _pv2),
+    'PriceVolume3': ({'window': 90, 'th1': 0.9, 'th2': 0.3, 'mad_period': 10, 'obv_smooth': 20}, 120,
+                     _two_factor(lambda p: ('mad', p['mad_period']), lambda p: ('obv', p['obv_smooth']), True)),
+    'PriceVolume4': ({'window': 250, 'th1': 0.8, 'th2': 0.8, 'obv_smooth': 20, 'vroc_period': 10}, 300,
+                     _two_factor(lambda p: ('obv', p['obv_smooth']), lambda p: ('vroc', p['vroc_period']), False)),
+    'PriceVolume5': ({'window': 25, 'th1': 0.9, 'th2': 0.7, 'atr_window': 16, 'mom_period': 10, 'mom_smooth': 5}, 60,
+                     _two_factor(lambda p: ('atr', p['atr_window']),
+                                 lambda p: ('momentum', p['mom_period'], p['mom_smooth']), False)),
+    'PriceVolume6': ({'window': 30, 'th1': 0.9, 'th2': 0.9, 'atr_window': 16, 'obv_smooth': 20}, 60,
+                     _two_factor(lambda p: ('atr', p['atr_window']), lambda p: ('obv', p['obv_smooth']), False)),
+    'PriceVolume7': ({'window': 25, 'th1': 0.7, 'th2': 0.1, 'mom_period': 10, 'mom_smooth': 5, 'mad_period': 10}, 60,
+                     _two_factor(lambda p: ('momentum', p['mom_period'], p['mom_smooth']),
+                                 lambda p: ('mad', p['mad_period']), False)),
+    'PriceVolume8': ({'window': 30, 'th1': 0.7, 'th2': 0.9, 'mad_period': 10}, 60,
+                     _two_factor(lambda p: ('mad', p['mad_period']), lambda p: ('bs_ratio',), False)),
+    'PriceVolume9': ({'window': 90, 'th1': 0.8, 'th2': 0.9, 'mom_period': 10, 'mom_smooth': 5, 'vroc_period': 10}, 120,
+                     _two_factor(lambda p: ('momentum', p['mom_period'], p['mom_smooth']),
+                                 lambda p: ('vroc', p['vroc_period']), False)),
+    'PriceVolume10': ({'mean_window': 15, 'upper_window': 60, 'upper_q': 0.8, 'lower_window': 100, 'lower_q': 0.2}, 150,
+                      _pv10),
+}
+
+
+def default_params(strategy_name):
+    if strategy_name not in SIGNAL_SPECS:
+        raise KeyError(f"策略 {strategy_name} 沒有向量化規格，可用: {list(SIGNAL_SPECS.keys())}")
+    return dict(SIGNAL_SPECS[strategy_name][0])
+
+
+def signal_arrays(fc, strategy_name, params):
+    """ 回傳整段歷史的 (long, exit) 布林陣列，前 min_bars 根 (策略會 return None) 一律為 False """
+    defaults, min_bars, fn = SIGNAL_SPECS[strategy_name]
+    long, exit_ = fn(fc, {**defaults, **params})
+    long, exit_ = long.copy(), exit_.copy()
+    warmup = min(min_bars - 1, len(long))
+    long[:warmup] = False
+    exit_[:warmup] = False
+    return long, exit_
+
+
+def positions_from_signals(long, exit_):
+    """
+    把 LONG / CLOSE 事件轉成持倉 (1 = 持有, 0 = 空手)
+    與 TradeManager 一致：LONG 優先，空手才開倉、持倉才平倉，沒有訊號就維持原狀
+    等同 "最後一個事件是 LONG 就持有"，用 maximum.accumulate 做 forward fill
+    """
+    n = len(long)
+    event = np.where(long, 1, np.where(exit_, 0, -1))
+    idx = np.where(event >= 0, np.arange(n), -1)
+    last = np.maximum.accumulate(idx)
+    return np.where(last >= 0, event[np.maximum(last, 0)], 0).astype(float)
+
+
+def evaluate(fc, strategy_name, params, start=0, end=None, fee_rate=0.0004, periods=8760):
+    """
+    在 [start, end) 的 K 線區間評估一組參數
+    第 t 根收盤出訊號、以收盤價成交，持倉吃到第 t+1 根的報酬，每次換倉扣手續費
+    (以單位曝險計算報酬，方便不同參數之間比較)
+    """
+    end = len(fc) if end is None else end
+    long, exit_ = signal_arrays(fc, strategy_name, params)
+    pos = positions_from_signals(long[start:end], exit_[start:end])
+
+    close = fc.close[start:end]
+    bar_ret = np.zeros(len(close))
+    bar_ret[1:] = close[1:] / close[:-1] - 1.0
+
+    held = np.concatenate(([0.0], pos[:-1]))
+    changes = np.abs(np.diff(np.concatenate(([0.0], pos))))
+    strat_ret = held * bar_ret - changes * fee_rate
+
+    equity = np.cumprod(1.0 + strat_ret)
+    result = metrics.summarize(
+        np.concatenate(([1.0], equity)), periods=periods,
+        turnover=changes.sum(), trade_count=int(changes.sum())
+    )
+    result['exposure'] = float(held.mean()) if len(held) else 0.0
+    return result, strat_ret
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics import metrics
+from backtest.sweep import SharedOHLCV, attach_shared, worker_features
+from backtest.vectorized import SIGNAL_SPECS, evaluate
+
+
+def make_folds(n_bars, train_bars, test_bars, step=None):
+    """
+    滾動切分 (in-sample, out-of-sample)
+    回傳 [(train_start, train_end, test_start, test_end), ...]，皆為 K 線索引 (左閉右開)
+    step 預設等於 test_bars，讓每段 OOS 首尾相接、不重疊
+    """
+    step = step or test_bars
+    folds = []
+    start = 0
+    while start + train_bars + test_bars <= n_bars:
+        train_end = start + train_bars
+        folds.append((start, train_end, train_end, train_end + test_bars))
+        start += step
+    return folds
+
+
+class FoldCache:
+    """
+    以 (策略, 參數, 資料區間) 為 key 快取評估結果 (SQLite)
+    區間用 open_time (毫秒) 表示，資料庫之後多了新 K 線也不會讓舊的 key 失效，重跑時只算新的 fold
+    """
+
+    def __init__(self, db_name="backtest_cache.db"):
+        self.db_name = db_name
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fold_cache (
+                key TEXT PRIMARY KEY,
+                strategy TEXT,
+                params_json TEXT,
+                start_time INTEGER,
+                end_time INTEGER,
+                result_json TEXT
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def make_key(strategy, params, symbol, interval, start_time, end_time, fee_rate):
+        raw = json.dumps([strategy, sorted(params.items()), symbol, interval,
+                          int(start_time), int(end_time), fee_rate], default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        conn = sqlite3.connect(self.db_name)
+        found = {}
+        keys = list(keys)
+        # SQLite 單次參數上限約 999，分批查詢
+        for i in range(0, len(keys), 900):
+            batch = keys[i:i + 900]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT key, result_json FROM fold_cache WHERE key IN ({placeholders})', batch
+            ).fetchall()
+            found.update({k: json.loads(v) for k, v in rows})
+        conn.close()
+        return found
+
+    def put_many(self, rows):
+        """ rows: [(key, strategy, params, start_time, end_time, result), ...] """
+        if not rows:
+            return
+        conn = sqlite3.connect(self.db_name)
+        conn.executemany('''
+            INSERT OR REPLACE INTO fold_cache (key, strategy, params_json, start_time, end_time, result_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(k, s, json.dumps(p, default=str), st, et, json.dumps(r)) for k, s, p, st, et, r in rows])
+        conn.commit()
+        conn.close()
+
+
+def _run_fold(strategy_name, param_sets, fold, keys, cached, metric, fee_rate, periods):
+    """
+    worker：在 in-sample 區間挑出最佳參數，再拿到 out-of-sample 驗證
+    keys / cached 由主程序預先查好，worker 不碰 SQLite，只把新算的結果帶回去
+    """
+    fc = worker_features()
+    train_start, train_end, test_start, test_end = fold
+    new_entries = []
+
+    def run(params, start, end, key):
+        if key in cached:
+            return cached[key]
+        result, _ = evaluate(fc, strategy_name, params, start, end, fee_rate, periods)
+        new_entries.append((key, result))
+        return result
+
+    best_params, best_is = None, None
+    for params, (is_key, _) in zip(param_sets, keys):
+        result = run(params, train_start, train_end, is_key)
+        if best_is is None or result[metric] > best_is[metric]:
+            best_params, best_is = params, result
+
+    oos_key = keys[param_sets.index(best_params)][1]
+    best_oos = run(best_params, test_start, test_end, oos_key)
+
+    # 串接 OOS 資金曲線用的逐根報酬 (單次評估，成本很低)
+    _, oos_returns = evaluate(fc, strategy_name, best_params, test_start, test_end, fee_rate, periods)
+    return {
+        'fold': fold,
+        'best_params': best_params,
+        'in_sample': best_is,
+        'out_of_sample': best_oos,
+        'oos_returns': oos_returns,
+        'new_entries': new_entries,
+    }
+
+
+class WalkForward:
+    """
+    平行 walk-forward 最佳化
+    每個 fold 是一個獨立任務 (in-sample 掃參數 -> out-of-sample 驗證)，丟進 process pool 同時跑
+    """
+
+    def __init__(self, strategy_name, ohlcv_df, symbol='BTCUSDT', interval='1h', fee_rate=0.0004,
+                 workers=None, cache_db="backtest_cache.db"):
+        if strategy_name not in SIGNAL_SPECS:
+            raise KeyError(f"策略 {strategy_name} 沒有向量化規格，可用: {list(SIGNAL_SPECS.keys())}")
+        self.strategy_name = strategy_name
+        self.df = ohlcv_df.sort_values('open_time').reset_index(drop=True)
+        self.open_times = self.df['open_time'].values.astype('int64')
+        self.symbol = symbol
+        self.interval = interval
+        self.fee_rate = fee_rate
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = FoldCache(cache_db) if cache_db else None
+
+    def _range_times(self, start, end):
+        return int(self.open_times[start]), int(self.open_times[end - 1])
+
+    def _fold_keys(self, param_sets, fold):
+        train_start, train_end, test_start, test_end = fold
+        is_range = self._range_times(train_start, train_end)
+        oos_range = self._range_times(test_start, test_end)
+        return [
+            (FoldCache.make_key(self.strategy_name, p, self.symbol, self.interval, *is_range, self.fee_rate),
+             FoldCache.make_key(self.strategy_name, p, self.symbol, self.interval, *oos_range, self.fee_rate))
+            for p in param_sets
+        ]
+
+    def run(self, param_sets, train_bars, test_bars, step=None, metric='sharpe'):
+        started = time.perf_counter()
+        folds = make_folds(len(self.df), train_bars, test_bars, step)
+        if not folds or not param_sets:
+            logging.warning("[WFO] 資料長度不足以切出任何 fold")
+            return WalkForwardReport(self.strategy_name, [], self.interval, metric)
+
+        periods = metrics.periods_per_year(self.interval)
+        fold_keys = [self._fold_keys(param_sets, fold) for fold in folds]
+        all_keys = {k for keys in fold_keys for pair in keys for k in pair}
+        cached = self.cache.get_many(all_keys) if self.cache else {}
+
+        results = []
+        with SharedOHLCV(self.df) as shared:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=attach_shared,
+                                     initargs=(shared.handle,)) as pool:
+                futures = []
+                for fold, keys in zip(folds, fold_keys):
+                    fold_cached = {k: cached[k] for pair in keys for k in pair if k in cached}
+                    futures.append(pool.submit(_run_fold, self.strategy_name, param_sets, fold, keys,
+                                               fold_cached, metric, self.fee_rate, periods))
+                for future in futures:
+                    results.append(future.result())
+
+        # 寫回快取 (只由主程序寫，避免多個 process 同時寫 SQLite)
+        if self.cache:
+            rows = []
+            for res, keys in zip(results, fold_keys):
+                fold = res['fold']
+                is_range, oos_range = self._range_times(*fold[:2]), self._range_times(*fold[2:])
+                key_to_params = {}
+                for params, (is_key, oos_key) in zip(param_sets, keys):
+                    key_to_params[is_key] = (params, is_range)
+                    key_to_params[oos_key] = (params, oos_range)
+                for key, result in res['new_entries']:
+                    params, (st, et) = key_to_params[key]
+                    rows.append((key, self.strategy_name, params, st, et, result))
+            self.cache.put_many(rows)
+
+        new_count = sum(len(r['new_entries']) for r in results)
+        total = len(folds) * (len(param_sets) + 1)
+        logging.info(f"[WFO] {self.strategy_name} | {len(folds)} folds x {len(param_sets)} 組參數 | "
+                     f"新計算 {new_count}/{total} | 耗時 {time.perf_counter() - started:.2f}s")
+        return WalkForwardReport(self.strategy_name, results, self.interval, metric, self.open_times)
+
+
+class WalkForwardReport:
+    """ 把各 fold 的結果彙整成一份報告 """
+
+    def __init__(self, strategy_name, fold_results, interval, metric, open_times=None):
+        self.strategy_name = strategy_name
+        self.fold_results = fold_results
+        self.interval = interval
+        self.metric = metric
+        self.open_times = open_times
+
+    def folds_table(self):
+        rows = []
+        for i, res in enumerate(self.fold_results, start=1):
+            train_start, train_end, test_start, test_end = res['fold']
+            row = {'fold': i}
+            if self.open_times is not None:
+                row['train_from'] = pd.to_datetime(self.open_times[train_start], unit='ms')
+                row['test_from'] = pd.to_datetime(self.open_times[test_start], unit='ms')
+                row['test_to'] = pd.to_datetime(self.open_times[test_end - 1], unit='ms')
+            row['params'] = json.dumps(res['best_params'], default=str)
+            for k in ('sharpe', 'total_return', 'max_drawdown'):
+                row[f'is_{k}'] = res['in_sample'][k]
+                row[f'oos_{k}'] = res['out_of_sample'][k]
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        """
+        彙整指標：
+        - oos_*：所有 OOS 區間串接成一條資金曲線後的績效
+        - efficiency：平均 OOS / 平均 IS (遠小於 1 代表參數過擬合)
+        - param_changes：相鄰 fold 之間最佳參數改變的次數 (越多代表越不穩定)
+        """
+        if not self.fold_results:
+            return {}
+        oos_returns = np.concatenate([r['oos_returns'] for r in self.fold_results])
+        equity = np.concatenate(([1.0], np.cumprod(1.0 + oos_returns)))
+        stitched = metrics.summarize(
+            equity, periods=metrics.periods_per_year(self.interval),
+            turnover=sum(r['out_of_sample']['turnover'] for r in self.fold_results),
+            trade_count=sum(r['out_of_sample']['trades'] for r in self.fold_results)
+        )
+
+        is_scores = np.array([r['in_sample'][self.metric] for r in self.fold_results])
+        oos_scores = np.array([r['out_of_sample'][self.metric] for r in self.fold_results])
+        params = [json.dumps(r['best_params'], sort_keys=True, default=str) for r in self.fold_results]
+        return {
+            'strategy': self.strategy_name,
+            'folds': len(self.fold_results),
+            f'mean_is_{self.metric}': float(is_scores.mean()),
+            f'mean_oos_{self.metric}': float(oos_scores.mean()),
+            'efficiency': float(oos_scores.mean() / is_scores.mean()) if is_scores.mean() else 0.0,
+            'oos_positive_folds': int((oos_scores > 0).sum()),
+            'param_changes': int(sum(a != b for a, b in zip(params, params[1:]))),
+            **{f'oos_{k}': v for k, v in stitched.items()},
+        }
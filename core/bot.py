@@ -1,37 +1,180 @@
 import os
 import time
 import logging
-import traceback
-from binance.um_futures import UMFutures
+import threading
+import functools
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from utils.binance_client import create_client
 from utils.database import DatabaseHandler
 from utils.notifier import send_tg_msg
+from execution.user_stream import UserDataStream, STREAM_URLS
+from execution.fill_tracker import FillTracker
+from execution.binance_executor import BinanceExecutor
+from execution.mock_executor import MockExecutor
+from execution.symbol_rules import SymbolRulesCache
+from execution.account_book import AccountBook
+from execution.order_journal import OrderJournal
+from execution.maker_execution import MakerExecution
+from data_sources.registry import get_all_fetchers
+from utils.clock import ServerClock, interval_to_ms, interval_offset_ms
+from utils.tracing import tracer, bar_id
+from utils.metrics import start_metrics_server, LOOP_LAG
+from core.scheduler import CandleScheduler
+from core.startup import StartupReport
+from core.events import EventBus, CandleClosed, FeaturesReady, Signal, OrderFilled
 
 # 引入三大經理
 from managers import DataManager, StrategyManager, TradeManager
 
+
+class TradingPair:
+    """ 一組 (交易對, K 線週期)：各自的資料管線、策略與處理進度 """
+
+    def __init__(self, symbol, interval, data_manager, strategy_manager):
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.offset_ms = interval_offset_ms(interval)
+        self.data_manager = data_manager
+        self.strategy_manager = strategy_manager
+        # 接續上次處理到的 K 線，重啟時不會把同一根 K 線再跑一次
+        self.progress_key = f"last_processed:{symbol}:{interval}"
+        self.done_time = 0 # 最後一根完整處理完 (已下單並記錄進度) 的 K 線
+
+    def is_close(self, close_ms):
+        """ close_ms 是不是這個週期的收盤時間 (週 K 在週一 00:00 UTC 收盤，不是 epoch 的整數倍) """
+        return (close_ms - self.offset_ms) % self.interval_ms == 0
+
+    @property
+    def key(self):
+        return (self.symbol, self.interval)
+
+
 class TradingBot:
+    """
+    一個行程同時跑多組 (交易對, 週期)
+    共用：API 連線與限流器、外部數據源、DB、執行器、User Data Stream、帳本
+    各自：K 線資料、策略實例、處理進度；同一個交易對不論幾個週期只有一個 TradeManager (一起淨額撮合)
+    """
+
     def __init__(self, config_loader):
         self.config = config_loader
-        self.symbol = self.config.get("trading", "symbol", "BTCUSDT")
-        self.interval = self.config.get("trading", "interval", "1h")
         self.mode = self.config.get("system", "mode", "TESTNET")
         self.is_paper = self.config.get("system", "paper_trading", False)
+        pair_configs = self._load_pair_configs()
+        # 單一交易對時的舊屬性 (第一組)
+        self.symbol, self.interval = pair_configs[0][0], pair_configs[0][1]
         
         # 1. 初始化基礎設施
+        if self.config.get("metrics", "enabled", False):
+            start_metrics_server(self.config.get("metrics", "port", 9108), self.config.get("metrics", "host", "127.0.0.1"))
+        if self.config.get("tracing", "enabled", False):
+            tracer.configure(
+                self.config.get("tracing", "path", "trace.log"),
+                max_bytes=self.config.get("tracing", "max_bytes", 5_000_000),
+                backups=self.config.get("tracing", "backups", 3)
+            )
         self.db = DatabaseHandler("trading_data.db")
-        self.data_client, self.trade_client = self._init_clients()
-        strategy_names = self.config.get('trading','strategies', [])
-        
-        # 2. 初始化三大經理
-        self.data_manager = DataManager(self.data_client, self.db, self.symbol, self.interval)
-        self.strategy_manager = StrategyManager(strategy_names)
-        self.trade_manager = TradeManager(self.trade_client, self.db, self.config, self.symbol, self.is_paper)
-        
-        # 3. 策略熱機
-        history_df = self.data_manager.get_history_klines()
-        self.strategy_manager.warm_up_all(history_df)
-        
-        send_tg_msg(f"**機器人啟動**\nSymbol: {self.symbol}\nMode: {self.mode}\nPaper: {self.is_paper}")
+        report = StartupReport()
+        self.data_client, self.trade_client = report.run("clients", self._init_clients)
+        fetchers = {} # 外部數據源全部是 GLOBAL 指標，所有交易對共用一份 (背景建立完再填入)
+
+        # 2. 每組 (交易對, 週期) 的資料管線 (策略稍後在背景載入)
+        self.pairs = {}
+        for symbol, interval, _ in pair_configs:
+            pair = TradingPair(symbol, interval, DataManager(self.data_client, self.db, symbol, interval, fetchers=fetchers), None)
+            pair.done_time = pair.data_manager.last_processed_time = self.db.load_state(pair.progress_key, 0)
+            self.pairs[pair.key] = pair
+        self.symbols = list(dict.fromkeys(symbol for symbol, _, _ in pair_configs))
+
+        # 互不相依的步驟 (大多在等網路) 同時進行
+        startup = ThreadPoolExecutor(max_workers=8, thread_name_prefix="startup")
+        fetchers_job = report.submit(startup, "fetchers", get_all_fetchers, {
+            "failure_threshold": self.config.get("data_sources", "failure_threshold", 3),
+            "cooldown": self.config.get("data_sources", "cooldown", 60.0),
+            "max_cooldown": self.config.get("data_sources", "max_cooldown", 3600.0),
+            "cache_dir": self.config.get("data_sources", "cache_dir", "data_cache"),
+        })
+        stream_job = report.submit(startup, "user_stream", self._init_user_stream)
+        executor_job = report.submit(startup, "executor", self._init_executor)
+        scheduler_job = report.submit(startup, "clock_sync", self._init_scheduler)
+        history_jobs = {
+            key: report.submit(startup, f"history {key[0]} {key[1]}", pair.data_manager.get_history_klines)
+            for key, pair in self.pairs.items()
+        }
+        strategy_jobs = {
+            (symbol, interval): report.submit(startup, f"strategies {symbol} {interval}", StrategyManager, names)
+            for symbol, interval, names in pair_configs
+        }
+
+        # 3. 交易：執行器 / 串流 / 帳本共用，每個交易對一個 TradeManager (設定槓桿 + 對帳，各交易對並行)
+        self.user_stream = stream_job.result()
+        executor = executor_job.result()
+        fill_tracker = FillTracker(self.user_stream) if self.user_stream else None
+        account_book = report.run("account_book", self._init_account_book, executor)
+        maker = self._init_maker(executor, fill_tracker)
+        trade_jobs = {
+            symbol: report.submit(
+                startup, f"trade_manager {symbol}", TradeManager,
+                self.trade_client, self.db, self.config, symbol, self.is_paper,
+                executor=executor,
+                fill_tracker=fill_tracker,
+                account_book=account_book,
+                journal=None if self.is_paper else OrderJournal(self.db),
+                maker=maker
+            )
+            for symbol in self.symbols
+        }
+
+        # 4. 策略熱機 (歷史 K 線與策略都好了就開始，各組並行)
+        def warm_up(pair):
+            pair.strategy_manager = strategy_jobs[pair.key].result()
+            pair.strategy_manager.warm_up_all(history_jobs[pair.key].result())
+
+        warm_jobs = [report.submit(startup, f"warm_up {key[0]} {key[1]}", warm_up, pair) for key, pair in self.pairs.items()]
+        for job in warm_jobs:
+            job.result()
+        self.trade_managers = {symbol: job.result() for symbol, job in trade_jobs.items()}
+        self.trade_manager = self.trade_managers[self.symbol]
+
+        # K 線收盤排程 (以幣安伺服器時間為準，K 線來自 data client)
+        self.scheduler = scheduler_job.result()
+        fetchers.update(fetchers_job.result())
+        logging.info("載入外部數據源: %s", list(fetchers.keys()))
+
+        # 各階段以事件串接 (K 線收盤 -> 特徵 -> 訊號 -> 下單)，外部數據與快照不在關鍵路徑上
+        self.bus = self._init_bus()
+        self._batches = {}                 # 收盤時間 -> 這次要一起下單的各組訊號
+        self._expired = set()              # 逾時作廢的批次 (之後才到的訊號直接丟掉)
+        self._retry = set()                # 上一根處理失敗、下次排程要重新詢問的組
+        self._batch_lock = threading.Lock()
+        self._external_close = 0           # 外部數據最後一次更新對應的收盤時間
+        self._poll_pool = ThreadPoolExecutor(max_workers=min(8, len(self.pairs)), thread_name_prefix="poll")
+
+        report.log()
+        # 通知只排進佇列，由背景執行緒送出
+        pair_names = ', '.join(f"{s} {i}" for s, i in self.pairs)
+        send_tg_msg(f"**機器人啟動**\nPairs: {pair_names}\nMode: {self.mode}\nPaper: {self.is_paper}")
+        startup.shutdown(wait=False)
+
+    def _load_pair_configs(self):
+        """
+        trading.pairs: [{"symbol": ..., "interval": ..., "strategies": [...]}, ...]
+        沒有 pairs 時沿用 trading.symbol / trading.interval；strategies 預設為 trading.strategies
+        """
+        default_strategies = self.config.get('trading', 'strategies', [])
+        pairs = self.config.get("trading", "pairs", None) or [{
+            "symbol": self.config.get("trading", "symbol", "BTCUSDT"),
+            "interval": self.config.get("trading", "interval", "1h"),
+        }]
+        result = []
+        for p in pairs:
+            entry = (p["symbol"], p.get("interval", "1h"), p.get("strategies", default_strategies))
+            if any(entry[:2] == r[:2] for r in result):
+                raise ValueError(f"trading.pairs 重複: {entry[0]} {entry[1]}")
+            result.append(entry)
+        return result
 
     def _init_clients(self):
         """ 建立 API 連線 """
@@ -39,53 +182,281 @@ class TradingBot:
         real_secret = os.getenv('BINANCE_SECRET_KEY')
         
         # Data Client (永遠連實盤)
-        data_client = UMFutures(key=real_key, secret=real_secret)
+        # 所有連線都經過同一個權重限流器，回補歷史資料時不會把交易連線一起拖進封鎖
+        data_client = create_client(key=real_key, secret=real_secret)
         
         # Trade Client
         if self.mode == "TESTNET":
-            trade_client = UMFutures(
+            trade_client = create_client(
                 key=os.getenv('TESTNET_API_KEY'), 
                 secret=os.getenv('TESTNET_SECRET_KEY'), 
                 base_url='https://testnet.binancefuture.com'
             )
         else:
-            trade_client = UMFutures(key=real_key, secret=real_secret)
+            trade_client = create_client(key=real_key, secret=real_secret)
             
         return data_client, trade_client
 
+    def _init_bus(self):
+        bus = EventBus()
+        # 資料與策略階段依交易對數量開多條執行緒，新增一組只多出它自己的計算量
+        workers = min(4, len(self.pairs))
+        # 關鍵路徑上的階段不論怎麼失敗都要送出 Signal，批次才等得齊
+        bus.subscribe(CandleClosed, self._failsafe(self._on_candle_closed), stage="data", workers=workers)
+        bus.subscribe(CandleClosed, self._on_external_refresh, stage="external")
+        bus.subscribe(FeaturesReady, self._failsafe(self._on_features_ready), stage="strategy", workers=workers)
+        bus.subscribe(FeaturesReady, self._on_snapshot, stage="snapshot")
+        bus.subscribe(Signal, self._on_signal, stage="execution")
+        bus.subscribe(OrderFilled, self._on_order_filled, stage="report")
+        return bus
+
+    @staticmethod
+    def _failsafe(handler):
+        """ handler 丟出例外 (或沒有回傳事件) 時改送失敗的 Signal """
+        @functools.wraps(handler)
+        def wrapper(event):
+            try:
+                result = handler(event)
+            except Exception as e:
+                logging.error("[BUS] %s 處理 %s 失敗: %s", handler.__name__, event, e, exc_info=True)
+                result = None
+            if result is None:
+                result = Signal(event.symbol, event.interval, event.bar_time, [], failed=True)
+            return result
+        return wrapper
+
+    def _init_scheduler(self):
+        """ 以最短的週期排程 (其他週期是它的整數倍時)；週期互不整除時退回 1m """
+        base = min(self.pairs.values(), key=lambda p: p.interval_ms)
+        interval = base.interval
+        if any(p.interval_ms % base.interval_ms for p in self.pairs.values()):
+            interval = '1m'
+        clock = ServerClock(self.data_client)
+        clock.sync()
+        return CandleScheduler(
+            interval, clock=clock,
+            settle=self.config.get("scheduler", "settle", 0.2),
+            poll_interval=self.config.get("scheduler", "poll_interval", 0.5),
+            poll_window=self.config.get("scheduler", "poll_window", 30.0),
+            resync_interval=self.config.get("scheduler", "resync_interval", 600.0)
+        )
+
+    def _init_executor(self):
+        """ 實盤 / 測試網的執行器：交易規則快取依模式分檔 (兩邊的 filter 不同)，並在背景定期更新 """
+        if self.is_paper:
+            return MockExecutor() # 所有交易對共用，批次下單才會走同一個執行器
+        cache_dir = self.config.get("data_sources", "cache_dir", "data_cache")
+        path = os.path.join(cache_dir, f"exchange_info_{self.mode.lower()}.json")
+        rules = SymbolRulesCache(self.trade_client, path=path)
+        return BinanceExecutor(self.trade_client, rules=rules.start_background())
+
+    def _init_maker(self, executor, fill_tracker):
+        """ execution.mode = "maker" 時以限價掛單執行 (模擬盤沒有訂單簿，一律市價) """
+        if self.is_paper or self.config.get("execution", "mode", "market") != "maker":
+            return None
+        return MakerExecution(
+            executor, fill_tracker=fill_tracker,
+            reprice_interval=self.config.get("execution", "reprice_interval", 2.0),
+            deadline=self.config.get("execution", "deadline", 30.0)
+        )
+
+    def _init_account_book(self, executor):
+        """ 有串流時持倉由 ACCOUNT_UPDATE 維護，REST 只在背景定期對帳 """
+        if not self.user_stream:
+            return None
+        book = AccountBook(executor, stream=self.user_stream)
+        for symbol in self.symbols:
+            book.reconcile(symbol)
+        return book.start_background(self.symbols, interval=self.config.get("system", "reconcile_interval", 300))
+
+    def _init_user_stream(self):
+        """ 實盤 / 測試網開啟 User Data Stream，用事件確認成交；失敗就退回輪詢 """
+        if self.is_paper or not self.config.get("system", "user_stream", True):
+            return None
+        try:
+            stream_url = STREAM_URLS['TESTNET' if self.mode == "TESTNET" else 'LIVE']
+            return UserDataStream(self.trade_client, stream_url=stream_url).start()
+        except Exception as e:
+            logging.warning("User Data Stream 啟動失敗，改用輪詢確認成交: %s", e)
+            return None
+
     def run(self):
-        logging.info(f"監控 {self.interval} K 線...")
+        logging.info("監控 %s 組 K 線: %s", len(self.pairs), ', '.join(f'{s} {i}' for s, i in self.pairs))
+        self.bus.start()
+        close_ms = None # 第一次只檢查一次 (補跑停機期間收盤的 K 線)，之後對齊收盤
         
         while True:
             try:
-                # 1. 詢問 Data Manager：有新 K 線嗎？
-                is_new, closed_time, df_to_save = self.data_manager.check_new_candle()
+                # 1. 這次收盤的各組並行詢問：有新 K 線嗎？ (只在收盤後的短時間內密集詢問)
+                due = [p for p in self.pairs.values() if close_ms is None or p.is_close(close_ms)]
+                # 上一根處理失敗的組這次也問一次 (不在這次收盤的組只問一次，不等待)
+                with self._batch_lock:
+                    retry, self._retry = [self.pairs[k] for k in self._retry if self.pairs[k] not in due], set()
+                results = list(self._poll_pool.map(
+                    lambda p: self.scheduler.poll(p.data_manager.check_new_candle, close_ms if p in due else None),
+                    due + retry
+                ))
+                due += retry
+                detected = [(pair, closed_time, df) for pair, (is_new, closed_time, df) in zip(due, results) if is_new]
                 
-                if is_new:
-                    # 2. 執行 ETL 流程，並取得準備好的策略數據
-                    strategy_df = self.data_manager.update_etl_process(closed_time, df_to_save)
-                    
-                    if not strategy_df.empty:
-                        # 3. Trade Manager 報告目前持倉
-                        # 使用上一根收盤價作為參考價
-                        ref_price = strategy_df['close'].iloc[-1]
-                        current_pos = self.trade_manager.log_snapshot(ref_price)
-                        
-                        # 4. Strategy Manager 計算訊號
-                        signals = self.strategy_manager.generate_signals(strategy_df)
-                        
-                        # 5. Trade Manager 執行交易
-                        for signal in signals:
-                            self.trade_manager.process_signal(signal, current_pos)
-                    
-                    logging.info("本週期結束，等待下一次收盤...")
+                if detected and close_ms is not None:
+                    LOOP_LAG.set(self.scheduler.clock.time() - close_ms / 1000.0, loop="bot")
+                if detected:
+                    # 後續交給事件管線，這條執行緒直接回去等下一根
+                    self._publish_candles(detected)
                 
-                time.sleep(10)
+                # 2. 睡到下一根 K 線收盤
+                close_ms = self.scheduler.sleep_until_next_close()
 
             except KeyboardInterrupt:
                 logging.warning("停止運行")
+                self.bus.stop()
+                if self.user_stream:
+                    self.user_stream.stop()
                 break
             except Exception as e:
-                logging.error(f"核心崩潰: {e}")
-                traceback.print_exc()
-                time.sleep(30)
\ No newline at end of file
+                logging.error("核心崩潰: %s", e, exc_info=True)
+                time.sleep(30)
+                close_ms = None
+
+    def _publish_candles(self, detected):
+        """
+        同一個收盤時間的各組登記成一批，執行階段等齊了才一起下單
+        偵測用的游標先往前推 (處理期間不會重複偵測)，處理失敗時再退回 (見 _execute_cycle)
+        """
+        with self._batch_lock:
+            for pair, closed_time, _ in detected:
+                batch = self._batches.setdefault(closed_time + pair.interval_ms, {'expected': set(), 'events': {}, 'span': 0})
+                batch['expected'].add(pair.key)
+                batch['span'] = max(batch['span'], pair.interval_ms)
+            self._expire_batches(max(closed_time + pair.interval_ms for pair, closed_time, _ in detected))
+        for pair, closed_time, df in detected:
+            pair.data_manager.last_processed_time = closed_time
+            self.bus.publish(CandleClosed(pair.symbol, pair.interval, closed_time, df))
+
+    # ==========================================
+    #  事件管線的各階段
+    # ==========================================
+
+    def _on_candle_closed(self, event):
+        """ [data] K 線存檔 + 讀回策略數據 (外部指標用最後已知的值) """
+        try:
+            strategy_df = self.pairs[(event.symbol, event.interval)].data_manager.store_candle(event.bar_time, event.df)
+        except Exception as e:
+            logging.error("[ETL] %s 處理失敗: %s", event, e)
+            return Signal(event.symbol, event.interval, event.bar_time, [], failed=True)
+        return FeaturesReady(event.symbol, event.interval, event.bar_time, strategy_df)
+
+    def _on_external_refresh(self, event):
+        """ [external] 更新外部數據 (同一次收盤只更新一次)，下一根 K 線就會用到 """
+        close = event.bar_time + interval_to_ms(event.interval)
+        if close <= self._external_close:
+            return
+        self._external_close = close
+        self.pairs[(event.symbol, event.interval)].data_manager.update_external_data()
+
+    def _on_features_ready(self, event):
+        """ [strategy] 計算訊號；沒有數據時送出空訊號，讓執行階段照樣記錄進度 """
+        if event.df.empty:
+            return Signal(event.symbol, event.interval, event.bar_time, [])
+        try:
+            signals = self.pairs[(event.symbol, event.interval)].strategy_manager.generate_signals(event.df)
+        except Exception as e:
+            logging.error("[STRATEGY] %s 計算失敗: %s", event, e)
+            return Signal(event.symbol, event.interval, event.bar_time, [], failed=True)
+        return Signal(event.symbol, event.interval, event.bar_time, signals)
+
+    def _on_snapshot(self, event):
+        """ [snapshot] 報告目前持倉 (使用剛收盤的價格作為參考價) """
+        if not event.df.empty:
+            self.trade_managers[event.symbol].log_snapshot(event.df['close'].iloc[-1])
+
+    def _expire_batches(self, close):
+        """
+        該批各組的下一根 K 線都收盤了還沒等齊 (某一組的訊號遺失)：整批作廢，不再下單
+        各組退回處理前的進度，下次排程重新詢問 (呼叫端持有 _batch_lock)
+        """
+        for old_close in [c for c, b in self._batches.items() if c + b['span'] <= close]:
+            batch = self._batches.pop(old_close)
+            missing = batch['expected'] - set(batch['events'])
+            logging.error("[BATCH] %s 的批次逾時作廢，缺少: %s", pd.to_datetime(old_close, unit='ms'),
+                          ', '.join(f'{s} {i}' for s, i in missing))
+            self._expired.add(old_close)
+            for key in batch['expected']:
+                self._rollback(self.pairs[key], old_close - self.pairs[key].interval_ms)
+        # 只留最近的紀錄，避免無限成長
+        while len(self._expired) > 100:
+            self._expired.remove(min(self._expired))
+
+    def _rollback(self, pair, bar_time):
+        """ 這根 K 線沒處理完：偵測游標退回最後一根完成的 K 線，排入重試 """
+        dm = pair.data_manager
+        if dm.last_processed_time == bar_time:
+            dm.last_processed_time = pair.done_time
+        self._retry.add(pair.key)
+
+    def _on_signal(self, event):
+        """ [execution] 同一個收盤時間的各組訊號到齊後，淨額撮合並批次下單 """
+        close = event.bar_time + interval_to_ms(event.interval)
+        with self._batch_lock:
+            batch = self._batches.get(close)
+            if batch is None and close in self._expired:
+                logging.warning("[BATCH] %s 的批次已逾時作廢，忽略這個訊號", event)
+                return None
+            if batch is None:
+                events = [event]
+            else:
+                batch['events'][(event.symbol, event.interval)] = event
+                if len(batch['events']) < len(batch['expected']):
+                    return None
+                del self._batches[close]
+                events = list(batch['events'].values())
+        return self._execute_cycle(events)
+
+    def _execute_cycle(self, events):
+        # 同一個交易對的多個週期合成一筆：策略名稱加上週期，虛擬持倉才不會混在一起
+        by_symbol = {}
+        for event in events:
+            if event.failed:
+                continue
+            multi = sum(1 for s, _ in self.pairs if s == event.symbol) > 1
+            signals = [dict(sig, strategy_name=f"{sig['strategy_name']}@{event.interval}") if multi else sig
+                       for sig in event.signals]
+            group = by_symbol.setdefault(event.symbol, {'signals': [], 'event': event})
+            group['signals'].extend(signals)
+            if event.bar_time > group['event'].bar_time:
+                group['event'] = event # 最短週期那根 K 線的時間決定 clientOrderId
+
+        groups = list(by_symbol.values())
+        results = TradeManager.process_batch(
+            [(self.trade_managers[g['event'].symbol], g['signals'], g['event'].bar_time, g['event'].interval)
+             for g in groups]
+        )
+
+        now = time.time()
+        for event in events:
+            pair = self.pairs[(event.symbol, event.interval)]
+            if event.failed:
+                with self._batch_lock:
+                    self._rollback(pair, event.bar_time)
+                continue
+            # K 線收盤 -> 下單回應 的總延遲
+            close_time = (event.bar_time + interval_to_ms(event.interval)) / 1000.0
+            tracer.record('close_to_ack', close_time, now - close_time,
+                          bar_id(event.symbol, event.interval, event.bar_time))
+            # 整根 K 線處理完才記錄進度 (中途當機會重跑，由下單日誌保證不重複下單)
+            self.db.save_state(pair.progress_key, event.bar_time)
+            pair.done_time = max(pair.done_time, event.bar_time)
+        logging.info("本週期結束，等待下一次收盤...")
+
+        fills = []
+        for group, fill in zip(groups, results):
+            if fill:
+                side, record = fill
+                event = group['event']
+                fills.append(OrderFilled(event.symbol, event.interval, event.bar_time, side, record))
+        return fills
+
+    def _on_order_filled(self, event):
+        """ [report] 成交後的持倉快照 """
+        self.trade_managers[event.symbol].log_snapshot(event.record['avgPrice'])
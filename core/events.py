@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from utils.tracing import tracer, bar_id
+
+
+class Event:
+    """ 事件基底：bar_time 為所屬 K 線的開盤時間 (毫秒)，同一根 K 線的事件可以串起來 """
+
+    def __init__(self, symbol, interval, bar_time):
+        self.symbol = symbol
+        self.interval = interval
+        self.bar_time = bar_time
+        self.created = time.time()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.symbol} {self.interval} @ {self.bar_time})"
+
+
+class CandleClosed(Event):
+    """ 偵測到新收盤的 K 線 (df 為剛收盤、尚未存檔的 K 線) """
+
+    def __init__(self, symbol, interval, bar_time, df):
+        super().__init__(symbol, interval, bar_time)
+        self.df = df
+
+
+class FeaturesReady(Event):
+    """ K 線已存檔並合併好外部指標，策略可以直接使用 """
+
+    def __init__(self, symbol, interval, bar_time, df):
+        super().__init__(symbol, interval, bar_time)
+        self.df = df
+
+
+class Signal(Event):
+    """
+    同一根 K 線所有策略的訊號 (可能是空列表，執行階段仍要記錄進度)
+    failed=True 代表前面的階段出錯，這根 K 線不下單也不記錄進度
+    """
+
+    def __init__(self, symbol, interval, bar_time, signals, failed=False):
+        super().__init__(symbol, interval, bar_time)
+        self.signals = signals
+        self.failed = failed
+
+
+class OrderFilled(Event):
+    """ 淨訂單在交易所成交 (record 為 fill_tracker.order_record 格式) """
+
+    def __init__(self, symbol, interval, bar_time, side, record):
+        super().__init__(symbol, interval, bar_time)
+        self.side = side
+        self.record = record
+
+
+class EventBus:
+    """
+    行程內的事件匯流排
+    - subscribe(事件類別, handler, stage)：同一個 stage 的 handler 共用一條執行緒與佇列，依序處理
+      (同一個 stage 內事件順序不變)，不同 stage 並行，慢的階段不會擋住其他階段
+    - workers > 1 時該 stage 由多條執行緒消化同一個佇列 (例如多個交易對的策略計算)，不保證順序
+    - handler 回傳的事件 (或事件列表) 會自動再 publish，階段之間就此串成管線
+    - threaded=False 時 publish 直接同步呼叫 handler (回測 / 測試用)
+    """
+
+    def __init__(self, threaded=True, maxsize=1000):
+        self.threaded = threaded
+        self.maxsize = maxsize
+        self._routes = defaultdict(list) # 事件類別 -> [(stage, handler)]
+        self._queues = {}                # stage -> Queue
+        self._workers = {}               # stage -> 執行緒數
+        self._threads = []
+        self._running = False
+
+    def subscribe(self, event_type, handler, stage=None, workers=1):
+        stage = stage or getattr(handler, '__name__', 'default')
+        self._routes[event_type].append((stage, handler))
+        if stage not in self._queues:
+            self._queues[stage] = queue.Queue(maxsize=self.maxsize)
+        self._workers[stage] = max(self._workers.get(stage, 1), workers)
+        return self
+
+    def publish(self, event):
+        for event_type, handlers in self._routes.items():
+            if not isinstance(event, event_type):
+                continue
+            for stage, handler in handlers:
+                if self.threaded:
+                    self._queues[stage].put((handler, event))
+                else:
+                    self._dispatch(stage, handler, event)
+
+    def _dispatch(self, stage, handler, event):
+        bar = bar_id(event.symbol, event.interval, event.bar_time) if isinstance(event, Event) else None
+        if self.threaded and bar is not None:
+            # 排隊等待的時間 (該階段忙碌時會變長)
+            tracer.record(f"queue.{stage}", event.created, time.time() - event.created, bar)
+        try:
+            with tracer.span(f"stage.{stage}", bar):
+                result = handler(event)
+        except Exception as e:
+            logging.error("[BUS] %s 處理 %s 失敗: %s", stage, event, e, exc_info=True)
+            return
+        if result is None:
+            return
+        for follow_up in (result if isinstance(result, (list, tuple)) else [result]):
+            self.publish(follow_up)
+
+    def _worker(self, stage, q):
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                self._dispatch(stage, *item)
+            finally:
+                q.task_done()
+
+    def start(self):
+        if not self.threaded or self._running:
+            return self
+        self._running = True
+        for stage, q in self._queues.items():
+            for n in range(self._workers[stage]):
+                thread = threading.Thread(target=self._worker, args=(stage, q), name=f"bus-{stage}-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logging.info("[BUS] 啟動 %s 個階段: %s", len(self._threads), ', '.join(self._queues))
+        return self
+
+    def join(self):
+        """ 等到所有佇列都處理完 (包含處理途中新產生的事件) """
+        if not self.threaded:
+            return
+        while any(q.unfinished_tasks for q in self._queues.values()):
+            for q in self._queues.values():
+                q.join()
+
+    def stop(self, timeout=5.0):
+        """ 處理完已排隊的事件後結束各階段的執行緒 """
+        if not self._running:
+            return
+        for stage, q in self._queues.items():
+            for _ in range(self._workers[stage]):
+                q.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._running = False
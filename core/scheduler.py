@@ -0,0 +1,72 @@
+import logging
+
+from utils.clock import system_clock, interval_to_ms, interval_offset_ms
+
+
+class CandleScheduler:
+    """
+    對齊 K 線收盤的排程
+    1. sleep_until_next_close(): 依伺服器時間睡到下一個週期邊界 + settle + 單程延遲
+    2. poll(check): 只在收盤後的 poll_window 秒內每 poll_interval 秒問一次，問到就停
+    平常完全不打 API；clock 是 ServerClock 時每 resync_interval 秒重新校時
+    """
+
+    def __init__(self, interval, clock=None, settle=0.2, poll_interval=0.5, poll_window=30.0,
+                 resync_interval=600.0, max_sleep=60.0):
+        self.interval_ms = interval_to_ms(interval)
+        self.offset_ms = interval_offset_ms(interval)
+        self.clock = clock or system_clock
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.poll_window = poll_window
+        self.resync_interval = resync_interval
+        self.max_sleep = max_sleep # 長時間等待切成小段，每段重新計算 (避免休眠 / 校時造成誤差)
+
+    def _now_ms(self):
+        return int(self.clock.time() * 1000)
+
+    def next_close_ms(self, now_ms=None):
+        """ 下一個週期邊界 (= 目前這根 K 線的收盤時間) """
+        now_ms = self._now_ms() if now_ms is None else now_ms
+        return ((now_ms - self.offset_ms) // self.interval_ms + 1) * self.interval_ms + self.offset_ms
+
+    def _maybe_resync(self):
+        if hasattr(self.clock, 'sync_if_stale'):
+            self.clock.sync_if_stale(self.resync_interval)
+
+    def sleep_until_next_close(self):
+        """ 睡到下一根 K 線收盤後，回傳該週期邊界 (毫秒) """
+        self._maybe_resync()
+        close_ms = self.next_close_ms()
+        logging.info("[SCHEDULER] 下次收盤 %.1fs 後", (close_ms - self._now_ms()) / 1000)
+        while True:
+            # 多等一個單程延遲：伺服器那邊確實已經換根了才開始問
+            target = close_ms / 1000.0 + self.settle + getattr(self.clock, 'latency', 0.0)
+            remaining = target - self.clock.time()
+            if remaining <= 0:
+                return close_ms
+            if remaining > self.max_sleep:
+                self.clock.sleep(self.max_sleep)
+                self._maybe_resync()
+            else:
+                self.clock.sleep(remaining)
+
+    def poll(self, check, close_ms=None):
+        """
+        收盤附近的密集輪詢
+        :param check: 回傳 (是否完成, ...) 的 tuple，例如 DataManager.check_new_candle
+        :param close_ms: 這次等待的週期邊界，用來記錄偵測延遲；None 代表只問一次 (啟動時補跑漏掉的 K 線)
+        :return: check 最後一次的結果
+        """
+        started = self.clock.time()
+        while True:
+            result = check()
+            if result[0]:
+                if close_ms is not None:
+                    logging.info("[SCHEDULER] 收盤後 %.3fs 偵測到新 K 線", self.clock.time() - close_ms / 1000.0)
+                return result
+            if close_ms is None or self.clock.time() - started >= self.poll_window:
+                if close_ms is not None:
+                    logging.warning("[SCHEDULER] 收盤後 %.0fs 內沒有拿到新 K 線，等下一個週期", self.poll_window)
+                return result
+            self.clock.sleep(self.poll_interval)
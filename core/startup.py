@@ -0,0 +1,38 @@
+import logging
+import threading
+import time
+
+
+class StartupReport:
+    """
+    啟動各步驟的耗時
+    run() 計時同步執行的步驟，submit() 把步驟丟進執行緒池並計時
+    log() 列出每一步的開始時間與耗時，以及逐步執行時的總和 (= 平行化省下多少)
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = [] # (名稱, 開始, 耗時)
+        self._lock = threading.Lock()
+
+    def _record(self, name, begin, end):
+        with self._lock:
+            self.steps.append((name, begin - self.started, end - begin))
+
+    def run(self, name, fn, *args, **kwargs):
+        begin = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._record(name, begin, time.perf_counter())
+
+    def submit(self, pool, name, fn, *args, **kwargs):
+        return pool.submit(self.run, name, fn, *args, **kwargs)
+
+    def log(self):
+        total = time.perf_counter() - self.started
+        serial = sum(d for _, _, d in self.steps)
+        logging.info(f"[STARTUP] 啟動完成 {total:.2f}s (各步驟合計 {serial:.2f}s)")
+        for name, begin, duration in sorted(self.steps, key=lambda s: s[1]):
+            logging.info(f"[STARTUP]   +{begin:6.2f}s  {duration:6.2f}s  {name}")
+        return total
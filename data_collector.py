@@ -1,21 +1,16 @@
 import os
 import time
 import logging
-import traceback
 from dotenv import load_dotenv
-from binance.um_futures import UMFutures
 
 # 引入專案模組
 from utils.database import DatabaseHandler
+from utils.binance_client import create_client
 from data_loader import DataLoader
 from data_sources.registry import get_all_fetchers
-
-# 設定 Logging (無表情符號版)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+from utils.tracing import span
+from utils.metrics import start_metrics_server, FETCH_FAILURES, LOOP_LAG
+from utils.log_setup import setup_logging
 
 load_dotenv()
 
@@ -29,13 +24,13 @@ class DataCollector:
         # 2. Binance Client
         key = os.getenv('BINANCE_API_KEY')
         secret = os.getenv('BINANCE_SECRET_KEY')
-        self.client = UMFutures(key=key, secret=secret)
+        self.client = create_client(key=key, secret=secret)
         
         # 3. DataLoader
         self.loader = DataLoader(self.client, self.db)
         
         # 4. 外部數據源 (從 Registry 載入)
-        self.fetchers = get_all_fetchers()
+        self.fetchers = get_all_fetchers({'cache_dir': 'data_cache'})
         logging.info(f"[INFO] Loaded external sources: {list(self.fetchers.keys())}")
 
         # 設定
@@ -50,11 +45,17 @@ class DataCollector:
         self.market_update_interval = 60      # 每分鐘更新 K 線
         self.external_update_interval = 3600  # 每小時更新外部數據
 
+        # Prometheus 指標端點 (與 bot 的 9108 分開)：預設不開，設定 COLLECTOR_METRICS_PORT (例如 9109) 才啟動
+        port = os.getenv('COLLECTOR_METRICS_PORT')
+        self.metrics_port = int(port) if port else None
+        self.metrics_host = os.getenv('COLLECTOR_METRICS_HOST', '127.0.0.1')
+
     def collect_market_data(self):
         """ 收集 Binance K 線數據 """
         try:
             # 抓取最新的 200 筆 (確保能補上前一根剛收盤的)
-            raw_df = self.loader.get_binance_klines(self.symbol, self.interval, limit=200)
+            with span('fetch.binance_klines'):
+                raw_df = self.loader.get_binance_klines(self.symbol, self.interval, limit=200)
             
             if not raw_df.empty:
                 self.db.save_market_data(self.symbol, self.interval, raw_df)
@@ -63,6 +64,7 @@ class DataCollector:
                 logging.warning(f"[MARKET] Received empty DataFrame for {self.symbol}")
 
         except Exception as e:
+            FETCH_FAILURES.inc(source='binance_klines')
             logging.error(f"[MARKET ERROR] Failed to collect market data: {e}")
 
     def collect_external_data(self):
@@ -73,7 +75,8 @@ class DataCollector:
             try:
                 # 呼叫 Fetcher
                 # limit 設定為 10，僅作為持續收集用途，不需要抓太多歷史
-                df = fetcher.fetch_data(limit=10)
+                with span(f"fetch.{name}"):
+                    df = fetcher.fetch_data(limit=10)
                 
                 if df.empty:
                     logging.warning(f"[EXTERNAL] {name} returned empty data.")
@@ -90,12 +93,14 @@ class DataCollector:
                     logging.info(f"[EXTERNAL] Saved {name} to external_data table.")
 
             except Exception as e:
-                logging.error(f"[EXTERNAL ERROR] Failed to update {name}: {e}")
-                # 印出詳細錯誤以便除錯，但不中斷迴圈
-                traceback.print_exc()
+                FETCH_FAILURES.inc(source=name)
+                # 附上詳細錯誤以便除錯，但不中斷迴圈
+                logging.error(f"[EXTERNAL ERROR] Failed to update {name}: {e}", exc_info=True)
 
     def run(self):
         logging.info("[RUNNING] Data Collector is active. Press Ctrl+C to stop.")
+        if self.metrics_port is not None:
+            start_metrics_server(self.metrics_port, self.metrics_host)
         
         while True:
             try:
@@ -103,6 +108,8 @@ class DataCollector:
 
                 # --- 任務 1: 市場數據更新 (高頻) ---
                 if current_time - self.last_market_update > self.market_update_interval:
+                    if self.last_market_update:
+                        LOOP_LAG.set(current_time - self.last_market_update - self.market_update_interval, loop="collector")
                     self.collect_market_data()
                     self.last_market_update = current_time
 
@@ -122,5 +129,7 @@ class DataCollector:
                 time.sleep(30) # 發生嚴重錯誤時等待較長時間再重試
 
 if __name__ == "__main__":
+    # 設定 Logging (無表情符號版，寫檔在背景執行緒)
+    setup_logging(path="data_collector.log")
     collector = DataCollector()
     collector.run()
\ No newline at end of file
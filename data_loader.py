@@ -7,13 +7,17 @@ class DataLoader:
         self.client = client
         self.db = db # 現在需要傳入 DB Handler
 
-    def get_binance_klines(self, symbol, interval, limit=100):
+    def get_binance_klines(self, symbol, interval, limit=100, start_time=None):
         """ 
         幣安 K 線維持直接抓取 (為了實盤即時性)，
         但建議同時也寫入 DB (ETL 流程在 main.py 做) 
+        :param start_time: (選填) 從這個 open_time (毫秒) 開始往後抓，只補缺口時使用
         """
         try:
-            klines = self.client.klines(symbol=symbol, interval=interval, limit=limit)
+            if start_time is None:
+                klines = self.client.klines(symbol=symbol, interval=interval, limit=limit)
+            else:
+                klines = self.client.klines(symbol=symbol, interval=interval, limit=limit, startTime=int(start_time))
             df = pd.DataFrame(klines, columns=[
                 'open_time', 'open', 'high', 'low', 'close', 'volume', 
                 'close_time', 'q_vol', 'trades', 'taker_buy_vol', 'taker_buy_q_vol', 'ignore'
@@ -4,14 +4,16 @@ from .base_source import BaseDataSource
 
 class FearGreedFetcher(BaseDataSource):
     name = "fear_greed"
-    def __init__(self):
-        
+    def __init__(self, timeout=10):
+        self.timeout = timeout # 沒設逾時的話 API 卡住就會一直等
         self.url = "https://api.alternative.me/fng/"
 
     def fetch_data(self, limit=100):
         # 1. 呼叫第三方 API
         url = f"https://api.alternative.me/fng/?limit={limit}"
-        response = requests.get(url).json()
+        response = requests.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        response = response.json()
         
         # 2. 處理數據
         data_list = response['data']
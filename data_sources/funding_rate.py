@@ -1,16 +1,15 @@
 from .base_source import BaseDataSource
 import pandas as pd
 import os
-from binance.um_futures import UMFutures
+from utils.binance_client import create_client
 
 class FundingRateFetcher(BaseDataSource):
     name = "funding_rate"
     
-    def __init__(self): # 改成不需要外部傳入 client
+    def __init__(self, client=None): # 不傳入 client 時自己建立 (與其他連線共用限流器)
         key = os.getenv('BINANCE_API_KEY')
         secret = os.getenv('BINANCE_SECRET_KEY')
-        # 自己建立連線
-        self.client = UMFutures(key=key, secret=secret)
+        self.client = client or create_client(key=key, secret=secret)
 
     def fetch_data(self, symbol="BTCUSDT", limit=100):
         try:
@@ -1,15 +1,21 @@
 import pandas as pd
 import time
-from pytrends.request import TrendReq
 
 from .base_source import BaseDataSource
 
 class GoogleTrendsFetcher(BaseDataSource):
     name = "google_trends"
     def __init__(self):
-        
-        # tz=360 代表 CST/MDT，這裡用預設即可
-        self.pytrends = TrendReq(hl='en-US', tz=360)
+        self._pytrends = None
+
+    @property
+    def pytrends(self):
+        """ 第一次抓取時才 import 並建立 session (TrendReq 建立時就會連 Google 取 cookie，拖慢啟動) """
+        if self._pytrends is None:
+            from pytrends.request import TrendReq
+            # tz=360 代表 CST/MDT，這裡用預設即可
+            self._pytrends = TrendReq(hl='en-US', tz=360, timeout=(5, 15)) # (連線, 讀取) 逾時秒數
+        return self._pytrends
 
     def fetch_data(self, keyword='Bitcoin', limit=None):
         try:
@@ -1,15 +1,20 @@
 import pandas as pd
 import os
-from fredapi import Fred
 
 from .base_source import BaseDataSource
 
 class FredFetcher(BaseDataSource):
     name = "fred_macro"
     def __init__(self):
-        
-        key = os.getenv('FRED_API_KEY')
-        self.fred = Fred(api_key=key)
+        self._fred = None
+
+    @property
+    def fred(self):
+        """ 第一次抓取時才 import fredapi 並建立 client，不拖慢啟動 """
+        if self._fred is None:
+            from fredapi import Fred
+            self._fred = Fred(api_key=os.getenv('FRED_API_KEY'))
+        return self._fred
 
     def fetch_data(self, limit=5):
         try:
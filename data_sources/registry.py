@@ -3,6 +3,7 @@ from .fear_greed import FearGreedFetcher
 from .google_trends import GoogleTrendsFetcher
 from .macro_economic import FredFetcher
 from .us_stock import USStockFetcher
+from .resilience import ResilientSource
 
 # 2. 建立註冊表清單
 # 這裡列出所有你想啟用的 Fetcher Class (注意：是 Class 本身，不是實例)
@@ -19,18 +20,33 @@ FETCHER_REGISTRY = {
     for cls in _FETCHER_CLASSES
 }
 
-def get_all_fetchers():
+# 4. 備用數據源 { "fear_greed": [備用 Fetcher Class, ...] }
+# 主數據源失敗 (或斷路器冷卻中) 時依序嘗試，回傳格式必須與主數據源相同
+FALLBACK_REGISTRY = {}
+
+def get_all_fetchers(resilience=None):
     """
     一次把所有 Fetcher 實例化並回傳
     這樣 main.py 只要呼叫這個函數，就能拿到所有工具
+    每個 Fetcher 都包上 ResilientSource (斷路器 + 備用數據源 + 本地快取)
+    :param resilience: (選填) ResilientSource 的參數，例如 failure_threshold / cooldown / cache_dir
     """
     instances = {}
     for name, cls in FETCHER_REGISTRY.items():
         try:
             # 這裡假設所有 Fetcher 的 __init__ 都不需要參數
             # (參數都從 os.getenv 讀取)
-            instances[name] = cls()
+            primary = cls()
         except Exception as e:
             print(f" [Registry] 無法初始化 {name}: {e}")
+            continue
+
+        fallbacks = []
+        for fallback_cls in FALLBACK_REGISTRY.get(name, []):
+            try:
+                fallbacks.append(fallback_cls())
+            except Exception as e:
+                print(f" [Registry] 無法初始化 {name} 的備用數據源 {fallback_cls.__name__}: {e}")
+        instances[name] = ResilientSource(primary, fallbacks, **(resilience or {}))
     
     return instances
\ No newline at end of file
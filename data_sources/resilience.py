@@ -0,0 +1,143 @@
+import logging
+import os
+import threading
+
+import pandas as pd
+
+from .base_source import BaseDataSource
+from utils.clock import system_clock
+from utils.metrics import FETCH_FAILURES, SOURCE_BREAKER_OPEN
+
+# 斷路器狀態
+CLOSED = 'CLOSED'       # 正常放行
+OPEN = 'OPEN'           # 冷卻中，直接略過
+HALF_OPEN = 'HALF_OPEN' # 冷卻結束，放行一次試探
+
+
+class CircuitBreaker:
+    """
+    單一數據源的斷路器
+    - 連續失敗 failure_threshold 次就跳開 (OPEN)，冷卻期間直接略過，不再每根 K 線都等一次逾時
+    - 冷卻結束後只放行一次試探 (HALF_OPEN)：成功就復原，失敗就再跳開，冷卻時間加倍 (上限 max_cooldown)
+    """
+
+    def __init__(self, name, failure_threshold=3, cooldown=60.0, max_cooldown=3600.0, clock=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock or system_clock
+
+        self.state = CLOSED
+        self.failures = 0 # 連續失敗次數
+        self.trips = 0    # 連續跳開次數 (決定冷卻時間)
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """ 這次可不可以呼叫數據源 """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.clock.time() >= self.open_until:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = self.trips = 0
+        if recovered:
+            SOURCE_BREAKER_OPEN.set(0, source=self.name)
+            logging.info(f"[BREAKER] {self.name} 已恢復")
+
+    def record_failure(self):
+        """ 回傳這次跳開的冷卻秒數，沒有跳開回傳 None """
+        with self._lock:
+            self.failures += 1
+            if self.state != HALF_OPEN and self.failures < self.failure_threshold:
+                return None
+            self.trips += 1
+            cooldown = min(self.cooldown * 2 ** (self.trips - 1), self.max_cooldown)
+            self.state = OPEN
+            self.open_until = self.clock.time() + cooldown
+        SOURCE_BREAKER_OPEN.set(1, source=self.name)
+        return cooldown
+
+
+class ResilientSource(BaseDataSource):
+    """
+    把數據源包上斷路器：失敗時依序改用備用數據源，全部失敗再讀本地快取 (備用檔案)
+    - 丟例外或回傳空資料都算失敗
+    - 每次成功的結果都存進快取 (記憶體 + cache_dir 底下的檔案，重啟後仍可用)
+    - 介面與一般 Fetcher 相同，抓不到任何資料時回傳空 DataFrame，不會丟例外
+    """
+
+    def __init__(self, primary, fallbacks=(), cache_dir=None, clock=None, **breaker_kwargs):
+        self.name = primary.name
+        self.cache_dir = cache_dir
+        self.providers = []
+        for i, provider in enumerate([primary, *fallbacks]):
+            label = self.name if i == 0 else f"{self.name}:{type(provider).__name__}"
+            self.providers.append((provider, CircuitBreaker(label, clock=clock, **breaker_kwargs)))
+        self._last = None
+
+    @property
+    def primary(self):
+        return self.providers[0][0]
+
+    def fetch_data(self, **kwargs):
+        for provider, breaker in self.providers:
+            if not breaker.allow():
+                continue
+            try:
+                df = provider.fetch_data(**kwargs)
+                error = None if df is not None and not df.empty else "回傳空資料"
+            except Exception as e:
+                error = e
+            if error is None:
+                breaker.record_success()
+                self._save_cache(df)
+                return df
+
+            FETCH_FAILURES.inc(source=breaker.name)
+            cooldown = breaker.record_failure()
+            if cooldown is not None:
+                logging.warning(f"[BREAKER] {breaker.name} 連續失敗 {breaker.failures} 次，暫停 {cooldown:.0f} 秒 ({error})")
+            else:
+                logging.warning(f"[SOURCE] {breaker.name} 抓取失敗: {error}")
+
+        return self._load_cache()
+
+    # ==========================================
+    #  本地快取
+    # ==========================================
+
+    def _cache_path(self):
+        return os.path.join(self.cache_dir, f"{self.name}.pkl")
+
+    def _save_cache(self, df):
+        self._last = df
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._cache_path()
+            df.to_pickle(path + '.tmp')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            logging.debug("[SOURCE] %s 寫入快取失敗: %s", self.name, e)
+
+    def _load_cache(self):
+        df = self._last
+        if df is None and self.cache_dir and os.path.exists(self._cache_path()):
+            try:
+                df = self._last = pd.read_pickle(self._cache_path())
+            except Exception as e:
+                logging.debug("[SOURCE] %s 讀取快取失敗: %s", self.name, e)
+        if df is None:
+            return pd.DataFrame()
+        logging.warning(f"[SOURCE] {self.name} 所有來源都不可用，改用本地快取 ({len(df)} 筆)")
+        return df
@@ -1,14 +1,20 @@
 import pandas as pd
 import os
-from alpha_vantage.timeseries import TimeSeries
 
 from .base_source import BaseDataSource
 
 class USStockFetcher(BaseDataSource):
     name = "us_stock_qqq"
     def __init__(self):
-        key = os.getenv('ALPHA_VANTAGE_KEY')
-        self.ts = TimeSeries(key=key, output_format='pandas')
+        self._ts = None
+
+    @property
+    def ts(self):
+        """ 第一次抓取時才 import alpha_vantage 並建立 client """
+        if self._ts is None:
+            from alpha_vantage.timeseries import TimeSeries
+            self._ts = TimeSeries(key=os.getenv('ALPHA_VANTAGE_KEY'), output_format='pandas')
+        return self._ts
 
     def fetch_data(self, symbol='QQQ', limit=100):
         try:
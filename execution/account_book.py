@@ -0,0 +1,161 @@
+import logging
+import threading
+
+from utils.clock import system_clock
+
+
+class AccountBook:
+    """
+    本地持倉 / 餘額帳本
+    - 有 User Data Stream 時：ACCOUNT_UPDATE 事件即時覆寫持倉與餘額，背景執行緒定期用 REST 對帳
+    - 沒有串流時：每個週期開頭 (sync_if_stale) 用 executor 查一次，等同原本的行為
+    - TradeManager 每確認一筆成交就 apply_fill，同一根 K 線後面的訊號讀到的就是成交後的持倉
+    """
+
+    def __init__(self, executor, stream=None, clock=None, max_age=0):
+        """
+        :param executor: 用來對帳的執行器 (需提供 get_position_details)
+        :param stream: (選填) UserDataStream
+        :param max_age: 沒有串流時，持倉資料超過幾秒就在 sync_if_stale 重新查詢 (0 = 每次都查)
+        """
+        self.executor = executor
+        self.stream = stream
+        self.clock = clock or system_clock
+        self.max_age = max_age
+
+        self.positions = {}  # {symbol: {'amt', 'entryPrice', 'unRealizedProfit', 'leverage'}}
+        self.balances = {}   # {asset: {'wallet', 'cross'}}
+        self._synced_at = {}
+        self._stream_time = {} # 每個 symbol 最後一次串流更新的交易時間 (ms)
+        self._version = 0      # 任何變動都 +1，背景對帳用來判斷查詢期間有沒有新成交
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        if stream is not None:
+            stream.subscribe('ACCOUNT_UPDATE', self.on_account_update)
+
+    @property
+    def streaming(self):
+        return self.stream is not None and self.stream.connected
+
+    # ==========================================
+    #  讀取 (純記憶體)
+    # ==========================================
+
+    def get_position(self, symbol):
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return pos['amt'] if pos else 0.0
+
+    def get_position_details(self, symbol, mark_price=None):
+        """ 與 executor.get_position_details 相同格式；有傳入現價時重算未實現損益 """
+        with self._lock:
+            pos = self.positions.get(symbol)
+            if pos is None:
+                return None
+            details = dict(pos)
+        if mark_price and details['amt']:
+            details['unRealizedProfit'] = (mark_price - details['entryPrice']) * details['amt']
+        return details
+
+    def get_balance(self, asset='USDT'):
+        with self._lock:
+            balance = self.balances.get(asset)
+            return balance['wallet'] if balance else None
+
+    # ==========================================
+    #  更新
+    # ==========================================
+
+    def sync_if_stale(self, symbol):
+        """ 週期開頭呼叫：串流正常就直接用本地帳本，否則資料太舊時用 REST 查一次 """
+        if self.streaming and symbol in self.positions:
+            return
+        synced_at = self._synced_at.get(symbol)
+        if synced_at is None or self.clock.time() - synced_at >= self.max_age:
+            self.reconcile(symbol)
+
+    def reconcile(self, symbol):
+        """ 用 REST 查詢結果覆寫本地持倉；查詢期間若有新成交 / 串流事件就放棄這次結果 """
+        version = self._version
+        details = self.executor.get_position_details(symbol)
+        if details is None:
+            # 查詢失敗 (空倉會回傳 amt=0，不是 None)：保留上一次的狀態
+            logging.warning("[BOOK] %s 持倉查詢失敗，沿用本地帳本", symbol)
+            return False
+
+        with self._lock:
+            if version != self._version:
+                return False
+            local = self.positions.get(symbol)
+            if local is not None and abs(local['amt'] - details['amt']) > 1e-12:
+                logging.warning("[BOOK] %s 本地持倉 %s 與交易所 %s 不一致，以交易所為準", symbol, local['amt'], details['amt'])
+            self.positions[symbol] = dict(details)
+            self._synced_at[symbol] = self.clock.time()
+        return True
+
+    def apply_fill(self, symbol, side, quantity, price, fill_time_ms=None):
+        """
+        把自己確認的成交記到帳本
+        若串流已經推送了同一時間之後的 ACCOUNT_UPDATE (持倉已包含這筆)，就不重複計算
+        """
+        signed = quantity if side == 'BUY' else -quantity
+        with self._lock:
+            if fill_time_ms is not None and self._stream_time.get(symbol, -1) >= fill_time_ms:
+                return
+            pos = self.positions.setdefault(
+                symbol, {'amt': 0.0, 'entryPrice': 0.0, 'unRealizedProfit': 0.0, 'leverage': 1}
+            )
+            old_amt = pos['amt']
+            new_amt = old_amt + signed
+            if abs(new_amt) < 1e-12:
+                new_amt, pos['entryPrice'] = 0.0, 0.0
+            elif old_amt == 0 or (old_amt > 0) != (new_amt > 0):
+                pos['entryPrice'] = price # 開倉或反手
+            elif abs(new_amt) > abs(old_amt):
+                pos['entryPrice'] = (pos['entryPrice'] * abs(old_amt) + price * quantity) / abs(new_amt)
+            pos['amt'] = new_amt
+            self._version += 1
+
+    def on_account_update(self, event):
+        """ ACCOUNT_UPDATE：a.B 為餘額、a.P 為持倉 (單向持倉模式只看 positionSide=BOTH) """
+        account = event.get('a', {})
+        trade_time = event.get('T', event.get('E', 0))
+        with self._lock:
+            for b in account.get('B', []):
+                self.balances[b['a']] = {'wallet': float(b['wb']), 'cross': float(b.get('cw', b['wb']))}
+            for p in account.get('P', []):
+                if p.get('ps', 'BOTH') != 'BOTH':
+                    continue
+                symbol = p['s']
+                if trade_time < self._stream_time.get(symbol, -1):
+                    continue # 亂序到達的舊事件
+                leverage = self.positions.get(symbol, {}).get('leverage', 1)
+                self.positions[symbol] = {
+                    'amt': float(p['pa']),
+                    'entryPrice': float(p['ep']),
+                    'unRealizedProfit': float(p.get('up', 0)),
+                    'leverage': leverage,
+                }
+                self._stream_time[symbol] = trade_time
+            self._version += 1
+
+    # ==========================================
+    #  背景對帳
+    # ==========================================
+
+    def start_background(self, symbols, interval=300):
+        """ 每 interval 秒在背景用 REST 對帳一次 (不在下單的關鍵路徑上) """
+        def loop():
+            while not self._stop.wait(interval):
+                for symbol in symbols:
+                    try:
+                        self.reconcile(symbol)
+                    except Exception as e:
+                        logging.error("[BOOK] 對帳失敗: %s", e)
+
+        threading.Thread(target=loop, name="account-book-reconcile", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -1,47 +1,83 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from binance.error import ClientError
-from decimal import Decimal, ROUND_DOWN
+from utils.clock import system_clock
+from execution.fill_tracker import order_record, is_final, NOT_SENT
+from execution.symbol_rules import SymbolRulesCache, StepGrid
+from execution.maker_execution import POST_ONLY_REJECTED
 
 class BinanceExecutor:
-    def __init__(self, client):
+    BATCH_SIZE = 5 # batchOrders 單次最多 5 筆
+
+    def __init__(self, client, clock=None, rules=None):
+        """
+        :param rules: (選填) 共用的 SymbolRulesCache，預設讀寫 data_cache/exchange_info_cache.json
+        """
         self.client = client
-        self.symbol_info = {} # 快取交易對規則
+        self.clock = clock or system_clock
+        self.rules = rules or SymbolRulesCache(client, clock=self.clock) # 交易對規則 (磁碟快取)
 
     def _get_step_size(self, symbol):
         """ 獲取該幣種的數量精度 (Step Size) """
-        if symbol not in self.symbol_info:
-            try:
-                info = self.client.exchange_info()
-                for s in info['symbols']:
-                    if s['symbol'] == symbol:
-                        for f in s['filters']:
-                            if f['filterType'] == 'LOT_SIZE':
-                                self.symbol_info[symbol] = float(f['stepSize'])
-                                break
-            except Exception as e:
-                logging.error(f"無法獲取精度資訊: {e}")
-                return None
-        
-        return self.symbol_info.get(symbol)
+        rules = self.rules.get(symbol)
+        if not rules or 'step_size' not in rules:
+            return None
+        return float(rules['step_size'])
 
-    def round_quantity(self, symbol, quantity):
-        """ 將數量修正為符合交易所精度的數值 """
-        step_size = self._get_step_size(symbol)
-        if step_size is None:
+    def round_quantity(self, symbol, quantity, is_market=True):
+        """ 將數量修正為符合交易所精度的數值 (超過單筆上限時截斷) """
+        ticks = self.rules.ticks(symbol)
+        if ticks is None or ticks.qty is None:
             return quantity
-        
-        # 使用 Decimal 進行精確的無條件捨去
-        step_decimal = Decimal(str(step_size))
-        qty_decimal = Decimal(str(quantity))
-        
-        # 量化處理
-        rounded_qty = float(qty_decimal.quantize(step_decimal, rounding=ROUND_DOWN))
-        return rounded_qty
+
+        # 市價單適用 MARKET_LOT_SIZE，沒有就退回 LOT_SIZE
+        grid = ticks.market_qty if is_market else ticks.qty
+        max_qty = ticks.market_max_qty if is_market else ticks.max_qty
+        if max_qty is not None and quantity > max_qty:
+            logging.warning(" [ORDER] 數量 %s 超過單筆上限 %s，已截斷", quantity, max_qty)
+            quantity = max_qty
+
+        # 整數格點運算，結果與 Decimal 無條件捨去逐位元相同
+        return grid.floor_one(quantity)
+
+    def format_quantity(self, symbol, quantity, is_market=True):
+        """ 已捨去的數量 -> 下單參數字串 (依 step 的小數位數，不會出現科學記號) """
+        ticks = self.rules.ticks(symbol)
+        grid = (ticks.market_qty if is_market else ticks.qty) if ticks else None
+        return (grid or StepGrid(0)).format(quantity)
+
+    def format_price(self, symbol, price):
+        ticks = self.rules.ticks(symbol)
+        return ((ticks.price if ticks else None) or StepGrid(0)).format(price)
+
+    def round_price(self, symbol, price):
+        """ 將價格修正為 tickSize 的整數倍 """
+        ticks = self.rules.ticks(symbol)
+        if ticks is None or ticks.price is None:
+            return price
+        return ticks.price.floor_one(price)
+
+    def round_quantities(self, symbol, quantities, is_market=True):
+        """ 陣列版 round_quantity (批次下單用)，沒有規則時原樣回傳 """
+        ticks = self.rules.ticks(symbol)
+        return ticks.round_quantities(quantities, is_market) if ticks else quantities
+
+    def round_prices(self, symbol, prices):
+        ticks = self.rules.ticks(symbol)
+        return ticks.round_prices(prices) if ticks else prices
+
+    def check_min_notional(self, symbol, quantity, price):
+        """ 名目金額 (數量 x 價格) 是否達到交易所門檻；沒有價格或規則時不擋 """
+        rules = self.rules.get(symbol)
+        if not price or not rules or not rules.get('min_notional'):
+            return True
+        return quantity * price >= float(rules['min_notional'])
 
     # 👇 新增：獲取詳細持倉資訊 (給 Position Snapshot 用)
     def get_position_details(self, symbol):
         """
         回傳詳細持倉：數量、入場均價、未實現損益
+        沒有持倉時 amt 為 0 (v3 positionRisk 對空倉回傳空列表)；只有查詢失敗才回傳 None
         """
         try:
             positions = self.client.get_position_risk(symbol=symbol)
@@ -54,10 +90,10 @@ class BinanceExecutor:
                         # 👇 修改這裡：使用 .get() 加上預設值 1，避免 KeyError
                         'leverage': int(p.get('leverage', 1)) 
                     }
-            return None
+            return {'amt': 0.0, 'entryPrice': 0.0, 'unRealizedProfit': 0.0, 'leverage': 1}
         except Exception as e:
             # 建議把這行改成 warning，這樣如果有錯你才會注意到，但不會洗版
-            logging.warning(f" 查詢持倉詳情失敗 (可能是 API 缺欄位): {e}")
+            logging.warning(" 查詢持倉詳情失敗 (可能是 API 缺欄位): %s", e)
             return None
 
     # 👇 修改：只回傳數量的簡化版 (給 main.py 邏輯判斷用)
@@ -67,53 +103,209 @@ class BinanceExecutor:
             return details['amt']
         return 0.0
 
-    def execute_order(self, symbol, side, quantity, reduce_only=False, market_price=None):
-        # 這裡只負責 "發送"，回傳單號即可
-        try:
-            final_qty = self.round_quantity(symbol, quantity)
-            if final_qty <= 0: return None
+    def _market_order_params(self, symbol, side, quantity, reduce_only=False, market_price=None, client_order_id=None):
+        """ 市價單參數 (已修正精度)；數量為 0 或名目金額不足 (不送單) 時回傳 None """
+        final_qty = self.round_quantity(symbol, quantity)
+        if final_qty <= 0: return None
 
-            logging.info(f" [ORDER] 發送訂單 | {side} {symbol} | Qty: {final_qty}")
-            
-            params = {
-                'symbol': symbol, 'side': side, 'type': 'MARKET', 'quantity': final_qty
-            }
-            if reduce_only: params['reduceOnly'] = 'true'
+        # reduceOnly 平倉不受最小名目金額限制
+        if not reduce_only and not self.check_min_notional(symbol, final_qty, market_price):
+            logging.warning(" [ORDER] 名目金額低於交易所門檻，略過 | %s %s | Qty: %s", side, symbol, final_qty)
+            return None
+
+        # RESULT: 市價單的回應直接帶最終成交結果，多數情況不需要再查詢
+        params = {
+            'symbol': symbol, 'side': side, 'type': 'MARKET', 'quantity': self.format_quantity(symbol, final_qty),
+            'newOrderRespType': 'RESULT'
+        }
+        if reduce_only: params['reduceOnly'] = 'true'
+        if client_order_id: params['newClientOrderId'] = client_order_id
+        return params
+
+    def execute_order(self, symbol, side, quantity, reduce_only=False, market_price=None, client_order_id=None):
+        # 這裡只負責 "發送"，回傳單號即可；沒有送出回傳 NOT_SENT，送出後失敗 (結果不明) 回傳 None
+        try:
+            params = self._market_order_params(symbol, side, quantity, reduce_only, market_price, client_order_id)
+            if params is None: return NOT_SENT
 
+            logging.info(" [ORDER] 發送訂單 | %s %s | Qty: %s", side, symbol, params['quantity'])
             response = self.client.new_order(**params)
             return response # 這裡回傳的可能是未成交狀態，沒關係
             
         except Exception as e:
-            logging.error(f"下單失敗: {e}")
+            logging.error("下單失敗: %s", e)
             return None
+
+    def execute_orders(self, orders, max_workers=4):
+        """
+        批次送出市價單：每 BATCH_SIZE 筆一個 batchOrders 請求，多個請求並行
+        :param orders: [{'symbol', 'side', 'quantity', 'reduce_only', 'market_price', 'client_order_id'}, ...]
+        :return: 與 orders 同順序的回應列表，個別失敗 (交易所拒單 / 整批請求失敗) 的位置為 None，
+                 沒有送出 (數量為 0 / 名目金額不足 / 參數錯誤) 的位置為 NOT_SENT
+        """
+        responses = [NOT_SENT] * len(orders)
+        pending = []
+        for i, order in enumerate(orders):
+            try:
+                params = self._market_order_params(
+                    order['symbol'], order['side'], order['quantity'], order.get('reduce_only', False),
+                    order.get('market_price'), order.get('client_order_id')
+                )
+            except Exception as e:
+                logging.error("下單參數錯誤 (%s): %s", order['symbol'], e)
+                params = None
+            if params is not None:
+                pending.append((i, params))
+                responses[i] = None
+
+        if len(pending) == 1:
+            i, _ = pending[0]
+            order = orders[i]
+            responses[i] = self.execute_order(
+                order['symbol'], order['side'], order['quantity'], order.get('reduce_only', False),
+                order.get('market_price'), order.get('client_order_id')
+            )
+            return responses
+
+        chunks = [pending[i:i + self.BATCH_SIZE] for i in range(0, len(pending), self.BATCH_SIZE)]
+
+        def send(chunk):
+            # batchOrders 的每個欄位都要是字串 (connector 會直接序列化成 JSON)
+            payload = [{k: str(v) for k, v in params.items()} for _, params in chunk]
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(" [ORDER] 批次發送 %s 筆 | %s", len(chunk),
+                             ", ".join(f"{p['side']} {p['symbol']} {p['quantity']}" for _, p in chunk))
+            try:
+                results = self.client.new_batch_order(batchOrders=payload)
+            except Exception as e:
+                # 整批結果不明：留給呼叫端以 clientOrderId 逐筆查詢
+                logging.error("批次下單失敗: %s", e)
+                return
+            for (i, params), result in zip(chunk, results):
+                if isinstance(result, dict) and 'code' in result and 'orderId' not in result:
+                    logging.error("下單失敗 (%s): %s - %s", params['symbol'], result.get('code'), result.get('msg'))
+                else:
+                    responses[i] = result
+
+        if chunks:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                list(pool.map(send, chunks))
+        return responses
         
-    def fetch_order_status(self, symbol, order_id):
+    def get_book_ticker(self, symbol):
+        """ 最佳買賣價 {'bid': float, 'ask': float}，失敗回傳 None """
+        try:
+            book = self.client.book_ticker(symbol=symbol)
+            return {'bid': float(book['bidPrice']), 'ask': float(book['askPrice'])}
+        except Exception as e:
+            logging.error("查詢最佳買賣價失敗 (%s): %s", symbol, e)
+            return None
+
+    def place_limit_order(self, symbol, side, quantity, price, reduce_only=False, post_only=True, client_order_id=None):
+        """
+        限價單 (post_only 時為 GTX：會立即成交就直接被拒，保證是 maker)
+        GTX 被拒回傳 POST_ONLY_REJECTED (由呼叫端重新報價)，其他失敗回傳 None
+        """
+        try:
+            final_qty = self.round_quantity(symbol, quantity, is_market=False)
+            if final_qty <= 0:
+                return None
+            params = {
+                'symbol': symbol, 'side': side, 'type': 'LIMIT',
+                'quantity': self.format_quantity(symbol, final_qty, is_market=False),
+                'price': self.format_price(symbol, self.round_price(symbol, price)),
+                'timeInForce': 'GTX' if post_only else 'GTC',
+                'newOrderRespType': 'RESULT'
+            }
+            if reduce_only: params['reduceOnly'] = 'true'
+            if client_order_id: params['newClientOrderId'] = client_order_id
+            return self.client.new_order(**params)
+        except ClientError as e:
+            if e.error_code == -5022:
+                logging.info(" [ORDER] 掛單價已被穿過 (GTX 被拒)，重新報價 | %s %s @ %s", side, symbol, price)
+                return POST_ONLY_REJECTED
+            logging.error("限價單失敗: %s - %s", e.error_code, e.error_message)
+            return None
+        except Exception as e:
+            logging.error("限價單失敗: %s", e)
+            return None
+
+    def cancel_order(self, symbol, order_id):
+        """ 撤單並回傳撤單當下的成交紀錄 (可能已部分成交)；撤單失敗 (例如剛好成交) 時改查詢 """
+        try:
+            return self.parse_order(self.client.cancel_order(symbol=symbol, orderId=order_id))
+        except Exception as e:
+            logging.info(" [ORDER] 撤單失敗 (ID: %s)，改查詢訂單狀態: %s", order_id, e)
+            return self.fetch_order_status(symbol, order_id)
+
+    def fetch_order_status(self, symbol, order_id=None, client_order_id=None):
         """
-        根據 Order ID 向交易所查詢最終成交結果
+        根據 Order ID (或 clientOrderId) 向交易所查詢最終成交結果
         """
         try:
             # 呼叫幣安 API 查詢訂單詳情
-            order_info = self.client.query_order(symbol=symbol, orderId=order_id)
+            if order_id is None:
+                order_info = self.client.query_order(symbol=symbol, origClientOrderId=client_order_id)
+            else:
+                order_info = self.client.query_order(symbol=symbol, orderId=order_id)
             
-            # 解析最精確的成交資訊
-            executed_qty = float(order_info.get('executedQty', 0))
-            cum_quote = float(order_info.get('cumQuote', 0)) # 總成交金額
-            status = order_info.get('status', 'UNKNOWN')
-            
-            avg_price = 0.0
-            if executed_qty > 0:
-                avg_price = cum_quote / executed_qty
-            
-            return {
-                'orderId': str(order_id),
-                'status': status,
-                'executedQty': executed_qty,
-                'avgPrice': avg_price,
-                'notional': cum_quote
-            }
+            return self.parse_order(order_info)
+        except Exception as e:
+            logging.error("查詢訂單狀態失敗 (ID: %s): %s", order_id or client_order_id, e)
+            return None
+
+    def fetch_orders(self, symbol, start_time=None, limit=1000, max_pages=20):
+        """
+        查詢 start_time 之後的所有訂單 (對帳用)，失敗回傳 None
+        allOrders 一頁最多 limit 筆：滿頁就從這頁最大的 orderId + 1 接著往後查，直到不滿一頁
+        """
+        params = {'symbol': symbol, 'limit': limit}
+        if start_time is not None:
+            params['startTime'] = int(start_time)
+        orders = []
+        try:
+            for _ in range(max_pages):
+                page = self.client.get_all_orders(**params)
+                orders.extend(page)
+                if len(page) < limit:
+                    return orders
+                params = {'symbol': symbol, 'limit': limit, 'orderId': max(int(o['orderId']) for o in page) + 1}
         except Exception as e:
-            logging.error(f"查詢訂單狀態失敗 (ID: {order_id}): {e}")
+            logging.error("查詢歷史訂單失敗 (%s): %s", symbol, e)
             return None
+        # 只拿到一部分就對帳，沒查到的會被誤判成沒有成交
+        logging.error("查詢歷史訂單失敗 (%s): 超過 %s 頁 (%s 筆)", symbol, max_pages, len(orders))
+        return None
+
+    @staticmethod
+    def parse_order(order_info):
+        """ 下單 / 查單回應 -> 統一的成交紀錄 (cumQuote 為總成交金額) """
+        record = order_record(
+            order_info.get('orderId'), order_info.get('status', 'UNKNOWN'),
+            order_info.get('executedQty', 0), order_info.get('cumQuote', 0)
+        )
+        record['updateTime'] = order_info.get('updateTime')
+        record['clientOrderId'] = order_info.get('clientOrderId')
+        return record
+
+    def wait_for_fill(self, symbol, order_id, timeout=10, first_delay=0.05, factor=2.0, max_delay=1.0):
+        """
+        沒有 User Data Stream 時的退路：指數退避輪詢
+        先隔 50ms 查一次，之後間隔加倍 (上限 1 秒)，
+        快速成交的單幾十毫秒內就回來，慢的單也會一直等到 timeout
+        """
+        deadline = self.clock.time() + timeout
+        delay = first_delay
+        record = None
+        while True:
+            record = self.fetch_order_status(symbol, order_id) or record
+            if is_final(record):
+                return record
+            remaining = deadline - self.clock.time()
+            if remaining <= 0:
+                return record
+            self.clock.sleep(min(delay, remaining))
+            delay = min(delay * factor, max_delay)
     
     def set_leverage(self, symbol, leverage):
         """
@@ -125,9 +317,9 @@ class BinanceExecutor:
                 symbol=symbol, 
                 leverage=leverage
             )
-            logging.info(f" [CONFIG] 成功設定 {symbol} 槓桿為 {leverage}x")
+            logging.info(" [CONFIG] 成功設定 %s 槓桿為 %sx", symbol, leverage)
             return response
         except ClientError as e:
-            logging.error(f" 設定槓桿失敗: {e.error_code} - {e.error_message}")
+            logging.error(" 設定槓桿失敗: %s - %s", e.error_code, e.error_message)
         except Exception as e:
-            logging.error(f" 設定槓桿發生未知錯誤: {e}")
\ No newline at end of file
+            logging.error(" 設定槓桿發生未知錯誤: %s", e)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+# 訂單不會再變動的狀態
+FINAL_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
+# 執行器確定沒有送出 (數量捨去後為 0 / 名目金額不足)；回傳 None 則代表送出了但結果不明
+NOT_SENT = 'NOT_SENT'
+
+
+def order_record(order_id, status, executed_qty, cum_quote):
+    """ 統一的成交紀錄格式 (與 BinanceExecutor.fetch_order_status 相同) """
+    executed_qty = float(executed_qty or 0)
+    cum_quote = float(cum_quote or 0)
+    return {
+        'orderId': str(order_id),
+        'status': status,
+        'executedQty': executed_qty,
+        'avgPrice': cum_quote / executed_qty if executed_qty > 0 else 0.0,
+        'notional': cum_quote,
+    }
+
+
+def is_final(record):
+    return bool(record) and record.get('status') in FINAL_STATUSES
+
+
+class FillTracker:
+    """
+    用 User Data Stream 的 ORDER_TRADE_UPDATE 追蹤訂單成交
+    事件可能比 wait() 更早到 (市價單常常在 REST 回應之前就推送)，
+    所以所有事件都先存起來，wait() 進來時先查表，沒有才等通知
+    """
+
+    def __init__(self, stream=None, max_orders=1000):
+        self.stream = stream
+        self.max_orders = max_orders
+        self._orders = OrderedDict()
+        self._cond = threading.Condition()
+        if stream is not None:
+            stream.subscribe('ORDER_TRADE_UPDATE', self.on_order_update)
+
+    @property
+    def active(self):
+        """ 串流連線中才值得等事件，否則交給輪詢 """
+        return self.stream is not None and self.stream.connected
+
+    def on_order_update(self, event):
+        order = event['o']
+        price = float(order.get('ap', 0) or 0)
+        qty = float(order.get('z', 0) or 0)
+        record = order_record(order['i'], order.get('X'), qty, price * qty)
+        record['clientOrderId'] = order.get('c')
+        record['commission'] = float(order.get('n', 0) or 0)
+        record['eventTime'] = event.get('E')
+
+        with self._cond:
+            key = record['orderId']
+            previous = self._orders.get(key)
+            # 手續費是逐筆推送的，累加起來
+            if previous is not None:
+                record['commission'] += previous.get('commission', 0.0)
+            self._orders[key] = record
+            self._orders.move_to_end(key)
+            while len(self._orders) > self.max_orders:
+                self._orders.popitem(last=False)
+            self._cond.notify_all()
+
+    def get(self, order_id):
+        with self._cond:
+            return self._orders.get(str(order_id))
+
+    def wait(self, order_id, timeout):
+        """
+        等到訂單進入最終狀態並回傳紀錄
+        逾時則回傳目前最新的紀錄 (可能是部分成交或 None)
+        """
+        key = str(order_id)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                record = self._orders.get(key)
+                if is_final(record):
+                    return record
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return record
+                self._cond.wait(remaining)
@@ -0,0 +1,129 @@
+import logging
+
+from utils.clock import system_clock
+from execution.fill_tracker import order_record, is_final, NOT_SENT
+
+# place_limit_order 的回傳值：GTX 被拒 (掛單價已被穿過)，依新報價重掛即可；其他錯誤回傳 None
+POST_ONLY_REJECTED = 'POST_ONLY_REJECTED'
+
+
+def slippage_bps(side, avg_price, ref_price):
+    """ 成交均價相對參考價的滑價 (基點)，正數代表成本 (買貴 / 賣便宜) """
+    if not ref_price or not avg_price:
+        return 0.0
+    sign = 1.0 if side == 'BUY' else -1.0
+    return sign * (avg_price - ref_price) / ref_price * 10000.0
+
+
+class MakerExecution:
+    """
+    被動 (maker) 下單
+    1. 以 LIMIT GTX 掛在己方最佳價 (買單掛 bid、賣單掛 ask)，只會以 maker 成交
+    2. 每 reprice_interval 秒沒成交就撤單，依最新的最佳價重掛 (部分成交的量扣掉)
+    3. 超過 deadline 秒還沒成交完，剩下的量改用市價單
+    回傳合併後的成交紀錄，另外帶 maker_qty (以掛單成交的量) 與 slippage_bps (相對 ref_price)
+    子訂單的 clientOrderId 為 "<client_order_id>.<n>"，下單日誌對帳時會一起加總
+    """
+
+    def __init__(self, executor, fill_tracker=None, clock=None, reprice_interval=2.0, deadline=30.0):
+        self.executor = executor
+        self.fill_tracker = fill_tracker
+        self.clock = clock or system_clock
+        self.reprice_interval = reprice_interval
+        self.deadline = deadline
+
+    def _wait(self, symbol, order_id, timeout):
+        if self.fill_tracker is not None and self.fill_tracker.active:
+            record = self.fill_tracker.wait(order_id, timeout)
+            if is_final(record):
+                return record
+            return self.executor.fetch_order_status(symbol, order_id) or record
+        return self.executor.wait_for_fill(symbol, order_id, timeout=timeout)
+
+    def _remaining(self, symbol, target, filled_qty):
+        """
+        剩餘數量 = 目標 - 累計成交，再捨去到 step
+        浮點數相減可能差一點點 (0.009 - 0.006 = 0.00299...)，先加上遠小於 step 的容差，
+        否則會整整少掉一個 step
+        """
+        left = target - filled_qty
+        if left <= 0:
+            return 0.0
+        return self.executor.round_quantity(symbol, left + max(target, 1.0) * 1e-12, is_market=False)
+
+    def execute(self, symbol, side, quantity, ref_price=None, reduce_only=False, client_order_id=None):
+        started = self.clock.time()
+        deadline = started + self.deadline
+        target = self.executor.round_quantity(symbol, quantity, is_market=False)
+        remaining = target
+        filled_qty = filled_quote = maker_qty = 0.0
+        last_order_id = None
+        child = 0
+
+        def child_id():
+            return f"{client_order_id}.{child}" if client_order_id else None
+
+        # --- 1. 掛單 / 撤單重掛 ---
+        while remaining > 0 and self.clock.time() < deadline:
+            touch = self.executor.get_book_ticker(symbol)
+            if not touch:
+                break
+            price = touch['bid'] if side == 'BUY' else touch['ask']
+            child += 1
+            response = self.executor.place_limit_order(
+                symbol, side, remaining, price, reduce_only=reduce_only, client_order_id=child_id()
+            )
+            if response == POST_ONLY_REJECTED:
+                # GTX 被拒 (價格剛好移動)：稍等後依新報價重掛
+                self.clock.sleep(min(0.1, max(0.0, deadline - self.clock.time())))
+                continue
+            if not response:
+                # 保證金不足、精度錯誤等重掛也不會成功的錯誤：不再掛單，剩下的量交給市價單
+                logging.warning("[MAKER] %s 掛單失敗，停止掛單 (剩餘 %s)", symbol, remaining)
+                break
+
+            last_order_id = response.get('orderId')
+            record = self.executor.parse_order(response)
+            if not is_final(record):
+                timeout = min(self.reprice_interval, max(0.0, deadline - self.clock.time()))
+                record = self._wait(symbol, last_order_id, timeout)
+            if not is_final(record):
+                record = self.executor.cancel_order(symbol, last_order_id) or record
+
+            qty = record['executedQty'] if record else 0.0
+            if qty > 0:
+                filled_qty += qty
+                filled_quote += record['notional']
+                maker_qty += qty
+                remaining = self._remaining(symbol, target, filled_qty)
+            if record and record['status'] == 'FILLED':
+                break
+            logging.info("[MAKER] %s 第 %s 次掛單 @ %s 未完全成交，剩餘 %s", symbol, child, price, remaining)
+
+        # --- 2. 逾時：剩下的量改用市價單 ---
+        if remaining > 0:
+            child += 1
+            logging.warning("[MAKER] %s 掛單逾時，剩餘 %s 改用市價單", symbol, remaining)
+            response = self.executor.execute_order(
+                symbol, side, remaining, reduce_only=reduce_only, market_price=ref_price, client_order_id=child_id()
+            )
+            if response and response != NOT_SENT:
+                last_order_id = response.get('orderId')
+                record = self.executor.parse_order(response)
+                if not is_final(record):
+                    record = self._wait(symbol, last_order_id, self.reprice_interval * 5)
+                if record and record['executedQty'] > 0:
+                    filled_qty += record['executedQty']
+                    filled_quote += record['notional']
+
+        result = order_record(last_order_id, 'FILLED' if filled_qty > 0 else 'EXPIRED', filled_qty, filled_quote)
+        result['updateTime'] = int(self.clock.time() * 1000)
+        result['maker_qty'] = maker_qty
+        result['slippage_bps'] = slippage_bps(side, result['avgPrice'], ref_price)
+        if filled_qty > 0:
+            logging.info(
+                "[MAKER] %s %s %s @ %.2f | maker %.0f%% | 滑價 %.2f bps | %s 張子單 | %.2fs",
+                side, symbol, filled_qty, result['avgPrice'], maker_qty / filled_qty * 100,
+                result['slippage_bps'], child, self.clock.time() - started
+            )
+        return result
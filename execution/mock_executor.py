@@ -1,12 +1,19 @@
 import logging
 import uuid
-import time
+from utils.clock import system_clock
 
 class MockExecutor:
-    def __init__(self):
+    def __init__(self, clock=None, latency=0.2):
+        """
+        :param clock: 時鐘物件 (預設為真實時鐘，回測時傳入 SimulatedClock)
+        :param latency: 模擬網路延遲 (秒)，回測時設為 0
+        """
         # 在記憶體中模擬帳本
         # 格式: {'BTCUSDT': 0.0, 'ETHUSDT': 0.0}
         self.positions = {} 
+        self.clock = clock or system_clock
+        self.latency = latency
+        self.mock_price = 93000.0 # 沒有傳入市價時的預設成交價
         logging.info(" [Mock Mode] 模擬執行器已啟動，所有訂單均為虛擬。")
 
     def get_current_position(self, symbol):
@@ -17,40 +24,9 @@ class MockExecutor:
         # logging.info(f" [Mock] 查詢持倉 {symbol}: {pos}")
         return pos
 
-    def execute_order(self, symbol, side, quantity, reduce_only=False):
-        """
-        模擬下單
-        """
-        logging.info(f" [Mock] 收到訂單請求: {side} {quantity} {symbol} (ReduceOnly={reduce_only})")
-        
-        # 模擬網路延遲
-        time.sleep(0.5)
-        
-        # 更新本地虛擬持倉
-        current_pos = self.positions.get(symbol, 0.0)
-        
-        if side == 'BUY':
-            self.positions[symbol] = current_pos + quantity
-        elif side == 'SELL':
-            # 如果是 reduce_only (平倉)，確保不會賣過頭變成做空
-            if reduce_only:
-                new_pos = max(0, current_pos - quantity)
-                self.positions[symbol] = new_pos
-            else:
-                self.positions[symbol] = current_pos - quantity
-
-        # 模擬幣安回傳的訂單格式
-        fake_order = {
-            'orderId': str(uuid.uuid4())[:8], # 隨機產生一個 ID
-            'symbol': symbol,
-            'status': 'FILLED',
-            'origQty': quantity,
-            'side': side,
-            'type': 'MARKET'
-        }
-        
-        logging.info(f" [Mock] 訂單成交！虛擬持倉變更為: {self.positions[symbol]}")
-        return fake_order
+    def _fill_price(self, side, market_price):
+        """ 決定成交價：如果有傳入市價就用市價，否則用預設的 93000 (子類別可覆寫加入滑價) """
+        return market_price if market_price else self.mock_price
 
     def get_position_details(self, symbol):
         # 模擬回傳詳細結構
@@ -62,12 +38,11 @@ class MockExecutor:
             'leverage': 1
         }
         
-    def execute_order(self, symbol, side, quantity, reduce_only=False, market_price=None):
+    def execute_order(self, symbol, side, quantity, reduce_only=False, market_price=None, client_order_id=None):
         logging.info(f" [Mock] 收到訂單: {side} {quantity} {symbol}")
-        time.sleep(0.2)
+        self.clock.sleep(self.latency)
         
-        # 決定成交價：如果有傳入市價就用市價，否則用預設的 93000
-        fill_price = market_price if market_price else self.mock_price
+        fill_price = self._fill_price(side, market_price)
 
         # 1. 更新虛擬持倉
         current_pos = self.positions.get(symbol, 0.0)
@@ -85,6 +60,7 @@ class MockExecutor:
         # 3. 回傳
         return {
             'orderId': str(uuid.uuid4())[:8],
+            'clientOrderId': client_order_id,
             'symbol': symbol,
             'status': 'FILLED',
             'executedQty': quantity,
@@ -93,6 +69,14 @@ class MockExecutor:
             'type': 'MARKET'
         }
    
+    def execute_orders(self, orders, max_workers=4):
+        """ 批次下單介面 (與 BinanceExecutor 相同)，模擬盤逐筆成交 """
+        return [
+            self.execute_order(o['symbol'], o['side'], o['quantity'], reduce_only=o.get('reduce_only', False),
+                               market_price=o.get('market_price'), client_order_id=o.get('client_order_id'))
+            for o in orders
+        ]
+
     def fetch_order_status(self, symbol, order_id):
         # 模擬盤：直接假設已經全部成交
         # 在這裡我們需要知道之前的下單資訊，為了簡化，
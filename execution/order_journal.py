@@ -0,0 +1,136 @@
+import json
+import logging
+from collections import defaultdict
+
+from utils.clock import system_clock
+from execution.fill_tracker import order_record, is_final
+
+# 日誌狀態
+PENDING = 'PENDING'   # 已寫入，送單結果未知 (可能根本沒送出，也可能已在交易所成交)
+SENT = 'SENT'         # 交易所已回應，尚未完成歸因
+DONE = 'DONE'         # 成交 (或內部互抵) 已歸因到各策略，不能再重做
+FAILED = 'FAILED'     # 確定沒有在交易所成交
+
+OPEN_STATUSES = (PENDING, SENT)
+
+
+def make_client_order_id(symbol, bar_time, seq=0):
+    """
+    由 (交易對, K 線時間, 序號) 決定的 newClientOrderId
+    重啟後重跑同一根 K 線會得到同一個 id，交易所與日誌都能認出是同一筆
+    格式符合幣安限制 ^[.A-Z:/a-z0-9_-]{1,36}$
+    """
+    return f"qt-{symbol[:12]}-{int(bar_time)}-{seq}"
+
+
+def merge_records(records):
+    """
+    同一筆日誌底下的多張子單 (maker 撤單重掛 / 市價補單) 合併成一筆成交紀錄
+    還有子單沒結束時回傳那張子單
+    """
+    if not records:
+        return None
+    for record in records:
+        if not is_final(record):
+            return record
+    executed = sum(r['executedQty'] for r in records)
+    quote = sum(r['notional'] for r in records)
+    return order_record(records[-1]['orderId'], 'FILLED' if executed > 0 else records[-1]['status'], executed, quote)
+
+
+class OrderJournal:
+    """
+    Write-Ahead 下單日誌 (存在 order_journal 表)
+    1. begin(): 送單前寫入 PENDING，寫不進去就不送單
+    2. mark_sent() / complete() / fail(): 依序推進狀態
+    3. reconcile(): 把 PENDING / SENT 的紀錄用 allOrders (分頁) 查詢對帳，
+       結果 (有沒有成交都一樣) 交給 on_resolved 補做歸因，之後標記 DONE / FAILED
+    歸因與狀態更新緊接在一起，未完成的紀錄一定還沒歸因過
+    """
+
+    def __init__(self, db, clock=None):
+        self.db = db
+        self.clock = clock or system_clock
+
+    def _now_ms(self):
+        return int(self.clock.time() * 1000)
+
+    def get(self, client_order_id):
+        rows = self.db.load_journal(client_order_id=client_order_id)
+        if not rows:
+            return None
+        entry = rows[0]
+        entry['plan'] = json.loads(entry.pop('plan_json') or '{}')
+        return entry
+
+    def begin(self, client_order_id, symbol, side, quantity, bar_time, plan):
+        """ 送單前呼叫；回傳 False 代表日誌寫入失敗，呼叫端不可送單 """
+        now = self._now_ms()
+        try:
+            self.db.journal_insert({
+                'client_order_id': client_order_id, 'symbol': symbol, 'side': side,
+                'quantity': quantity, 'bar_time': bar_time, 'plan_json': json.dumps(plan),
+                'status': PENDING, 'created_at': now, 'updated_at': now,
+            })
+            return True
+        except Exception as e:
+            logging.error("[JOURNAL] 寫入下單日誌失敗，取消送單 (%s): %s", client_order_id, e)
+            return False
+
+    def _update(self, client_order_id, **fields):
+        try:
+            self.db.journal_update(client_order_id, updated_at=self._now_ms(), **fields)
+        except Exception as e:
+            logging.error("[JOURNAL] 更新下單日誌失敗 (%s): %s", client_order_id, e)
+
+    def mark_sent(self, client_order_id, order_id):
+        self._update(client_order_id, status=SENT, order_id=str(order_id))
+
+    def complete(self, client_order_id, executed_qty=0.0, avg_price=0.0):
+        self._update(client_order_id, status=DONE, executed_qty=executed_qty, avg_price=avg_price)
+
+    def fail(self, client_order_id):
+        self._update(client_order_id, status=FAILED)
+
+    def reconcile(self, executor, symbol, on_resolved):
+        """
+        對帳：查詢 allOrders (從最早的未完成紀錄開始，分頁查完)，以 clientOrderId 比對
+        :param on_resolved: callback(entry, record)，record 為 None 代表交易所沒有成交
+        :return: 處理的紀錄數
+        """
+        entries = self.db.load_journal(symbol=symbol, statuses=OPEN_STATUSES)
+        if not entries:
+            return 0
+
+        started = self.clock.time()
+        since = min(e['created_at'] for e in entries) - 60_000
+        orders = executor.fetch_orders(symbol, start_time=since)
+        if orders is None:
+            logging.error("[JOURNAL] 無法查詢 %s 的歷史訂單，%s 筆未完成紀錄留待下次對帳", symbol, len(entries))
+            return 0
+        # 子單的 clientOrderId 為 "<日誌 id>.<n>"
+        by_client_id = defaultdict(list)
+        for order in orders:
+            by_client_id[(order.get('clientOrderId') or '').split('.', 1)[0]].append(executor.parse_order(order))
+
+        for entry in entries:
+            entry['plan'] = json.loads(entry.pop('plan_json') or '{}')
+            client_id = entry['client_order_id']
+            record = merge_records(by_client_id.get(client_id))
+            if record and not is_final(record):
+                logging.warning("[JOURNAL] %s 仍在交易所掛單中 (%s)，留待下次對帳", client_id, record['status'])
+            elif record and record['executedQty'] > 0:
+                logging.warning("[JOURNAL] %s 在交易所已成交 %s，補做歸因", client_id, record['executedQty'])
+                on_resolved(entry, record)
+                self.complete(client_id, record['executedQty'], record['avgPrice'])
+            elif entry['quantity'] <= 0:
+                # 完全內部互抵，本來就不用送單
+                on_resolved(entry, None)
+                self.complete(client_id)
+            else:
+                logging.warning("[JOURNAL] %s 交易所沒有成交紀錄，標記失敗", client_id)
+                on_resolved(entry, None)
+                self.fail(client_id)
+
+        logging.info("[JOURNAL] %s 對帳完成：%s 筆，耗時 %.3fs", symbol, len(entries), self.clock.time() - started)
+        return len(entries)
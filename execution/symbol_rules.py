@@ -0,0 +1,295 @@
+import json
+import logging
+import math
+import os
+import threading
+from decimal import Decimal, ROUND_DOWN
+
+import numpy as np
+
+from utils.clock import system_clock
+
+# 執行時產生的快取放在 data_cache/ (與數據源快取同一個目錄，不進版本控制)
+DEFAULT_CACHE_PATH = os.path.join("data_cache", "exchange_info_cache.json")
+
+
+def parse_symbol(symbol_info):
+    """
+    exchange_info 裡單一交易對 -> 下單需要的規則
+    價格 / 數量類的欄位保留原始字串，需要精確運算時直接轉 Decimal
+    """
+    rules = {
+        'status': symbol_info.get('status'),
+        'quantity_precision': symbol_info.get('quantityPrecision'),
+        'price_precision': symbol_info.get('pricePrecision'),
+    }
+    for f in symbol_info.get('filters', []):
+        kind = f.get('filterType')
+        if kind == 'LOT_SIZE':
+            rules.update(step_size=f['stepSize'], min_qty=f['minQty'], max_qty=f['maxQty'])
+        elif kind == 'MARKET_LOT_SIZE':
+            rules.update(market_step_size=f['stepSize'], market_min_qty=f['minQty'], market_max_qty=f['maxQty'])
+        elif kind == 'PRICE_FILTER':
+            rules.update(tick_size=f['tickSize'], min_price=f['minPrice'], max_price=f['maxPrice'])
+        elif kind == 'MIN_NOTIONAL':
+            # 合約是 'notional'，現貨是 'minNotional'
+            rules['min_notional'] = f.get('notional', f.get('minNotional'))
+    return rules
+
+
+def floor_to_step(value, step):
+    """
+    以 Decimal 無條件捨去到 step 的整數倍
+    (不能只用 quantize：tickSize 像 '0.10' 或 '5' 時，quantize 只會對齊小數位數)
+    """
+    step_decimal = Decimal(str(step))
+    if step_decimal <= 0:
+        return float(value)
+    units = (Decimal(str(value)) / step_decimal).to_integral_value(rounding=ROUND_DOWN)
+    return float(units * step_decimal)
+
+
+# 整數運算保證精確的上限 (float64 的 53 bit 尾數)
+_EXACT_INT = 2 ** 53
+
+
+class StepGrid:
+    """
+    step 預先拆成整數：step = units / scale (例如 '0.10' -> 10 / 100)
+    floor() 與 floor_to_step() 的結果逐位元相同，但不用建立 Decimal
+
+    為什麼是精確的：
+    - 候選格數 k 由浮點數估算，誤差不到 1 格，再用 k*units/scale 與原值比較修正一次
+    - k*units 是 < 2^53 的整數、scale 是 10 的次方，IEEE 除法正確捨入，
+      所以 k*units/scale 就是離格點最近的 double，與 float(Decimal 格點) 相同
+    - 浮點數的捨入是單調的，比較 double 就等於比較 str(value) 的十進位值
+      (格點最多 15 位有效數字，必定能 round-trip，相等時十進位值也相等)
+    超出範圍 (|value / step| >= 2^53、NaN、inf) 的元素退回 Decimal 計算
+    """
+
+    def __init__(self, step):
+        self.step = str(step)
+        sign, digits, exponent = Decimal(self.step).as_tuple()
+        units = int(''.join(map(str, digits)) or 0)
+        if sign or units == 0 or not isinstance(exponent, int):
+            self.units, self.scale = 0, 1 # step <= 0：不捨去
+        elif exponent >= 0:
+            self.units, self.scale = units * 10 ** exponent, 1
+        else:
+            self.units, self.scale = units, 10 ** -exponent
+
+    def floor(self, values):
+        """ 陣列版：無條件捨去 (向 0) 到 step 的整數倍，回傳 float64 ndarray """
+        values = np.asarray(values, dtype=np.float64)
+        if self.units == 0:
+            return values.copy()
+        units, scale = float(self.units), float(self.scale)
+        magnitude = np.abs(values)
+        k = np.floor(magnitude * scale / units)
+        ok = np.isfinite(k) & ((k + 1) * units < _EXACT_INT)
+        k = np.where(ok, k, 0.0)
+        k -= magnitude < k * units / scale
+        k += magnitude >= (k + 1) * units / scale
+        out = np.copysign(k * units / scale, values)
+        if not ok.all():
+            bad = np.flatnonzero(~ok)
+            out[bad] = [floor_to_step(v, self.step) for v in values[bad]]
+        return out
+
+    def floor_one(self, value):
+        """ 單一數值版 (同樣的整數運算，不經過 numpy) """
+        value = float(value)
+        if self.units == 0:
+            return value
+        magnitude = abs(value)
+        k = math.floor(magnitude * self.scale / self.units) if math.isfinite(magnitude) else None
+        if k is None or (k + 1) * self.units >= _EXACT_INT:
+            return floor_to_step(value, self.step)
+        if magnitude < k * self.units / self.scale:
+            k -= 1
+        elif magnitude >= (k + 1) * self.units / self.scale:
+            k += 1
+        return math.copysign(k * self.units / self.scale, value)
+
+    def nearest_one(self, value):
+        """ 四捨五入到最近的格點 (消除按比例分配留下的浮點誤差，例如 0.0079999 -> 0.008) """
+        value = float(value)
+        if self.units == 0 or not math.isfinite(value):
+            return value
+        return round(value * self.scale / self.units) * self.units / self.scale
+
+    def format(self, value):
+        """ 送給交易所的字串：固定 step 的小數位數 (str(1e-05) 是科學記號，幣安不收) """
+        if self.units == 0:
+            return format(Decimal(repr(float(value))), 'f')
+        return f"{float(value):.{len(str(self.scale)) - 1}f}"
+
+
+class SymbolTicks:
+    """
+    單一交易對預先算好的整數格點 (數量 step / 市價單 step / 價格 tick) 與上下限
+    給批次下單、回測成交模擬這類一次處理大量數量 / 價格的地方使用
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        step = rules.get('step_size')
+        self.qty = StepGrid(step) if step else None
+        self.market_qty = StepGrid(rules.get('market_step_size', step)) if step else None
+        self.price = StepGrid(rules['tick_size']) if rules.get('tick_size') else None
+        self.max_qty = float(rules['max_qty']) if rules.get('max_qty') else None
+        self.market_max_qty = float(rules.get('market_max_qty', rules.get('max_qty') or 'inf'))
+        self.min_notional = float(rules['min_notional']) if rules.get('min_notional') else None
+
+    def round_quantities(self, quantities, is_market=True):
+        """ 截到單筆上限後捨去到 step；與 BinanceExecutor.round_quantity 逐筆相同 """
+        quantities = np.asarray(quantities, dtype=np.float64)
+        grid = self.market_qty if is_market else self.qty
+        if grid is None:
+            return quantities.copy()
+        max_qty = self.market_max_qty if is_market else self.max_qty
+        if max_qty is not None:
+            quantities = np.where(quantities > max_qty, max_qty, quantities)
+        return grid.floor(quantities)
+
+    def round_prices(self, prices):
+        prices = np.asarray(prices, dtype=np.float64)
+        return self.price.floor(prices) if self.price else prices.copy()
+
+    def notional_ok(self, quantities, prices):
+        """ 名目金額是否達到門檻 (布林陣列)；沒有價格 (0 / NaN) 或規則時不擋 """
+        quantities = np.asarray(quantities, dtype=np.float64)
+        prices = np.broadcast_to(np.asarray(prices, dtype=np.float64), quantities.shape)
+        if self.min_notional is None:
+            return np.ones(quantities.shape, dtype=bool)
+        no_price = (prices == 0) | np.isnan(prices)
+        return no_price | (quantities * prices >= self.min_notional)
+
+
+class SymbolRulesCache:
+    """
+    全部交易對的下單規則 (LOT_SIZE / MARKET_LOT_SIZE / PRICE_FILTER / MIN_NOTIONAL)
+    - 存在本機 JSON，重啟後直接讀檔，第一筆訂單不需要再打 exchange_info
+    - 超過 ttl 的舊資料照樣可以用，但會在背景執行緒重新整理
+    - get() 就是一次 dict 查詢；重新整理時整份換掉 reference，讀取端不用上鎖
+    - 沒有快取或查不到交易對時，get() 會等正在進行的更新 (或自己同步抓一次)，
+      不能回傳 None 讓呼叫端送出未捨去的數量；查不到的交易對每 retry_interval 秒最多重抓一次
+    """
+
+    def __init__(self, client, path=DEFAULT_CACHE_PATH, ttl=6 * 3600, clock=None, retry_interval=30.0):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock or system_clock
+        self.retry_interval = retry_interval
+        self.rules = {}
+        self._ticks = {}
+        self.updated_at = 0.0
+        self._attempted_at = None # 最後一次嘗試抓取的時間 (不論成敗)
+        self._generation = 0      # 每次成功更新 +1，等鎖的執行緒用來判斷別人是否已經抓完
+        self._refreshing = threading.Lock()
+        self._stop = threading.Event()
+        self._load()
+
+    @property
+    def is_stale(self):
+        return self.clock.time() - self.updated_at > self.ttl
+
+    def get(self, symbol):
+        """ 回傳該交易對的規則 dict，未知的交易對回傳 None """
+        rules = self.rules.get(symbol)
+        if rules is None:
+            # 沒有快取 / 新上架的交易對：有人正在抓就等它，否則自己同步抓 (失敗後限制重試頻率)
+            retry_due = self._attempted_at is None or self.clock.time() - self._attempted_at >= self.retry_interval
+            if self._refreshing.locked() or retry_due:
+                self.refresh(wait=True)
+                rules = self.rules.get(symbol)
+        elif self.is_stale:
+            self.refresh_async()
+        return rules
+
+    def ticks(self, symbol):
+        """ 該交易對的 SymbolTicks (依規則 dict 的 identity 快取，規則更新後自動重建) """
+        rules = self.get(symbol)
+        if rules is None:
+            return None
+        cached = self._ticks.get(symbol)
+        if cached is None or cached.rules is not rules:
+            cached = self._ticks[symbol] = SymbolTicks(rules)
+        return cached
+
+    def refresh(self, wait=False):
+        """
+        同步抓一次 exchange_info 並寫檔
+        :param wait: 已經有人在抓時，False 直接返回；True 等它抓完 (抓成功就不再重抓)
+        """
+        generation = self._generation
+        if not self._refreshing.acquire(blocking=wait):
+            return False
+        try:
+            if self._generation != generation:
+                return True # 等鎖期間別的執行緒已經更新完
+            self._attempted_at = self.clock.time()
+            info = self.client.exchange_info()
+            rules = {s['symbol']: parse_symbol(s) for s in info.get('symbols', [])}
+            if not rules:
+                return False
+            self.rules = rules
+            self.updated_at = self.clock.time()
+            self._generation += 1
+            self._save()
+            logging.info(f"[RULES] 交易規則已更新 ({len(rules)} 個交易對)")
+            return True
+        except Exception as e:
+            logging.error(f"[RULES] 無法獲取交易規則: {e}")
+            return False
+        finally:
+            self._refreshing.release()
+
+    def refresh_async(self):
+        if self._refreshing.locked():
+            return
+        threading.Thread(target=self.refresh, name="symbol-rules-refresh", daemon=True).start()
+
+    def start_background(self, interval=None):
+        """ 每 interval 秒 (預設 ttl) 在背景更新一次 """
+        interval = interval or self.ttl
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        threading.Thread(target=loop, name="symbol-rules-loop", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.rules = data.get('symbols', {})
+            self.updated_at = float(data.get('updated_at', 0))
+            if self.updated_at > self.clock.time():
+                # 時間在未來 (別台機器 / 模擬交易所寫的檔)：不能當成新資料用一整個 ttl
+                self.updated_at = 0.0
+            logging.info(f"[RULES] 從 {self.path} 載入 {len(self.rules)} 個交易對的規則")
+        except Exception as e:
+            logging.warning(f"[RULES] 讀取規則快取失敗，將重新抓取: {e}")
+            self.rules, self.updated_at = {}, 0.0
+
+    def _save(self):
+        """ 先寫暫存檔再 os.replace，中途當機也不會留下寫一半的檔案 """
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': self.updated_at, 'symbols': self.rules}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"[RULES] 寫入規則快取失敗: {e}")
@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+
+
+# 各模式對應的 User Data Stream 位址
+STREAM_URLS = {
+    'LIVE': 'wss://fstream.binance.com',
+    'TESTNET': 'wss://stream.binancefuture.com',
+}
+
+
+class UserDataStream:
+    """
+    幣安合約 User Data Stream
+    - start() 申請 listenKey 並連上 websocket，事件依 'e' 欄位分派給 subscribe() 註冊的 callback
+    - 背景執行緒每 check_interval 秒檢查一次：斷線就重連，超過 keepalive 秒就續期 listenKey
+    - ws_factory 可替換成測試用的假連線 (簽名與 UMFuturesWebsocketClient 相同)
+    """
+
+    def __init__(self, client, stream_url=STREAM_URLS['LIVE'], keepalive=1800, check_interval=10, ws_factory=None):
+        self.client = client
+        self.stream_url = stream_url
+        self.keepalive = keepalive
+        self.check_interval = check_interval
+        if ws_factory is None:
+            # websocket 套件只有開串流才用到 (模擬盤 / 關閉串流時不載入)
+            from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
+            ws_factory = UMFuturesWebsocketClient
+        self.ws_factory = ws_factory
+
+        self.handlers = defaultdict(list)
+        self.listen_key = None
+        self.ws = None
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def subscribe(self, event_type, callback):
+        """ 例如 subscribe('ORDER_TRADE_UPDATE', tracker.on_order_update) """
+        self.handlers[event_type].append(callback)
+
+    def start(self):
+        """ 連線失敗會直接拋出例外，呼叫端決定要不要退回輪詢 """
+        self._connect()
+        self._thread = threading.Thread(target=self._maintain, name="user-data-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._connected.clear()
+        if self.ws is not None:
+            try:
+                self.ws.stop()
+            except Exception:
+                pass
+        if self.listen_key:
+            try:
+                self.client.close_listen_key(self.listen_key)
+            except Exception as e:
+                logging.warning(f"[STREAM] 關閉 listenKey 失敗: {e}")
+
+    def _connect(self):
+        self.listen_key = self.client.new_listen_key()['listenKey']
+        self.ws = self.ws_factory(
+            stream_url=self.stream_url,
+            on_message=self._on_message,
+            on_close=self._on_close,
+            on_error=self._on_error,
+        )
+        self.ws.user_data(listen_key=self.listen_key)
+        self._connected.set()
+        logging.info("[STREAM] User Data Stream 已連線")
+
+    def _maintain(self):
+        elapsed = 0.0
+        while not self._stop.wait(self.check_interval):
+            elapsed += self.check_interval
+            try:
+                if not self.connected:
+                    logging.warning("[STREAM] User Data Stream 斷線，重新連線...")
+                    if self.ws is not None:
+                        try:
+                            self.ws.stop()
+                        except Exception:
+                            pass
+                    self._connect()
+                    elapsed = 0.0
+                elif elapsed >= self.keepalive:
+                    self.client.renew_listen_key(self.listen_key)
+                    elapsed = 0.0
+            except Exception as e:
+                logging.error(f"[STREAM] 維護連線失敗: {e}")
+
+    # --- websocket callbacks (在 websocket 執行緒上執行) ---
+
+    def _on_message(self, _, message):
+        try:
+            data = json.loads(message) if isinstance(message, (str, bytes)) else message
+        except ValueError:
+            return
+        event_type = data.get('e') if isinstance(data, dict) else None
+        if event_type is None:
+            return # 訂閱回應等非事件訊息
+
+        if event_type == 'listenKeyExpired':
+            logging.warning("[STREAM] listenKey 已過期")
+            self._connected.clear()
+            return
+
+        for callback in self.handlers.get(event_type, ()):
+            try:
+                callback(data)
+            except Exception as e:
+                logging.error(f"[STREAM] 處理 {event_type} 失敗: {e}")
+
+    def _on_close(self, _):
+        if not self._stop.is_set():
+            self._connected.clear()
+
+    def _on_error(self, _, error):
+        logging.error(f"[STREAM] websocket 錯誤: {error}")
+        self._connected.clear()
@@ -0,0 +1,3 @@
+from .market import ExchangeClock, SyntheticMarket, RecordedMarket
+from .exchange import FakeExchange, ExchangeError
+from .server import FakeExchangeServer
@@ -0,0 +1,372 @@
+import itertools
+import math
+import random
+import threading
+import uuid
+from decimal import Decimal
+
+
+class ExchangeError(Exception):
+    """ 對應幣安的錯誤回應 {"code": ..., "msg": ...} """
+
+    def __init__(self, code, msg, status=400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+def _fmt(value, digits=8):
+    return f"{value:.{digits}f}".rstrip('0').rstrip('.') or '0'
+
+
+class FakeExchange:
+    """
+    單一帳戶的假合約交易所 (單向持倉模式)
+    - 市價單依行情的即時價格立即成交，計算手續費、已實現損益並更新持倉
+    - 簡化的訂單簿：bid / ask 為即時價格兩側各一個 tick；
+      限價單掛在簿上，對手價穿過掛單價時成交 (maker)，另外每次撮合檢查時
+      掛在最佳價的單有 maker_fill_prob 的機率被對手吃掉 (模擬其他人的市價單)
+    - 每筆成交透過 listeners 發出 ORDER_TRADE_UPDATE / ACCOUNT_UPDATE，
+      由 server 轉發給訂閱 listenKey 的 websocket
+    """
+
+    def __init__(self, market, balance=10000.0, fee_rate=0.0004, step_size='0.001',
+                 tick_size='0.10', min_notional='5', max_qty='1000', maker_fee_rate=0.0002,
+                 maker_fill_prob=0.0, seed=0):
+        self.market = market
+        self.clock = market.clock
+        self.wallet = float(balance)
+        self.fee_rate = fee_rate
+        self.maker_fee_rate = maker_fee_rate
+        self.maker_fill_prob = maker_fill_prob
+        self.rng = random.Random(seed)
+        self.step_size = step_size
+        self.tick_size = tick_size
+        self.min_notional = min_notional
+        self.max_qty = max_qty
+
+        self.orders = {}
+        self.resting = {}
+        self.client_ids = {}
+        self.positions = {}
+        self.leverage = {}
+        self.listen_keys = set()
+        self.listeners = []
+        self._ids = itertools.count(1_000_000)
+        self._lock = threading.RLock()
+
+    # ==========================================
+    #  市場資訊
+    # ==========================================
+
+    def _check_symbol(self, symbol):
+        if not symbol or not self.market.has_symbol(symbol):
+            raise ExchangeError(-1121, "Invalid symbol.")
+
+    def exchange_info(self):
+        symbols = []
+        for symbol in self.market.symbols:
+            symbols.append({
+                'symbol': symbol, 'pair': symbol, 'contractType': 'PERPETUAL', 'status': 'TRADING',
+                'baseAsset': symbol[:-4], 'quoteAsset': 'USDT', 'marginAsset': 'USDT',
+                'pricePrecision': 2, 'quantityPrecision': 3,
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'tickSize': self.tick_size, 'minPrice': '0.01', 'maxPrice': '10000000'},
+                    {'filterType': 'LOT_SIZE', 'stepSize': self.step_size, 'minQty': self.step_size, 'maxQty': self.max_qty},
+                    {'filterType': 'MARKET_LOT_SIZE', 'stepSize': self.step_size, 'minQty': self.step_size, 'maxQty': self.max_qty},
+                    {'filterType': 'MIN_NOTIONAL', 'notional': self.min_notional},
+                ],
+            })
+        return {'timezone': 'UTC', 'serverTime': self.clock.now_ms(), 'rateLimits': [], 'symbols': symbols}
+
+    def klines(self, symbol, interval, limit=500, start_time=None, end_time=None):
+        self._check_symbol(symbol)
+        try:
+            return self.market.klines(symbol, interval, limit, start_time, end_time)
+        except ValueError:
+            raise ExchangeError(-1120, "Invalid interval.")
+
+    def funding_rate(self, symbol, limit=100, start_time=None, end_time=None):
+        self._check_symbol(symbol)
+        return self.market.funding_rates(symbol, limit, start_time, end_time)
+
+    def book_ticker(self, symbol=None):
+        """ 最佳買賣價：即時價格往下取到 tick 為 bid，ask = bid + 1 tick """
+        symbols = [symbol] if symbol else self.market.symbols
+        with self._lock:
+            self._match_resting()
+            rows = []
+            for s in symbols:
+                self._check_symbol(s)
+                bid, ask = self._touch(s)
+                rows.append({'symbol': s, 'bidPrice': f"{bid:.2f}", 'bidQty': '10.000', 'askPrice': f"{ask:.2f}",
+                             'askQty': '10.000', 'time': self.clock.now_ms()})
+        return rows[0] if symbol else rows
+
+    def _touch(self, symbol):
+        tick = float(self.tick_size)
+        bid = math.floor(self.market.price(symbol) / tick) * tick
+        return bid, bid + tick
+
+    def ticker_price(self, symbol=None):
+        symbols = [symbol] if symbol else self.market.symbols
+        rows = [{'symbol': s, 'price': f"{self.market.price(s):.2f}", 'time': self.clock.now_ms()} for s in symbols]
+        return rows[0] if symbol else rows
+
+    # ==========================================
+    #  帳戶
+    # ==========================================
+
+    def change_leverage(self, symbol, leverage):
+        self._check_symbol(symbol)
+        leverage = int(leverage)
+        if not 1 <= leverage <= 125:
+            raise ExchangeError(-4028, "Leverage is not valid")
+        self.leverage[symbol] = leverage
+        return {'symbol': symbol, 'leverage': leverage, 'maxNotionalValue': '1000000'}
+
+    def _position_row(self, symbol):
+        pos = self.positions.get(symbol, {'amt': 0.0, 'entry': 0.0})
+        mark = self.market.price(symbol)
+        return {
+            'symbol': symbol, 'positionSide': 'BOTH',
+            'positionAmt': _fmt(pos['amt']), 'entryPrice': _fmt(pos['entry']),
+            'breakEvenPrice': _fmt(pos['entry']), 'markPrice': f"{mark:.2f}",
+            'unRealizedProfit': _fmt((mark - pos['entry']) * pos['amt']),
+            'liquidationPrice': '0', 'notional': _fmt(mark * pos['amt']),
+            'leverage': str(self.leverage.get(symbol, 20)), 'updateTime': self.clock.now_ms(),
+        }
+
+    def position_risk(self, symbol=None):
+        with self._lock:
+            if symbol:
+                self._check_symbol(symbol)
+                return [self._position_row(symbol)]
+            return [self._position_row(s) for s in self.market.symbols]
+
+    def balance(self):
+        with self._lock:
+            upnl = sum((self.market.price(s) - p['entry']) * p['amt'] for s, p in self.positions.items())
+            return [{'accountAlias': 'fake', 'asset': 'USDT', 'balance': _fmt(self.wallet),
+                     'crossWalletBalance': _fmt(self.wallet), 'crossUnPnl': _fmt(upnl),
+                     'availableBalance': _fmt(self.wallet + min(upnl, 0.0)), 'updateTime': self.clock.now_ms()}]
+
+    # ==========================================
+    #  訂單
+    # ==========================================
+
+    def new_order(self, params):
+        symbol = params.get('symbol')
+        self._check_symbol(symbol)
+        side = params.get('side')
+        order_type = params.get('type')
+        if side not in ('BUY', 'SELL'):
+            raise ExchangeError(-1102, "Mandatory parameter 'side' was not sent, was empty/null, or malformed.")
+        if order_type not in ('MARKET', 'LIMIT'):
+            raise ExchangeError(-1116, "Invalid orderType.")
+        time_in_force = params.get('timeInForce', 'GTC') if order_type == 'LIMIT' else 'GTC'
+        limit_price = None
+        if order_type == 'LIMIT':
+            try:
+                limit_price = Decimal(str(params.get('price')))
+            except Exception:
+                raise ExchangeError(-1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+            if limit_price <= 0 or limit_price % Decimal(self.tick_size) != 0:
+                raise ExchangeError(-4014, "Price not increased by tick size.")
+
+        try:
+            qty = Decimal(str(params.get('quantity')))
+        except Exception:
+            raise ExchangeError(-1102, "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed.")
+        if qty <= 0 or qty % Decimal(self.step_size) != 0:
+            raise ExchangeError(-1111, "Precision is over the maximum defined for this asset.")
+        if qty > Decimal(self.max_qty):
+            raise ExchangeError(-4005, "Quantity greater than max quantity.")
+
+        client_id = params.get('newClientOrderId') or f"fake{uuid.uuid4().hex[:16]}"
+        reduce_only = str(params.get('reduceOnly', 'false')).lower() == 'true'
+
+        with self._lock:
+            self._match_resting()
+            if client_id in self.client_ids:
+                raise ExchangeError(-4116, "ClientOrderId is duplicated.")
+            price = self.market.price(symbol) if limit_price is None else float(limit_price)
+            quantity = float(qty)
+            if reduce_only:
+                quantity = self._reducible(symbol, side, quantity)
+            elif quantity * price < float(self.min_notional):
+                raise ExchangeError(-4164, f"Order's notional must be no smaller than {self.min_notional}")
+
+            order = {
+                'orderId': next(self._ids), 'symbol': symbol, 'clientOrderId': client_id,
+                'side': side, 'type': order_type, 'origType': order_type, 'positionSide': 'BOTH',
+                'timeInForce': time_in_force, 'reduceOnly': reduce_only, 'closePosition': False,
+                'price': '0' if limit_price is None else str(limit_price), 'stopPrice': '0',
+                'origQty': _fmt(float(qty)), 'workingType': 'CONTRACT_PRICE', 'priceProtect': False,
+                'time': self.clock.now_ms(),
+                'status': 'NEW', 'executedQty': '0', 'cumQty': '0', 'cumQuote': '0', 'avgPrice': '0.00',
+                'updateTime': self.clock.now_ms(),
+            }
+            if order_type == 'MARKET':
+                self._fill(order, quantity, price)
+            else:
+                bid, ask = self._touch(symbol)
+                crosses = price >= ask if side == 'BUY' else price <= bid
+                if crosses and time_in_force == 'GTX':
+                    raise ExchangeError(-5022, "Due to the order could not be executed as maker, the Post Only order will be rejected.")
+                if crosses:
+                    # 一般限價單可以直接吃對手價
+                    self._fill(order, quantity, ask if side == 'BUY' else bid)
+                else:
+                    self.resting[order['orderId']] = order
+            self.orders[order['orderId']] = order
+            self.client_ids[client_id] = order['orderId']
+
+        if params.get('newOrderRespType') == 'RESULT' or order_type == 'LIMIT':
+            return dict(order)
+        # ACK：回應時還是 NEW，實際成交要靠查詢或 user stream
+        return {**order, 'status': 'NEW', 'executedQty': '0', 'cumQty': '0', 'cumQuote': '0', 'avgPrice': '0.00'}
+
+    def _reducible(self, symbol, side, quantity):
+        pos = self.positions.get(symbol, {'amt': 0.0, 'entry': 0.0})
+        reducible = pos['amt'] if side == 'SELL' else -pos['amt']
+        if reducible <= 0:
+            raise ExchangeError(-2022, "ReduceOnly Order is rejected.")
+        return min(quantity, reducible)
+
+    def _match_resting(self):
+        """ 對手價穿過掛單價 (或被隨機的市價單吃到) 的限價單以掛單價成交 """
+        for order_id, order in list(self.resting.items()):
+            symbol, side, price = order['symbol'], order['side'], float(order['price'])
+            bid, ask = self._touch(symbol)
+            at_touch = price >= bid if side == 'BUY' else price <= ask
+            crossed = ask <= price if side == 'BUY' else bid >= price
+            if not crossed and not (at_touch and self.rng.random() < self.maker_fill_prob):
+                continue
+            del self.resting[order_id]
+            quantity = float(order['origQty'])
+            if order['reduceOnly']:
+                try:
+                    quantity = self._reducible(symbol, side, quantity)
+                except ExchangeError:
+                    order.update(status='EXPIRED', updateTime=self.clock.now_ms())
+                    continue
+            self._fill(order, quantity, price, maker=True)
+
+    def match(self):
+        """ 給 server 定期呼叫，讓沒人查詢時掛單也會成交 """
+        with self._lock:
+            self._match_resting()
+
+    def _fill(self, order, quantity, price, maker=False):
+        symbol, side = order['symbol'], order['side']
+        signed = quantity if side == 'BUY' else -quantity
+        pos = self.positions.setdefault(symbol, {'amt': 0.0, 'entry': 0.0})
+        fee = quantity * price * (self.maker_fee_rate if maker else self.fee_rate)
+
+        realized = 0.0
+        old = pos['amt']
+        if old and (old > 0) != (signed > 0):
+            closed = min(abs(signed), abs(old))
+            realized = closed * (price - pos['entry']) * (1 if old > 0 else -1)
+        new = old + signed
+        if abs(new) < 1e-12:
+            pos['amt'], pos['entry'] = 0.0, 0.0
+        else:
+            if old == 0 or (old > 0) != (new > 0):
+                pos['entry'] = price
+            elif abs(new) > abs(old):
+                pos['entry'] = (pos['entry'] * abs(old) + price * quantity) / abs(new)
+            pos['amt'] = new
+        self.wallet += realized - fee
+
+        now = self.clock.now_ms()
+        order.update({
+            'status': 'FILLED', 'executedQty': _fmt(quantity), 'cumQty': _fmt(quantity),
+            'cumQuote': _fmt(quantity * price), 'avgPrice': f"{price:.2f}", 'updateTime': now,
+        })
+        self._emit({
+            'e': 'ORDER_TRADE_UPDATE', 'E': now, 'T': now,
+            'o': {
+                's': symbol, 'c': order['clientOrderId'], 'S': side, 'o': order['type'], 'f': order['timeInForce'],
+                'q': order['origQty'], 'p': order['price'], 'ap': order['avgPrice'], 'sp': '0', 'x': 'TRADE',
+                'X': 'FILLED', 'i': order['orderId'], 'l': _fmt(quantity), 'z': _fmt(quantity),
+                'L': f"{price:.2f}", 'N': 'USDT', 'n': _fmt(fee), 'T': now, 't': order['orderId'],
+                'R': order['reduceOnly'], 'ps': 'BOTH', 'rp': _fmt(realized), 'm': maker,
+            },
+        })
+        self._emit({
+            'e': 'ACCOUNT_UPDATE', 'E': now, 'T': now,
+            'a': {
+                'm': 'ORDER',
+                'B': [{'a': 'USDT', 'wb': _fmt(self.wallet), 'cw': _fmt(self.wallet), 'bc': _fmt(realized - fee)}],
+                'P': [{'s': symbol, 'pa': _fmt(pos['amt']), 'ep': _fmt(pos['entry']), 'cr': '0',
+                       'up': _fmt((price - pos['entry']) * pos['amt']), 'mt': 'cross', 'iw': '0', 'ps': 'BOTH'}],
+            },
+        })
+
+    def _find_order(self, symbol, order_id=None, client_id=None):
+        self._check_symbol(symbol)
+        if order_id is None and client_id is not None:
+            order_id = self.client_ids.get(client_id)
+        order = self.orders.get(int(order_id)) if order_id is not None else None
+        if order is None or order['symbol'] != symbol:
+            raise ExchangeError(-2013, "Order does not exist.")
+        return order
+
+    def query_order(self, symbol, order_id=None, client_id=None):
+        with self._lock:
+            self._match_resting()
+            return dict(self._find_order(symbol, order_id, client_id))
+
+    def cancel_order(self, symbol, order_id=None, client_id=None):
+        with self._lock:
+            self._match_resting()
+            order = self._find_order(symbol, order_id, client_id)
+            if order['status'] in ('FILLED', 'CANCELED', 'EXPIRED'):
+                raise ExchangeError(-2011, "Unknown order sent.")
+            self.resting.pop(order['orderId'], None)
+            order['status'] = 'CANCELED'
+            order['updateTime'] = self.clock.now_ms()
+            self._emit({
+                'e': 'ORDER_TRADE_UPDATE', 'E': order['updateTime'], 'T': order['updateTime'],
+                'o': {'s': symbol, 'c': order['clientOrderId'], 'S': order['side'], 'o': order['type'],
+                      'f': order['timeInForce'], 'q': order['origQty'], 'p': order['price'], 'ap': '0',
+                      'x': 'CANCELED', 'X': 'CANCELED', 'i': order['orderId'], 'l': '0', 'z': '0',
+                      'T': order['updateTime'], 'R': order['reduceOnly'], 'ps': 'BOTH'},
+            })
+            return dict(order)
+
+    def all_orders(self, symbol, limit=500, start_time=None, order_id=None):
+        """ 與幣安相同：有 orderId / startTime 時從那裡往後取 limit 筆，都沒有時取最近的 limit 筆 """
+        self._check_symbol(symbol)
+        with self._lock:
+            rows = [dict(o) for o in self.orders.values() if o['symbol'] == symbol
+                    and (start_time is None or o['time'] >= start_time)
+                    and (order_id is None or o['orderId'] >= order_id)]
+        if start_time is None and order_id is None:
+            return rows[-int(limit):]
+        return rows[:int(limit)]
+
+    # ==========================================
+    #  User Data Stream
+    # ==========================================
+
+    def new_listen_key(self):
+        key = uuid.uuid4().hex
+        self.listen_keys.add(key)
+        return {'listenKey': key}
+
+    def keepalive_listen_key(self, key):
+        if key not in self.listen_keys:
+            raise ExchangeError(-1125, "This listenKey does not exist.")
+        return {}
+
+    def close_listen_key(self, key):
+        self.listen_keys.discard(key)
+        return {}
+
+    def _emit(self, event):
+        for listener in list(self.listeners):
+            listener(event)
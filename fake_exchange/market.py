@@ -0,0 +1,210 @@
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from utils.clock import interval_to_ms, interval_offset_ms
+
+
+class ExchangeClock:
+    """
+    交易所時間 (毫秒)
+    speed > 1 時時間加速流動，例如 base_interval='1m'、speed=60 -> 每秒收一根 K 線
+    """
+
+    def __init__(self, speed=1.0, start_ms=None):
+        self.speed = float(speed)
+        self._real_start = time.time()
+        self._start_ms = int(self._real_start * 1000) if start_ms is None else int(start_ms)
+
+    def now_ms(self):
+        return int(self._start_ms + (time.time() - self._real_start) * 1000 * self.speed)
+
+
+class BarSeries:
+    """
+    單一交易對在 base_interval 上的 K 線陣列，index 0 對應 anchor
+    較大的週期 (base 的整數倍) 由 base K 線聚合而成，所以各週期的價格互相一致
+    """
+
+    def __init__(self, anchor_ms, base_ms, open_, high, low, close, volume):
+        self.anchor_ms = anchor_ms
+        self.base_ms = base_ms
+        self.open, self.high, self.low, self.close, self.volume = open_, high, low, close, volume
+
+    def __len__(self):
+        return len(self.close)
+
+    def index_at(self, ts_ms):
+        return (ts_ms - self.anchor_ms) // self.base_ms
+
+    def extend_to(self, index):
+        """ 子類別負責產生 index 之前的資料 """
+
+    def price_at(self, ts_ms):
+        """ 進行中 K 線的即時價格：開盤價與收盤價之間按時間線性內插 """
+        i = self.index_at(ts_ms)
+        self.extend_to(i)
+        if i < 0:
+            return float(self.open[0])
+        if i >= len(self):
+            return float(self.close[-1])
+        frac = ((ts_ms - self.anchor_ms) % self.base_ms) / self.base_ms
+        return float(self.open[i] + (self.close[i] - self.open[i]) * frac)
+
+    def klines(self, interval_ms, now_ms, limit=500, start_time=None, end_time=None, offset_ms=0):
+        """ 回傳幣安格式的 K 線 (含進行中的最後一根)，價格與數量皆為字串 """
+        factor = interval_ms // self.base_ms
+        if factor < 1 or interval_ms % self.base_ms:
+            raise ValueError("interval")
+        limit = max(1, min(int(limit), 1500))
+
+        # 週期對齊到 interval 的整數倍 (以 epoch + offset_ms 為基準，與幣安相同；週 K 從週一開始)
+        current_open = now_ms - (now_ms - offset_ms) % interval_ms
+        last_open = current_open
+        if end_time is not None:
+            last_open = min(current_open, end_time - (end_time - offset_ms) % interval_ms)
+        if start_time is not None:
+            first_open = start_time + (offset_ms - start_time) % interval_ms
+            last_open = min(last_open, first_open + (limit - 1) * interval_ms)
+        else:
+            first_open = last_open - (limit - 1) * interval_ms
+        first_open = max(first_open, self.anchor_ms + (offset_ms - self.anchor_ms) % interval_ms)
+        if last_open < first_open:
+            return []
+
+        self.extend_to(self.index_at(last_open + interval_ms))
+        opens = np.arange(first_open, last_open + 1, interval_ms, dtype=np.int64)
+        rows = []
+        for open_time in opens:
+            start = int(self.index_at(open_time))
+            stop = min(start + factor, len(self))
+            if start >= len(self):
+                break
+            is_current = open_time == current_open
+            if is_current:
+                # 進行中的 K 線只聚合到現在為止
+                stop = min(stop, int(self.index_at(now_ms)) + 1)
+            o = self.open[start]
+            c = self.price_at(now_ms) if is_current else self.close[stop - 1]
+            h = max(self.high[start:stop].max(), c) if not is_current else max(self.high[start:stop - 1].max(initial=o), c, o)
+            l = min(self.low[start:stop].min(), c) if not is_current else min(self.low[start:stop - 1].min(initial=o), c, o)
+            v = float(self.volume[start:stop].sum())
+            close_time = int(open_time) + interval_ms - 1
+            rows.append([
+                int(open_time), f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.3f}",
+                close_time, f"{v * c:.2f}", int(v * 10), f"{v / 2:.3f}", f"{v * c / 2:.2f}", "0"
+            ])
+        return rows
+
+
+class SyntheticSeries(BarSeries):
+    """ 幾何隨機漫步，以 (seed, symbol) 決定亂數，每次重啟產生的歷史完全相同 """
+
+    BLOCK = 4096
+
+    def __init__(self, symbol, anchor_ms, base_ms, start_price=100.0, volatility=0.005, seed=0):
+        self.rng = np.random.default_rng([seed, zlib.crc32(symbol.encode())])
+        self.volatility = volatility
+        self._last_close = float(start_price)
+        self._lock = threading.Lock()
+        empty = np.zeros(0)
+        super().__init__(anchor_ms, base_ms, empty, empty, empty, empty, empty)
+        self.extend_to(self.BLOCK)
+
+    def extend_to(self, index):
+        if len(self) > index:
+            return
+        with self._lock:
+            self._extend(index)
+
+    def _extend(self, index):
+        while len(self) <= index:
+            n = self.BLOCK
+            rets = self.rng.normal(0.0, self.volatility, n)
+            close = self._last_close * np.exp(np.cumsum(rets))
+            open_ = np.concatenate(([self._last_close], close[:-1]))
+            wick = np.abs(self.rng.normal(0.0, self.volatility / 2, (2, n)))
+            high = np.maximum(open_, close) * (1 + wick[0])
+            low = np.minimum(open_, close) * (1 - wick[1])
+            volume = self.rng.lognormal(3.0, 0.5, n)
+            # close 最後更新：其他執行緒以 len(close) 判斷時，其餘欄位一定已經夠長
+            self.open = np.concatenate((self.open, open_))
+            self.high = np.concatenate((self.high, high))
+            self.low = np.concatenate((self.low, low))
+            self.volume = np.concatenate((self.volume, volume))
+            self.close = np.concatenate((self.close, close))
+            self._last_close = float(close[-1])
+
+
+class Market:
+    """
+    一組交易對的行情
+    :param symbols: 交易對列表
+    :param base_interval: 最小 K 線週期，其他週期必須是它的整數倍
+    :param history: 啟動時 "現在" 之前要有幾根 base K 線
+    """
+
+    def __init__(self, symbols, base_interval='1h', history=2000, clock=None):
+        self.symbols = list(symbols)
+        self.base_interval = base_interval
+        self.base_ms = interval_to_ms(base_interval)
+        self.clock = clock or ExchangeClock()
+        now = self.clock.now_ms()
+        self.anchor_ms = now - now % self.base_ms - history * self.base_ms
+        self.series = {}
+
+    def has_symbol(self, symbol):
+        return symbol in self.series
+
+    def klines(self, symbol, interval, limit=500, start_time=None, end_time=None):
+        return self.series[symbol].klines(interval_to_ms(interval), self.clock.now_ms(), limit, start_time, end_time,
+                                          interval_offset_ms(interval))
+
+    def price(self, symbol):
+        return self.series[symbol].price_at(self.clock.now_ms())
+
+    def funding_rates(self, symbol, limit=100, start_time=None, end_time=None):
+        """ 每 8 小時一筆，數值由時間決定 (可重現) """
+        period = 8 * 3_600_000
+        now = self.clock.now_ms()
+        last = now - now % period
+        end = last if end_time is None else min(last, end_time - end_time % period)
+        times = [end - i * period for i in range(min(int(limit), 1000))][::-1]
+        if start_time is not None:
+            times = [t for t in times if t >= start_time]
+        rows = []
+        for t in times:
+            rate = 0.0001 + ((zlib.crc32(f"{symbol}{t}".encode()) % 2001) - 1000) * 1e-7
+            rows.append({'symbol': symbol, 'fundingTime': t, 'fundingRate': f"{rate:.8f}",
+                         'markPrice': f"{self.series[symbol].price_at(t):.2f}"})
+        return rows
+
+
+class SyntheticMarket(Market):
+    def __init__(self, symbols, base_interval='1h', history=2000, clock=None,
+                 volatility=0.005, seed=0, start_prices=None):
+        super().__init__(symbols, base_interval, history, clock)
+        start_prices = start_prices or {}
+        for i, symbol in enumerate(self.symbols):
+            price = start_prices.get(symbol, 50000.0 if symbol == 'BTCUSDT' else 10.0 + i)
+            self.series[symbol] = SyntheticSeries(symbol, self.anchor_ms, self.base_ms, price, volatility, seed)
+
+
+class RecordedMarket(Market):
+    """
+    重播 trading_data.db 的 market_data
+    錄好的 K 線平移到 "現在" 之前的 history 根，之後的資料隨時間依序 "開盤"，播完就維持最後價格
+    """
+
+    def __init__(self, db, symbols, base_interval='1h', history=2000, clock=None):
+        super().__init__(symbols, base_interval, history, clock)
+        for symbol in list(self.symbols):
+            df = db.load_market_data_range(symbol, base_interval)
+            if df.empty:
+                self.symbols.remove(symbol)
+                continue
+            df = df.sort_values('open_time')
+            cols = [df[c].to_numpy(dtype=float) for c in ('open', 'high', 'low', 'close', 'volume')]
+            self.series[symbol] = BarSeries(self.anchor_ms, self.base_ms, *cols)
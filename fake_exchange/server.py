@@ -0,0 +1,248 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+
+from fake_exchange.exchange import ExchangeError
+from fake_exchange.websocket import WebSocketServer
+from utils.rate_limiter import endpoint_weight
+
+
+def _int(value, default=None):
+    return int(value) if value not in (None, '') else default
+
+
+class FakeExchangeServer:
+    """
+    本機的假幣安合約 API
+    - REST: 用 ThreadingHTTPServer 實作 bot 會呼叫的端點，回應格式與幣安相同
+    - WebSocket: <symbol>@kline_<interval> 與 listenKey (user data) 串流
+    - latency / jitter 模擬網路延遲；回應帶 X-MBX-USED-WEIGHT-1M，超過 weight_limit 回 429
+
+    用法：
+        server = FakeExchangeServer(FakeExchange(SyntheticMarket(['BTCUSDT']))).start()
+        client = create_client(key='x', secret='y', base_url=server.base_url)
+        UserDataStream(client, stream_url=server.stream_url)
+    """
+
+    def __init__(self, exchange, host='127.0.0.1', port=0, ws_port=0, latency=0.0, jitter=0.0,
+                 event_delay=0.0, push_interval=1.0, weight_limit=2400):
+        self.exchange = exchange
+        self.latency = latency
+        self.jitter = jitter
+        self.event_delay = event_delay
+        self.push_interval = push_interval
+        self.weight_limit = weight_limit
+
+        self.http = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.http.daemon_threads = True
+        self.ws = WebSocketServer(host, ws_port)
+
+        self._weight_minute = 0
+        self._weight_used = 0
+        self._weight_lock = threading.Lock()
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._kline_state = {}
+
+        exchange.listeners.append(self._on_user_event)
+        self.routes = self._build_routes()
+
+    @property
+    def base_url(self):
+        host, port = self.http.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stream_url(self):
+        return self.ws.url
+
+    def start(self):
+        threading.Thread(target=self.http.serve_forever, name="fake-http", daemon=True).start()
+        self.ws.start()
+        threading.Thread(target=self._event_loop, name="fake-user-events", daemon=True).start()
+        threading.Thread(target=self._kline_loop, name="fake-klines", daemon=True).start()
+        logging.info(f"[FAKE] REST 伺服器: {self.base_url} | 交易對 {len(self.exchange.market.symbols)} 個")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.http.shutdown()
+        self.ws.shutdown()
+        self.http.server_close()
+        self.ws.server_close()
+
+    # ==========================================
+    #  REST
+    # ==========================================
+
+    def _build_routes(self):
+        ex = self.exchange
+        return {
+            ('GET', '/fapi/v1/ping'): lambda p: {},
+            ('GET', '/fapi/v1/time'): lambda p: {'serverTime': ex.clock.now_ms()},
+            ('GET', '/fapi/v1/exchangeInfo'): lambda p: ex.exchange_info(),
+            ('GET', '/fapi/v1/klines'): lambda p: ex.klines(
+                p.get('symbol'), p.get('interval'), _int(p.get('limit'), 500),
+                _int(p.get('startTime')), _int(p.get('endTime'))),
+            ('GET', '/fapi/v1/fundingRate'): lambda p: ex.funding_rate(
+                p.get('symbol'), _int(p.get('limit'), 100), _int(p.get('startTime')), _int(p.get('endTime'))),
+            ('GET', '/fapi/v1/ticker/price'): lambda p: ex.ticker_price(p.get('symbol')),
+            ('GET', '/fapi/v1/ticker/bookTicker'): lambda p: ex.book_ticker(p.get('symbol')),
+            ('GET', '/fapi/v2/ticker/price'): lambda p: ex.ticker_price(p.get('symbol')),
+            ('POST', '/fapi/v1/order'): ex.new_order,
+            ('POST', '/fapi/v1/batchOrders'): self._batch_orders,
+            ('GET', '/fapi/v1/order'): lambda p: ex.query_order(
+                p.get('symbol'), _int(p.get('orderId')), p.get('origClientOrderId')),
+            ('DELETE', '/fapi/v1/order'): lambda p: ex.cancel_order(
+                p.get('symbol'), _int(p.get('orderId')), p.get('origClientOrderId')),
+            ('GET', '/fapi/v1/allOrders'): lambda p: ex.all_orders(
+                p.get('symbol'), _int(p.get('limit'), 500), _int(p.get('startTime')), _int(p.get('orderId'))),
+            ('POST', '/fapi/v1/leverage'): lambda p: ex.change_leverage(p.get('symbol'), p.get('leverage')),
+            ('GET', '/fapi/v2/positionRisk'): lambda p: ex.position_risk(p.get('symbol')),
+            # v3 只回傳有持倉的交易對 (空倉時是空列表)
+            ('GET', '/fapi/v3/positionRisk'): lambda p: [
+                r for r in ex.position_risk(p.get('symbol')) if float(r['positionAmt']) != 0],
+            ('GET', '/fapi/v2/balance'): lambda p: ex.balance(),
+            ('GET', '/fapi/v3/balance'): lambda p: ex.balance(),
+            ('POST', '/fapi/v1/listenKey'): lambda p: ex.new_listen_key(),
+            ('PUT', '/fapi/v1/listenKey'): lambda p: ex.keepalive_listen_key(p.get('listenKey')),
+            ('DELETE', '/fapi/v1/listenKey'): lambda p: ex.close_listen_key(p.get('listenKey')),
+        }
+
+    def _batch_orders(self, params):
+        """ 逐筆下單，個別失敗時該位置回傳 {"code", "msg"} (與幣安相同) """
+        results = []
+        for order in json.loads(params.get('batchOrders') or '[]'):
+            try:
+                results.append(self.exchange.new_order(order))
+            except ExchangeError as e:
+                results.append({'code': e.code, 'msg': e.msg})
+        return results
+
+    def _use_weight(self, weight):
+        """ 以整分鐘為窗累計權重 (與幣安相同)，回傳 (本分鐘已用, 是否超限) """
+        minute = int(time.time() // 60)
+        with self._weight_lock:
+            if minute != self._weight_minute:
+                self._weight_minute, self._weight_used = minute, 0
+            self._weight_used += weight
+            return self._weight_used, self.weight_limit and self._weight_used > self.weight_limit
+
+    def handle(self, method, path, params):
+        """ 回傳 (HTTP 狀態碼, body, 額外 headers) """
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        used, over = self._use_weight(endpoint_weight(path, params))
+        headers = {'X-MBX-USED-WEIGHT-1M': str(used)}
+        if over:
+            headers['Retry-After'] = str(60 - int(time.time()) % 60)
+            return 429, {'code': -1003, 'msg': 'Too many requests; current limit is exceeded.'}, headers
+
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, {'code': -1000, 'msg': f'Unknown endpoint {method} {path}'}, headers
+        try:
+            return 200, route(params), headers
+        except ExchangeError as e:
+            return e.status, {'code': e.code, 'msg': e.msg}, headers
+        except Exception as e:
+            logging.error(f"[FAKE] {method} {path} 失敗: {e}")
+            return 500, {'code': -1000, 'msg': str(e)}, headers
+
+    # ==========================================
+    #  WebSocket 推送
+    # ==========================================
+
+    def _on_user_event(self, event):
+        self._events.put((time.time() + self.event_delay, event))
+
+    def _event_loop(self):
+        """ 成交事件送給所有 listenKey 串流 (在獨立執行緒，不佔用下單的鎖) """
+        while not self._stop.is_set():
+            try:
+                due, event = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            for key in list(self.exchange.listen_keys):
+                self.ws.hub.publish(key, event)
+
+    def _kline_loop(self):
+        """ 每 push_interval 秒撮合掛單、推送訂閱中的 K 線；換根時先補一筆收盤 (x=true) 的事件 """
+        while not self._stop.wait(self.push_interval):
+            self.exchange.match()
+            for stream in self.ws.hub.streams():
+                if '@kline_' not in stream:
+                    continue
+                try:
+                    self._push_kline(stream)
+                except Exception as e:
+                    logging.error(f"[FAKE] 推送 {stream} 失敗: {e}")
+
+    def _push_kline(self, stream):
+        name, interval = stream.split('@kline_', 1)
+        symbol = name.upper()
+        if not self.exchange.market.has_symbol(symbol):
+            return
+        rows = self.exchange.klines(symbol, interval, limit=2)
+        if not rows:
+            return
+        last_open = self._kline_state.get(stream)
+        if last_open is not None and len(rows) > 1 and rows[-1][0] != last_open:
+            self.ws.hub.publish(stream, self._kline_event(symbol, interval, rows[-2], closed=True))
+        self._kline_state[stream] = rows[-1][0]
+        self.ws.hub.publish(stream, self._kline_event(symbol, interval, rows[-1], closed=False))
+
+    def _kline_event(self, symbol, interval, row, closed):
+        return {
+            'e': 'kline', 'E': self.exchange.clock.now_ms(), 's': symbol,
+            'k': {'t': row[0], 'T': row[6], 's': symbol, 'i': interval, 'o': row[1], 'c': row[4],
+                  'h': row[2], 'l': row[3], 'v': row[5], 'n': row[8], 'x': closed, 'q': row[7],
+                  'V': row[9], 'Q': row[10]},
+        }
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _dispatch(self, method):
+            url = urlparse(self.path)
+            params = dict(parse_qsl(url.query))
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                params.update(parse_qsl(self.rfile.read(length).decode()))
+            status, body, headers = server.handle(method, url.path, params)
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def do_PUT(self):
+            self._dispatch('PUT')
+
+        def do_DELETE(self):
+            self._dispatch('DELETE')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
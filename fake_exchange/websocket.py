@@ -0,0 +1,193 @@
+import base64
+import hashlib
+import json
+import logging
+import socketserver
+import struct
+import threading
+from collections import defaultdict
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+def encode_frame(payload, opcode=OP_TEXT):
+    """ 伺服器送出的 frame 不需要 mask """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    header = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header += bytes([n])
+    elif n < 65536:
+        header += bytes([126]) + struct.pack('!H', n)
+    else:
+        header += bytes([127]) + struct.pack('!Q', n)
+    return header + payload
+
+
+def _recv_exact(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("socket closed")
+        data += chunk
+    return data
+
+
+def read_frame(sock):
+    """ 讀一個 client frame (client 端一定有 mask)，回傳 (opcode, payload) """
+    b1, b2 = _recv_exact(sock, 2)
+    opcode = b1 & 0x0F
+    length = b2 & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', _recv_exact(sock, 8))[0]
+    mask = _recv_exact(sock, 4) if b2 & 0x80 else None
+    payload = _recv_exact(sock, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+class Connection:
+    def __init__(self, sock, combined):
+        self.sock = sock
+        self.combined = combined # /stream 路徑：訊息包成 {"stream": ..., "data": ...}
+        self.streams = set()
+        self.alive = True
+        self._send_lock = threading.Lock()
+
+    def send(self, payload, opcode=OP_TEXT):
+        if not self.alive:
+            return
+        try:
+            with self._send_lock:
+                self.sock.sendall(encode_frame(payload, opcode))
+        except OSError:
+            self.alive = False
+
+    def send_event(self, stream, event):
+        message = {'stream': stream, 'data': event} if self.combined else event
+        self.send(json.dumps(message))
+
+
+class StreamHub:
+    """ stream 名稱 -> 訂閱中的連線 """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.on_subscribe = None # callback(stream)，例如讓 server 開始推送該 K 線
+
+    def subscribe(self, conn, stream):
+        with self._lock:
+            self.subscribers[stream].add(conn)
+            conn.streams.add(stream)
+        if self.on_subscribe:
+            self.on_subscribe(stream)
+
+    def unsubscribe(self, conn, stream=None):
+        with self._lock:
+            streams = [stream] if stream else list(conn.streams)
+            for s in streams:
+                self.subscribers[s].discard(conn)
+                conn.streams.discard(s)
+
+    def streams(self):
+        with self._lock:
+            return [s for s, conns in self.subscribers.items() if conns]
+
+    def publish(self, stream, event):
+        with self._lock:
+            conns = list(self.subscribers.get(stream, ()))
+        for conn in conns:
+            conn.send_event(stream, event)
+        return len(conns)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        hub = self.server.hub
+        sock = self.request
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+        lines = request.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1] if len(lines[0].split(' ')) > 1 else '/'
+        headers = {k.strip().lower(): v.strip() for k, v in (l.split(':', 1) for l in lines[1:] if ':' in l)}
+        key = headers.get('sec-websocket-key')
+        if not key:
+            sock.sendall(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + _GUID).encode()).digest()).decode()
+        sock.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+
+        conn = Connection(sock, combined=path.startswith('/stream'))
+        # 幣安也支援直接連 /ws/<stream>
+        if path.startswith('/ws/') and len(path) > 4:
+            for stream in path[4:].split('/'):
+                hub.subscribe(conn, stream)
+        try:
+            while conn.alive:
+                opcode, payload = read_frame(sock)
+                if opcode == OP_CLOSE:
+                    conn.send(payload[:2], OP_CLOSE)
+                    break
+                if opcode == OP_PING:
+                    conn.send(payload, OP_PONG)
+                elif opcode == OP_TEXT:
+                    self._on_text(hub, conn, payload)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            conn.alive = False
+            hub.unsubscribe(conn)
+
+    @staticmethod
+    def _on_text(hub, conn, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        method, params = message.get('method'), message.get('params') or []
+        if method == 'SUBSCRIBE':
+            for stream in params:
+                hub.subscribe(conn, stream)
+        elif method == 'UNSUBSCRIBE':
+            for stream in params:
+                hub.unsubscribe(conn, stream)
+        elif method == 'LIST_SUBSCRIPTIONS':
+            conn.send(json.dumps({'result': sorted(conn.streams), 'id': message.get('id')}))
+            return
+        conn.send(json.dumps({'result': None, 'id': message.get('id')}))
+
+
+class WebSocketServer(socketserver.ThreadingTCPServer):
+    """ 只實作幣安串流需要的部分：握手、text / ping / close frame、SUBSCRIBE / UNSUBSCRIBE """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.hub = StreamHub()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-ws", daemon=True).start()
+        logging.info(f"[FAKE] WebSocket 伺服器: {self.url}")
+        return self
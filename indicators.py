@@ -1,9 +1,9 @@
-import talib
 import numpy as np
 import pandas as pd
 import pytz
 from datetime import time as dt_time
-import pywt
+
+# talib 載入要約 0.4 秒：各函式第一次計算時才 import (之後只是查 sys.modules)
 
 class AlphaLibrary:
     """
@@ -18,10 +18,12 @@ class AlphaLibrary:
         """
         通用的 SMA 計算工具 (給策略判斷訊號用)
         """
+        import talib
         return talib.SMA(data, timeperiod=window)
     @staticmethod
     def calc_custom_atr(high, low, close, window):
         """ 自定義 ATR: TR 的 SMA (而非 Wilder's smoothing) """
+        import talib
         # 對應: max(h-l, |h-cp|, |l-cp|).rolling(16).mean()
         tr = talib.TRANGE(high, low, close)
         # fillna(0) 在 numpy 中對應 np.nan_to_num (但 talib 預設前幾根是 NaN，這裡保持 NaN 讓策略層決定，或依你的習慣填 0)
@@ -31,6 +33,7 @@ class AlphaLibrary:
     @staticmethod
     def calc_smooth_obv(close, volume, window):
         """ 平滑 OBV """
+        import talib
         # 對應: (vol * sign(diff)).cumsum().rolling(20).mean()
         # talib.OBV 邏輯與 cumsum(vol * sign(diff)) 完全一致
         raw_obv = talib.OBV(close, volume)
@@ -40,6 +43,7 @@ class AlphaLibrary:
     @staticmethod
     def calc_bbw(close, timeperiod=20, nbdev=2):
         """ 布林通道寬度 (BBW) """
+        import talib
         # 對應: (upper - lower) / middle
         upper, middle, lower = talib.BBANDS(close, timeperiod=timeperiod, nbdevup=nbdev, nbdevdn=nbdev)
         # 避免分母為 0
@@ -48,6 +52,7 @@ class AlphaLibrary:
     @staticmethod
     def calc_mad(data, window=10):
         """ 價格/成交量 偏離度 (MAD) """
+        import talib
         # 對應: (close - ma) / ma
         ma = talib.SMA(data, timeperiod=window)
         # 處理 NaN 和 分母為 0
@@ -74,6 +79,7 @@ class AlphaLibrary:
     @staticmethod
     def calc_smooth_momentum(close, mom_period=10, smooth_period=5):
         """ 平滑動量 """
+        import talib
         # 對應: talib.MOM(10).rolling(5).mean()
         mom = talib.MOM(close, timeperiod=mom_period)
         smooth_mom = talib.SMA(mom, timeperiod=smooth_period)
@@ -82,6 +88,7 @@ class AlphaLibrary:
     @staticmethod
     def calc_smooth_cci(high, low, close, cci_period=60, smooth_period=48):
         """ 平滑 CCI """
+        import talib
         # 對應: talib.CCI(60).rolling(48).mean()
         cci = talib.CCI(high, low, close, timeperiod=cci_period)
         smooth_cci = talib.SMA(cci, timeperiod=smooth_period)
@@ -106,7 +113,26 @@ class AlphaLibrary:
         input: numpy array or list
         output: numpy array (same length)
         """
-        # Pandas 的 rolling quantile 實作最穩定
+        arr = np.asarray(data, dtype=float)
+        n = len(arr)
+        if n < window:
+            return np.zeros(n)
+
+        # 快速路徑：沒有 NaN/inf 時直接用 numpy 排序每個視窗
+        # 插值公式與 pandas roll_quantile (linear) 完全相同，結果逐位元一致，但少了 pandas 的物件開銷
+        if np.isfinite(arr).all():
+            windows = np.sort(np.lib.stride_tricks.sliding_window_view(arr, window), axis=1)
+            pos = quantile * (window - 1)
+            idx = int(pos)
+            if idx == pos:
+                q = windows[:, idx]
+            else:
+                vlow = windows[:, idx]
+                vhigh = windows[:, idx + 1]
+                q = vlow + (vhigh - vlow) * (pos - idx)
+            return np.concatenate((np.zeros(window - 1), q))
+
+        # Pandas 的 rolling quantile 實作最穩定 (有缺值時 pandas 會自動略過 NaN)
         s = pd.Series(data)
         # min_periods=1 確保剛開始數據不足時也有值 (雖然策略通常會 skip 前段)
         return s.rolling(window=window, min_periods=window).quantile(quantile).fillna(0).values
@@ -209,7 +235,8 @@ class AlphaLibrary:
         # 轉成 numpy array
         prices = np.array(data_window)
         
-        # 小波分解
+        # 小波分解 (pywt 只有這裡用到，第一次呼叫才 import)
+        import pywt
         try:
             coeffs = pywt.wavedec(prices, wavelet=wavelet, level=level, mode=mode)
         except Exception as e:
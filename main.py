@@ -1,20 +1,11 @@
-import logging
 from dotenv import load_dotenv
 from utils.config_loader import ConfigLoader
+from utils.log_setup import setup_logging
 from core.bot import TradingBot
 import warnings
 
 # 過濾掉 pytrends 引發的 FutureWarning
 warnings.filterwarnings("ignore", category=FutureWarning, module="pytrends")
-# 設定 Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler("trading_bot.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 
 def main():
     # 1. 載入環境變數
@@ -22,7 +13,16 @@ def main():
     
     # 2. 載入設定
     config = ConfigLoader("config.json")
-    
+
+    # 設定 Logging (寫檔在背景執行緒，依大小 / 時間輪替)
+    setup_logging(
+        path=config.get("logging", "path", "trading_bot.log"),
+        level=config.get("system", "log_level", "INFO"),
+        max_bytes=config.get("logging", "max_bytes", 10_000_000),
+        backups=config.get("logging", "backups", 5),
+        when=config.get("logging", "when", "midnight"),
+        json_path=config.get("logging", "json_path", None)
+    )
 
     # 3. 實例化機器人
     bot = TradingBot(config)
@@ -3,67 +3,134 @@ import pandas as pd
 import time
 from data_sources.registry import get_all_fetchers
 from data_loader import DataLoader
+from utils.tracing import span, bar_id
+from utils.metrics import FETCH_FAILURES
+from utils.clock import interval_to_ms
+
+# 單次 klines 請求的上限 (幣安合約)
+MAX_KLINES_PER_REQUEST = 1500
 
 class DataManager:
-    def __init__(self, client, db, symbol, interval):
+    # 策略需要合併的外部指標
+    EXTERNAL_METRICS = ['fear_greed', 'funding_rate', 'fed_assets', 'google_trends']
+
+    def __init__(self, client, db, symbol, interval, fetchers=None):
+        """
+        :param fetchers: (選填) 外部數據源字典，None 代表從 Registry 載入全部 (回測時傳入 {})
+        """
         self.client = client
         self.db = db
         self.symbol = symbol
         self.interval = interval
         self.loader = DataLoader(self.client, self.db)
-        self.fetchers = get_all_fetchers()
+        self.fetchers = get_all_fetchers() if fetchers is None else fetchers
         self.last_processed_time = 0
         
-        logging.info(f"載入外部數據源: {list(self.fetchers.keys())}")
+        if fetchers is None:
+            logging.info("載入外部數據源: %s", list(self.fetchers.keys()))
 
     def get_history_klines(self, limit=1500):
-        """ 獲取歷史 K 線 (熱機用) """
-        return self.loader.get_binance_klines(self.symbol, self.interval, limit=limit)
+        """
+        獲取歷史 K 線 (熱機用)，最後一根是未收盤的 K 線 (與 API 回傳的格式相同)
+        1. 先讀 DB 裡的 market_data，只保留最後一段連續的 K 線
+        2. 從本地最後一根開始向 API 補缺口 (本地最後一根可能是當時未收盤的，一起重抓覆蓋)
+        3. 本地資料不夠長、或缺口超過單次請求上限時，退回整段下載
+        抓到的已收盤 K 線會寫回 DB，下次重啟就只需要補更短的尾巴
+        """
+        local = self.db.load_market_data(self.symbol, self.interval, limit=limit)
+        step = interval_to_ms(self.interval)
+        if not local.empty:
+            gaps = local['open_time'].diff().fillna(step).values
+            broken = (gaps != step).nonzero()[0]
+            if len(broken):
+                local = local.iloc[broken[-1]:].reset_index(drop=True)
+
+        tail = None
+        if not local.empty:
+            last_open = int(local['open_time'].iloc[-1])
+            missing = (int(time.time() * 1000) - last_open) // step + 2
+            if len(local) - 1 + missing >= limit and missing <= MAX_KLINES_PER_REQUEST:
+                tail = self.loader.get_binance_klines(
+                    self.symbol, self.interval, limit=int(missing), start_time=last_open)
+                # 補到的最後一根必須已經是未收盤的 K 線 (抓滿上限代表還有缺口)
+                if tail.empty or int(tail['open_time'].iloc[0]) != last_open or len(tail) >= missing:
+                    tail = None
+
+        if tail is None:
+            df = self.loader.get_binance_klines(self.symbol, self.interval, limit=limit)
+            if len(df) > 1:
+                self.db.save_market_data(self.symbol, self.interval, df.iloc[:-1])
+            logging.info("[WARMUP] %s %s 本地資料不足，從 API 下載 %s 根", self.symbol, self.interval, len(df))
+            return df
+
+        self.db.save_market_data(self.symbol, self.interval, tail.iloc[:-1])
+        df = pd.concat([local.iloc[:-1], tail[local.columns]], ignore_index=True)
+        df = df.drop_duplicates('open_time', keep='last').tail(limit).reset_index(drop=True)
+        logging.info("[WARMUP] %s %s 本地 %s 根 + API 補 %s 根", self.symbol, self.interval, len(local) - 1, len(tail))
+        return df
 
     def check_new_candle(self):
         """ 
         偵測是否有新收盤的 K 線 
         Return: (bool, int, dataframe) -> (是否新K線, 收盤時間, 剛收盤的K線資料)
         """
-        # 抓取最新的 2 根
-        raw_df = self.loader.get_binance_klines(self.symbol, self.interval, limit=2)
-        
-        if raw_df.empty:
-            return False, 0, None
+        with span('check_new_candle') as sp:
+            # 抓取最新的 2 根
+            raw_df = self.loader.get_binance_klines(self.symbol, self.interval, limit=2)
+            
+            if raw_df.empty:
+                return False, 0, None
 
-        # 取得倒數第二根 (剛收盤的)
-        latest_closed_kline = raw_df.iloc[-2]
-        closed_time = int(latest_closed_kline['open_time'])
+            # 取得倒數第二根 (剛收盤的)
+            latest_closed_kline = raw_df.iloc[-2]
+            closed_time = int(latest_closed_kline['open_time'])
 
-        if closed_time > self.last_processed_time:
-            # 這是新 K 線
-            return True, closed_time, raw_df.iloc[:-1] # 回傳排除未收盤的數據
-        
-        return False, 0, None
+            if closed_time > self.last_processed_time:
+                # 這是新 K 線
+                sp.bar = bar_id(self.symbol, self.interval, closed_time)
+                return True, closed_time, raw_df.iloc[:-1] # 回傳排除未收盤的數據
+            
+            return False, 0, None
 
     def update_etl_process(self, closed_time, df_to_save):
-        """ 執行標準 ETL 流程 """
-        logging.info(f"[ETL] 處理新 K 線: {pd.to_datetime(closed_time, unit='ms')}")
-        
-        # 1. 存入 Market Data
-        self.db.save_market_data(self.symbol, self.interval, df_to_save)
+        """ 執行標準 ETL 流程 (外部數據更新完才讀回策略數據) """
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info("[ETL] 處理新 K 線: %s", pd.to_datetime(closed_time, unit='ms'))
         
-        # 2. 更新外部數據
-        self._update_external_data()
-        
-        # 3. 讀回給策略用的數據
-        #strategy_df = self.db.load_market_data(self.symbol, self.interval, limit=200)
-        strategy_df = self.get_strategy_data(limit=200)
+        with span('update_etl_process', bar_id(self.symbol, self.interval, closed_time)):
+            # 1. 存入 Market Data
+            self.db.save_market_data(self.symbol, self.interval, df_to_save)
+            
+            # 2. 更新外部數據
+            self.update_external_data()
+            
+            # 3. 讀回給策略用的數據
+            #strategy_df = self.db.load_market_data(self.symbol, self.interval, limit=200)
+            strategy_df = self.get_strategy_data(limit=200)
         # 更新內部狀態
         self.last_processed_time = closed_time
         
         return strategy_df
 
-    def _update_external_data(self):
+    def store_candle(self, closed_time, df_to_save):
+        """
+        只做關鍵路徑上需要的部分：K 線存檔 + 讀回策略數據
+        外部指標用 DB 裡最後已知的值，更新交給 update_external_data 在其他執行緒做
+        """
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info("[ETL] 處理新 K 線: %s", pd.to_datetime(closed_time, unit='ms'))
+        with span('store_candle', bar_id(self.symbol, self.interval, closed_time)):
+            self.db.save_market_data(self.symbol, self.interval, df_to_save)
+            strategy_df = self.get_strategy_data(limit=200)
+        self.last_processed_time = closed_time
+        return strategy_df
+
+    def update_external_data(self):
         """ 抓取外部數據並存檔 """
         for name, fetcher in self.fetchers.items():
             try:
-                df = fetcher.fetch_data()
+                with span(f"fetch.{name}"):
+                    df = fetcher.fetch_data()
                 if df.empty: continue
 
                 if name == 'us_stock_qqq':
@@ -71,7 +138,8 @@ class DataManager:
                 else:
                     self.db.save_generic_external_data(df)
             except Exception as e:
-                logging.error(f"外部數據更新失敗 [{name}]: {e}")
+                FETCH_FAILURES.inc(source=name)
+                logging.error("外部數據更新失敗 [%s]: %s", name, e)
 
     def get_strategy_data(self, limit=200):
         """
@@ -89,14 +157,17 @@ class DataManager:
         # 確保按時間排序 (merge_asof 的要求)
         df = df.sort_values('open_time')
 
-        # 2. 準備外部數據列表
-        # 這裡列出你想要合併的指標
-        external_metrics = ['fear_greed', 'funding_rate', 'fed_assets', 'google_trends']
-        
+        return self.attach_external_data(df)
+
+    def attach_external_data(self, df):
+        """
+        將外部數據以 merge_asof 對齊到 K 線時間軸上
+        實盤 (每根 K 線 200 筆) 與回測 (一次對齊整段歷史) 共用此邏輯
+        """
         # 取得 K 線的最早時間，我們只需要抓這之後的外部數據 (稍微多抓一點緩衝)
         start_time = int(df['open_time'].min()) - 86400000 # 多抓一天緩衝
 
-        for metric in external_metrics:
+        for metric in self.EXTERNAL_METRICS:
             # A. 讀取該指標的數據
             # 注意：這裡可能回傳空 DataFrame (如果剛好這段時間沒數據)
             ext_df = self.db.load_external_data(
@@ -4,6 +4,7 @@ import pkgutil
 import importlib
 import inspect
 from strategies.base_strategy import BaseStrategy 
+from utils.tracing import span
 
 class StrategyManager:
     def __init__(self, active_strategies=None):
@@ -106,11 +107,12 @@ class StrategyManager:
         
         for strategy in self.strategies:
             try:
-                # 1. 更新數據
-                strategy.update_data(strategy_df, external_data)
-                
-                # 2. 產生訊號
-                signal = strategy.generate_signal()
+                with span(f"strategy.{strategy.name}"):
+                    # 1. 更新數據
+                    strategy.update_data(strategy_df, external_data)
+                    
+                    # 2. 產生訊號
+                    signal = strategy.generate_signal()
                 
                 if signal:
                     # 補充策略名稱資訊
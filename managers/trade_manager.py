@@ -1,22 +1,57 @@
 import logging
-import time
+from concurrent.futures import ThreadPoolExecutor
 from utils.notifier import send_tg_msg
+from utils.clock import system_clock
 from execution.risk_manager import RiskManager
 from execution.binance_executor import BinanceExecutor
 from execution.mock_executor import MockExecutor
+from execution.fill_tracker import is_final, NOT_SENT
+from execution.account_book import AccountBook
+from execution.order_journal import make_client_order_id, FAILED
+from execution.maker_execution import slippage_bps
+from utils.tracing import traced, span, bar_id
 
 class TradeManager:
-    def __init__(self, client, db, config, symbol, is_paper=False):
+    def __init__(self, client, db, config, symbol, is_paper=False, executor=None, clock=None,
+                 fill_timeout=10, notify=True, fill_tracker=None, account_book=None, journal=None, maker=None):
+        """
+        :param executor: (選填) 外部注入的執行器，例如回測用的 BacktestExecutor
+        :param clock: (選填) 時鐘物件，回測時傳入 SimulatedClock 就不會真的 sleep
+        :param fill_timeout: 下單後最多等待成交確認的秒數
+        :param notify: 成交時是否發送 TG 通知 (回測時關閉)
+        :param fill_tracker: (選填) FillTracker，有 User Data Stream 時用事件確認成交，否則退回輪詢
+        :param account_book: (選填) AccountBook，預設建立一個沒有串流、每週期向執行器查詢的帳本
+        :param journal: (選填) OrderJournal，送單前先寫日誌，重啟後與交易所對帳，不會重複下單
+        :param maker: (選填) MakerExecution，有的話改用限價掛單 (逾時才轉市價)
+        """
         self.client = client
         self.db = db
         self.symbol = symbol
         self.is_paper = is_paper
+        self.clock = clock or system_clock
+        self.fill_timeout = fill_timeout
+        self.notify = notify
+        self.fill_tracker = fill_tracker
+        self.journal = journal
+        self.maker = maker
         
         # 初始化執行器
-        if self.is_paper:
-            self.executor = MockExecutor()
+        if executor is not None:
+            self.executor = executor
+        elif self.is_paper:
+            self.executor = MockExecutor(clock=self.clock)
         else:
-            self.executor = BinanceExecutor(self.client)
+            self.executor = BinanceExecutor(self.client, clock=self.clock)
+
+        # 本地持倉帳本 (同一週期內的成交會立即反映)
+        self.account_book = account_book
+        if account_book is None:
+            # 沒有串流：先對帳一次，重啟後第一根 K 線的淨額計算不用等快照階段跑完
+            self.account_book = AccountBook(self.executor, clock=self.clock)
+            self.account_book.reconcile(self.symbol)
+
+        # 各策略的虛擬持倉 (淨額撮合用)，重啟時由 trades 表還原
+        self.strategy_positions = self.db.load_strategy_positions(self.symbol)
             
         # 初始化風控
         leverage = config.get("risk", "leverage", 1)
@@ -27,93 +62,369 @@ class TradeManager:
         if not self.is_paper:
             self.executor.set_leverage(self.symbol, leverage)
 
+        # 上次當機前沒走完的訂單：與交易所對帳並補做歸因
+        self.recover()
+
+    def recover(self):
+        """ 日誌中未完成的訂單與交易所對帳 (沒有未完成紀錄時只是一次 DB 查詢) """
+        if self.journal is None or self.is_paper:
+            return 0
+        return self.journal.reconcile(self.executor, self.symbol, self._recover_fill)
+
+    def _recover_fill(self, entry, record):
+        plan = entry['plan']
+        order_id = record['orderId'] if record else None
+        self._attribute(plan['deltas'], plan['ref_price'], plan.get('shortfall', 0.0), record, order_id)
+
+    @traced('log_snapshot')
     def log_snapshot(self, current_price):
-        """ 資產快照 """
-        details = self.executor.get_position_details(self.symbol)
+        """ 資產快照 (串流正常時只讀本地帳本，不打 REST) """
+        self.account_book.sync_if_stale(self.symbol)
+        details = self.account_book.get_position_details(self.symbol, mark_price=current_price)
         amt = details['amt'] if details else 0.0
         
         if abs(amt) > 0:
-            logging.info(f"[SNAPSHOT] 持倉: {amt} | PnL: {details['unRealizedProfit']} U")
+            logging.info("[SNAPSHOT] 持倉: %s | PnL: %s U", amt, details['unRealizedProfit'])
         else:
-            logging.info(f"[SNAPSHOT] 空手 | 現價: {current_price}")
+            logging.info("[SNAPSHOT] 空手 | 現價: %s", current_price)
         
         return amt
 
-    def process_signal(self, signal_data, current_pos_amt):
-        """ 處理單一策略訊號 """
-        strategy_name = signal_data['strategy_name']
-        action = signal_data['action']
-        reason = signal_data['reason']
-        ref_price = signal_data['ref_price']
+    def process_signal(self, signal_data, current_pos_amt=None):
+        """ 處理單一策略訊號 (current_pos_amt 保留給舊的呼叫方式，已不使用) """
+        self.process_signals([signal_data])
+
+    def process_signals(self, signals, bar_time=None):
+        """
+        淨額撮合：同一根 K 線所有策略的訊號一起處理
+        1. 每個策略各自有一份虛擬持倉，LONG -> 目標為一份固定金額的部位，CLOSE -> 目標為 0
+        2. 各策略 (目標 - 現有) 加總成一筆淨訂單送到交易所，方向相反的部分在內部互抵，不付手續費
+        3. 成交結果依比例歸回各策略，逐策略寫入 trades 表
+        :param bar_time: 這批訊號所屬 K 線的開盤時間 (毫秒)，決定 newClientOrderId，重跑同一根不會重複下單
+        :return: (淨訂單方向, 成交紀錄)，沒有成交時回傳 None
+        """
+        order = self.prepare_signals(signals, bar_time)
+        if order is None:
+            return None
+        with span('execute_order', self._bar_id(order)):
+            record, order_id = self._execute_order(order['side'], order['quantity'], order['ref_price'],
+                                                   order['client_order_id'])
+        self.finish_order(order, record, order_id)
+        return (order['side'], record) if record else None
+
+    @staticmethod
+    def process_batch(jobs, max_workers=4):
+        """
+        多個交易對同一週期的訊號一起處理 (每個交易對一個 TradeManager，共用同一個執行器)
+        市價單以 batchOrders 每 5 筆一組、多組並行送出；個別訂單失敗只影響它自己的交易對
+        :param jobs: [(trade_manager, signals, bar_time, interval), ...]
+        :return: 與 jobs 同順序，各自為 (淨訂單方向, 成交紀錄) 或 None
+        """
+        results = [None] * len(jobs)
+        orders = []
+        for i, (manager, signals, bar_time, interval) in enumerate(jobs):
+            order = manager.prepare_signals(signals, bar_time, interval)
+            if order is not None:
+                orders.append((i, manager, order))
+        if not orders:
+            return results
+
+        def finish(i, manager, order, record, order_id):
+            manager.finish_order(order, record, order_id)
+            if record:
+                results[i] = (order['side'], record)
+
+        # 掛單模式各自有撤單重掛的迴圈，每個交易對一條執行緒
+        makers = [job for job in orders if job[1].maker is not None]
+        takers = [job for job in orders if job[1].maker is None]
+
+        def execute(job):
+            i, manager, order = job
+            with span('execute_order', manager._bar_id(order)):
+                record, order_id = manager._execute_order(order['side'], order['quantity'], order['ref_price'],
+                                                          order['client_order_id'])
+            finish(i, manager, order, record, order_id)
+
+        # 成交確認 (等串流事件 / 輪詢) 各交易對並行，互不阻塞
+        def confirm(job):
+            (i, manager, order), response = job
+            with span('confirm_order', manager._bar_id(order)):
+                record, order_id = manager._confirm_response(
+                    order['side'], order['ref_price'], order['client_order_id'], response
+                )
+            finish(i, manager, order, record, order_id)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            maker_jobs = [pool.submit(execute, job) for job in makers]
+            if takers:
+                # 同一個執行器 (同一組 API 金鑰) 的市價單一起送
+                executor = takers[0][1].executor
+                with span('execute_orders'):
+                    responses = executor.execute_orders([{
+                        'symbol': m.symbol, 'side': o['side'], 'quantity': o['quantity'],
+                        'reduce_only': o['side'] == 'SELL', 'market_price': o['ref_price'],
+                        'client_order_id': o['client_order_id'],
+                    } for _, m, o in takers], max_workers=max_workers)
+                list(pool.map(confirm, zip(takers, responses)))
+            for future in maker_jobs:
+                future.result()
+        return results
 
-        # 紀錄訊號到 DB
-        logging.info(f"[SIGNAL] {strategy_name} | {action} | {reason}")
-        self.db.log_signal(strategy_name, self.symbol, action, ref_price, reason)
+    def _bar_id(self, order):
+        if order.get('bar_time') is None:
+            return None
+        return bar_id(self.symbol, order.get('interval'), order['bar_time'])
 
-        # 計算下單量
-        target_qty = 0
-        should_trade = False
+    def prepare_signals(self, signals, bar_time=None, interval=None):
+        """
+        記錄訊號、算出淨訂單並寫入下單日誌，回傳待送出的訂單 (dict)
+        不需要送單 (沒有變化 / 完全內部互抵 / 這根 K 線已處理過) 時回傳 None
+        :param interval: bar_time 所屬的週期 (只用在追蹤的 bar_id)
+        """
+        # 每個週期都先對帳 (沒有訊號也一樣)，上次沒確認完的訂單不會一直等到下一次有訊號
+        self.recover()
+        if not signals:
+            return None
 
-        if action == 'LONG':
-            if current_pos_amt > 0:
-                logging.info(f"[SKIP] {strategy_name} 喊多但已有持倉")
+        deltas = {}
+        ref_price = None
+        for signal_data in signals:
+            strategy_name = signal_data['strategy_name']
+            action = signal_data['action']
+            ref_price = signal_data['ref_price']
+
+            # 紀錄訊號到 DB
+            logging.info("[SIGNAL] %s | %s | %s", strategy_name, action, signal_data['reason'])
+            self.db.log_signal(strategy_name, self.symbol, action, ref_price, signal_data['reason'])
+
+            current = self._snap(self.strategy_positions.get(strategy_name, 0.0))
+            if action == 'LONG':
+                if current > 0:
+                    logging.info("[SKIP] %s 喊多但已有持倉", strategy_name)
+                    continue
+                target = self.risk_manager.calculate_quantity(ref_price)
+            elif action == 'CLOSE':
+                target = 0.0
             else:
-                target_qty = self.risk_manager.calculate_quantity(ref_price)
-                should_trade = True
-        
-        elif action == 'CLOSE':
-            if current_pos_amt > 0:
-                target_qty = abs(current_pos_amt)
-                should_trade = True
-        
-        # 執行交易
-        if should_trade and target_qty > 0:
-            self._execute_order(strategy_name, action, target_qty, ref_price)
-
-    def _execute_order(self, strategy_name, action, quantity, market_price):
-        """ 底層下單邏輯 """
-        side = 'BUY' if action == 'LONG' else 'SELL'
-        is_reduce = (action == 'CLOSE')
+                continue
+
+            if target != current:
+                deltas[strategy_name] = target - current
+
+        if not deltas:
+            return None
+        return self._plan_net(deltas, ref_price, bar_time, interval)
+
+    def _plan_net(self, deltas, ref_price, bar_time=None, interval=None):
+        total_buy = sum(d for d in deltas.values() if d > 0)
+        total_sell = -sum(d for d in deltas.values() if d < 0)
+        net = total_buy - total_sell
+        crossed = min(total_buy, total_sell)
+        if crossed > 0:
+            logging.info("[NETTING] 買 %.6f / 賣 %.6f，內部互抵 %.6f", total_buy, total_sell, crossed)
+
+        # 淨賣出不能超過帳戶實際持倉 (只做多，平倉一律 reduceOnly)
+        side = 'BUY' if net > 0 else 'SELL'
+        quantity = abs(net)
+        shortfall = 0.0
+        if side == 'SELL':
+            # 帳本可能還沒被快照階段更新 (兩者並行)，讀持倉前自己確認一次，否則平倉會被誤判成沒有持倉
+            self.account_book.sync_if_stale(self.symbol)
+            quantity = min(quantity, max(0.0, self.account_book.get_position(self.symbol)))
+            shortfall = abs(net) - quantity
+
+        # Write-Ahead：先寫日誌 (含歸因所需的全部資訊) 再送單
+        client_id = None
+        if self.journal is not None:
+            plan = {'deltas': deltas, 'ref_price': ref_price, 'shortfall': shortfall}
+            client_id = self._journal_begin(side, quantity, bar_time, plan)
+            if client_id is None:
+                return None
+
+        order = {'side': side, 'quantity': quantity, 'ref_price': ref_price, 'client_order_id': client_id,
+                 'deltas': deltas, 'shortfall': shortfall, 'bar_time': bar_time, 'interval': interval}
+        if quantity <= 0:
+            # 完全內部互抵，不用送單
+            self.finish_order(order, None, None)
+            return None
+        return order
+
+    def finish_order(self, order, record, order_id):
+        """ 送單結果 (可能沒有成交) 歸因到各策略並更新下單日誌 """
+        client_id = order['client_order_id']
+        if order['quantity'] > 0 and client_id and order_id is not None:
+            self.journal.mark_sent(client_id, order_id)
+            if record is None:
+                # 已送出但還沒確認成交：留給下一次對帳歸因，避免之後成交了卻少記
+                return
+        if order['quantity'] > 0 and record is None:
+            logging.warning("[ORDER] %s 淨訂單沒有成交，受影響的策略: %s", self.symbol, ', '.join(order['deltas']))
+
+        self._attribute(order['deltas'], order['ref_price'], order['shortfall'], record, order_id)
+        if client_id:
+            if record or order['quantity'] <= 0:
+                self.journal.complete(client_id, record['executedQty'] if record else 0.0,
+                                      record['avgPrice'] if record else 0.0)
+            else:
+                self.journal.fail(client_id)
+
+    def _journal_begin(self, side, quantity, bar_time, plan):
+        """ 回傳這次要用的 client id；同一根 K 線已經處理過 (或日誌寫入失敗) 時回傳 None """
+        bar_time = bar_time if bar_time is not None else int(self.clock.time() * 1000)
+        seq = 0
+        while True:
+            client_id = make_client_order_id(self.symbol, bar_time, seq)
+            entry = self.journal.get(client_id)
+            if entry is None:
+                break
+            if entry['status'] != FAILED:
+                logging.warning("[JOURNAL] %s 已處理過 (%s)，不重複下單", client_id, entry['status'])
+                return None
+            seq += 1 # 上次確定沒成交：換下一個序號重送
+        if not self.journal.begin(client_id, self.symbol, side, quantity, bar_time, plan):
+            return None
+        return client_id
+
+    def _attribute(self, deltas, ref_price, shortfall, record, order_id):
+        """ 把淨訂單的結果 (可能沒有成交) 依比例歸回各策略 """
+        buys = {name: d for name, d in deltas.items() if d > 0}
+        sells = {name: -d for name, d in deltas.items() if d < 0}
+        total_buy, total_sell = sum(buys.values()), sum(sells.values())
+        net = total_buy - total_sell
+        crossed = min(total_buy, total_sell)
+
+        filled = record['executedQty'] if record else 0.0
+        price = record['avgPrice'] if filled > 0 else ref_price
+
+        # 帳戶持倉比各策略虛擬持倉少 (例如被強平或手動平倉)：差額直接從虛擬持倉移除，不記成交
+        if shortfall > 1e-12:
+            logging.warning("[NETTING] 帳戶持倉不足，%.6f 視為已在外部平倉", shortfall)
+            for name, qty in sells.items():
+                share = qty * shortfall / total_sell
+                self.strategy_positions[name] = self._snap(self.strategy_positions.get(name, 0.0) - share)
+
+        # 淨訂單那一側按比例分配 (互抵量 + 實際成交量)，另一側全部在內部成交
+        if net > 0:
+            buys = {name: q * (crossed + filled) / total_buy for name, q in buys.items()}
+        elif net < 0:
+            sells = {name: q * (crossed + filled) / total_sell for name, q in sells.items()}
+
+        fill_id = str(order_id) if filled > 0 else f"NET-{int(self.clock.time() * 1000)}"
+        for name, qty in buys.items():
+            self._log_trade_success(name, 'LONG', qty, price, fill_id)
+        for name, qty in sells.items():
+            self._log_trade_success(name, 'CLOSE', qty, price, fill_id)
+
+    def _execute_order(self, side, quantity, market_price, client_order_id=None):
+        """ 底層下單邏輯，回傳 (成交紀錄, 訂單編號)，沒有成交時紀錄為 None """
+        is_reduce = (side == 'SELL')
+        if self.maker is not None:
+            return self._execute_maker(side, quantity, market_price, client_order_id)
         
         response = self.executor.execute_order(
-            self.symbol, side, quantity, reduce_only=is_reduce, market_price=market_price
+            self.symbol, side, quantity, reduce_only=is_reduce, market_price=market_price,
+            client_order_id=client_order_id
         )
-        
-        if not response: return
+        return self._confirm_response(side, market_price, client_order_id, response)
 
-        order_id = response.get('orderId')
-        logging.info(f"訂單已發送 ID: {order_id}，等待撮合...")
-        time.sleep(3) # 等待成交
-
-        # 查證訂單
-        final_record = self._verify_order(order_id, response)
-        
-        if final_record and final_record['executedQty'] > 0:
-            self._log_trade_success(strategy_name, action, final_record, order_id)
+    def _confirm_response(self, side, market_price, client_order_id, response):
+        """ 下單回應 -> (成交紀錄, 訂單編號)；結果不明時用 clientOrderId 查一次，確定沒送出就不查 """
+        started = self.clock.time()
+        if response == NOT_SENT:
+            # 數量捨去後為 0 / 名目金額不足：交易所不會有這筆訂單，日誌直接標記失敗
+            return None, None
+        if response:
+            order_id = response.get('orderId')
+            # 確認成交 (事件驅動，沒有串流時退回輪詢)
+            final_record = self._confirm_fill(order_id, response)
+        elif client_order_id and not self.is_paper:
+            # 送單結果不明 (例如逾時)：用 clientOrderId 查一次，交易所其實收到的話照常確認
+            final_record = self.executor.fetch_order_status(self.symbol, client_order_id=client_order_id)
+            if not final_record:
+                return None, None
+            order_id = final_record['orderId']
+            if not is_final(final_record):
+                final_record = self.executor.wait_for_fill(self.symbol, order_id, timeout=self.fill_timeout)
         else:
-            logging.warning(f"訂單 {order_id} 未完全成交")
-
-    def _verify_order(self, order_id, response):
-        """ 查證訂單狀態 """
-        if self.is_paper:
-            return {
-                'avgPrice': float(response.get('cumQuote', 0)) / float(response.get('executedQty', 1)),
-                'executedQty': float(response.get('executedQty', 0)),
-                'notional': float(response.get('cumQuote', 0))
-            }
-        return self.executor.fetch_order_status(self.symbol, order_id)
-
-    def _log_trade_success(self, strategy_name, action, record, order_id):
-        avg_price = record['avgPrice']
-        qty = record['executedQty']
+            return None, None
         
+        if not final_record or final_record['executedQty'] <= 0:
+            logging.warning("訂單 %s 未完全成交", order_id)
+            return None, order_id
+
+        logging.info("訂單 %s 確認耗時 %.3fs", order_id, self.clock.time() - started)
+        return self._on_filled(side, final_record, order_id, market_price)
+
+    def _execute_maker(self, side, quantity, market_price, client_order_id=None):
+        """ 限價掛單 + 撤單重掛，逾時轉市價 (MakerExecution 回傳的已是最終合併結果) """
+        final_record = self.maker.execute(
+            self.symbol, side, quantity, ref_price=market_price, reduce_only=(side == 'SELL'),
+            client_order_id=client_order_id
+        )
+        order_id = final_record['orderId']
+        if final_record['executedQty'] <= 0:
+            logging.warning("掛單 %s 未成交", client_order_id or order_id)
+            return None, order_id
+        return self._on_filled(side, final_record, order_id, market_price)
+
+    def _on_filled(self, side, final_record, order_id, market_price):
+        """ 成交確認後：更新帳本、通知、記錄滑價 """
+        # 先更新本地帳本，後面的訊號才看得到這筆成交
+        self.account_book.apply_fill(
+            self.symbol, side, final_record['executedQty'], final_record['avgPrice'],
+            fill_time_ms=final_record.get('updateTime') or final_record.get('eventTime')
+        )
+        if self.notify:
+            send_tg_msg(f"[成交] {side} {self.symbol}\n數量: {final_record['executedQty']}\n均價: {final_record['avgPrice']:.2f}")
+        slip = slippage_bps(side, final_record['avgPrice'], market_price)
+        logging.info("[VERIFIED] 成交確認 | %s %s | 均價: %s | 滑價: %.2f bps",
+                     side, final_record['executedQty'], final_record['avgPrice'], slip)
+        return final_record, order_id
+
+    def _confirm_fill(self, order_id, response):
+        """
+        依序嘗試：
+        1. 下單回應本身已是最終狀態 (市價單 RESULT 回應 / 模擬盤) -> 直接使用
+        2. User Data Stream 連線中 -> 等 ORDER_TRADE_UPDATE 事件
+        3. 指數退避輪詢 query_order
+        """
+        record = BinanceExecutor.parse_order(response)
+        if is_final(record) or self.is_paper:
+            return record
+
+        logging.info("訂單已發送 ID: %s，等待撮合...", order_id)
+        if self.fill_tracker is not None and self.fill_tracker.active:
+            record = self.fill_tracker.wait(order_id, self.fill_timeout)
+            if is_final(record):
+                return record
+            logging.warning("訂單 %s 未收到成交事件，改用查詢確認", order_id)
+            return self.executor.fetch_order_status(self.symbol, order_id) or record
+
+        return self.executor.wait_for_fill(self.symbol, order_id, timeout=self.fill_timeout)
+
+    def _snap(self, qty):
+        """
+        策略虛擬持倉對齊到數量 step：按比例歸因會留下 0.0079999 這種尾數，
+        不處理的話之後平倉會被捨去成較小的量 (甚至 0)，留下的零頭讓策略永遠「已有持倉」
+        沒有交易規則 (模擬執行器) 時只把負數與極小的殘量歸零
+        """
+        rules = getattr(self.executor, 'rules', None)
+        ticks = rules.ticks(self.symbol) if rules is not None else getattr(self.executor, 'ticks', None)
+        if ticks is not None and ticks.qty is not None:
+            qty = ticks.qty.nearest_one(qty)
+        return qty if qty > 1e-12 else 0.0
+
+    def _log_trade_success(self, strategy_name, action, qty, price, order_id):
+        """ 把歸因後的成交記到該策略名下 """
+        if qty <= 0:
+            return
+        signed = qty if action == 'LONG' else -qty
+        self.strategy_positions[strategy_name] = self._snap(self.strategy_positions.get(strategy_name, 0.0) + signed)
+
         # DB 紀錄
         self.db.log_trade(
             strategy=strategy_name, symbol=self.symbol, side=action,
-            price=avg_price, quantity=qty, order_id=str(order_id),
-            notional=record['notional']
+            price=price, quantity=qty, order_id=str(order_id),
+            notional=qty * price
         )
-        
-        # TG 通知
-        send_tg_msg(f"[成交] {action} {self.symbol}\n策略: {strategy_name}\n數量: {qty}\n均價: {avg_price:.2f}")
-        logging.info(f"[VERIFIED] 成交確認 | 均價: {avg_price}")
\ No newline at end of file
+        logging.info("[FILL] %s | %s %.6f @ %s", strategy_name, action, qty, price)
@@ -0,0 +1,45 @@
+import argparse
+import logging
+import time
+import pandas as pd
+from utils.config_loader import ConfigLoader
+from utils.database import DatabaseHandler
+from analytics.performance import PerformanceAnalyzer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    config = ConfigLoader("config.json")
+
+    parser = argparse.ArgumentParser(description="分析 trading_data.db 的實盤 / 模擬盤績效")
+    parser.add_argument('--db', default="trading_data.db")
+    parser.add_argument('--symbol', default=config.get("trading", "symbol", "BTCUSDT"))
+    parser.add_argument('--interval', default=config.get("trading", "interval", "1h"))
+    parser.add_argument('--capital', type=float, default=1000.0, help="計算報酬率用的本金 (USDT)")
+    parser.add_argument('--watch', type=int, default=0, help="每隔 N 秒增量更新一次 (0 = 只跑一次)")
+    args = parser.parse_args()
+
+    analyzer = PerformanceAnalyzer(DatabaseHandler(args.db), args.symbol, args.interval, args.capital)
+
+    while True:
+        started = time.perf_counter()
+        n_trades, n_signals, n_bars = analyzer.update()
+        logging.info(f"[PERF] 新增 {n_trades} 筆成交 / {n_signals} 筆訊號 / {n_bars} 根 K 線 | "
+                     f"耗時 {time.perf_counter() - started:.3f}s")
+        analyzer.log_report()
+
+        with pd.option_context('display.width', 200, 'display.max_columns', 20):
+            print(analyzer.attribution())
+
+        if args.watch <= 0:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
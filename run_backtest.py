@@ -0,0 +1,63 @@
+import argparse
+import logging
+import pandas as pd
+from utils.config_loader import ConfigLoader
+from backtest import BacktestEngine
+from execution.symbol_rules import SymbolRulesCache
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def _to_ms(date_str):
+    if not date_str:
+        return None
+    return int(pd.Timestamp(date_str, tz='UTC').timestamp() * 1000)
+
+
+def main():
+    config = ConfigLoader("config.json")
+
+    parser = argparse.ArgumentParser(description="用 trading_data.db 的歷史資料回測策略")
+    parser.add_argument('--db', default="trading_data.db")
+    parser.add_argument('--symbol', default=config.get("trading", "symbol", "BTCUSDT"))
+    parser.add_argument('--interval', default=config.get("trading", "interval", "1h"))
+    parser.add_argument('--strategies', nargs='+', default=config.get("trading", "strategies", []))
+    parser.add_argument('--start', help="起始日期 (UTC)，例如 2024-01-01")
+    parser.add_argument('--end', help="結束日期 (UTC)")
+    parser.add_argument('--cash', type=float, default=10000.0)
+    parser.add_argument('--fee', type=float, default=0.0004)
+    parser.add_argument('--slippage-bps', type=float, default=0.0)
+    parser.add_argument('--out', help="把成交/訊號/快照寫入指定的 SQLite 檔")
+    parser.add_argument('--rules', help="交易規則快取檔 (例如 data_cache/exchange_info_live.json)，成交數量照交易所精度捨去")
+    args = parser.parse_args()
+
+    symbol_rules = None
+    if args.rules:
+        symbol_rules = SymbolRulesCache(None, path=args.rules).rules.get(args.symbol)
+        if symbol_rules is None:
+            logging.warning(f"[BACKTEST] {args.rules} 沒有 {args.symbol} 的規則，不做精度捨去")
+
+    engine = BacktestEngine(
+        args.symbol, args.interval, args.strategies, db_name=args.db,
+        start_time=_to_ms(args.start), end_time=_to_ms(args.end),
+        initial_cash=args.cash, fee_rate=args.fee, slippage_bps=args.slippage_bps,
+        fixed_amount=config.get("risk", "fixed_amount", 100),
+        leverage=config.get("risk", "leverage", 1),
+        symbol_rules=symbol_rules
+    )
+    result = engine.run()
+
+    for key, value in result.summary.items():
+        logging.info(f"[RESULT] {key}: {value}")
+
+    if args.out:
+        engine.recorder.save(args.out)
+        logging.info(f"[RESULT] 回測紀錄已寫入 {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import logging
+import time
+
+from fake_exchange import ExchangeClock, FakeExchange, FakeExchangeServer, RecordedMarket, SyntheticMarket
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動本機的假幣安合約交易所 (REST + WebSocket)，供離線端對端測試")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--ws-port', type=int, default=8801)
+    parser.add_argument('--symbols', nargs='+', default=["BTCUSDT"])
+    parser.add_argument('--n-symbols', type=int, default=0, help="額外產生 N 個合成交易對 (SYM001USDT ...)")
+    parser.add_argument('--source', choices=['synthetic', 'db'], default='synthetic')
+    parser.add_argument('--db', default="trading_data.db", help="--source db 時重播的資料庫")
+    parser.add_argument('--interval', default="1m", help="最小 K 線週期，其他週期由它聚合")
+    parser.add_argument('--history', type=int, default=2000, help="啟動時已存在的歷史 K 線根數")
+    parser.add_argument('--speed', type=float, default=1.0, help="時間加速倍率")
+    parser.add_argument('--latency', type=float, default=0.0, help="每個 REST 請求的固定延遲 (秒)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="額外的隨機延遲上限 (秒)")
+    parser.add_argument('--event-delay', type=float, default=0.0, help="成交後延遲多久才推送 user stream 事件 (秒)")
+    parser.add_argument('--balance', type=float, default=10000.0)
+    parser.add_argument('--maker-fill-prob', type=float, default=0.2, help="每次撮合時掛在最佳價的限價單被吃到的機率")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    symbols = list(args.symbols) + [f"SYM{i:03d}USDT" for i in range(1, args.n_symbols + 1)]
+    clock = ExchangeClock(speed=args.speed)
+    if args.source == 'db':
+        from utils.database import DatabaseHandler
+        market = RecordedMarket(DatabaseHandler(args.db), symbols, args.interval, args.history, clock)
+    else:
+        market = SyntheticMarket(symbols, args.interval, args.history, clock, seed=args.seed)
+
+    exchange = FakeExchange(market, balance=args.balance, maker_fill_prob=args.maker_fill_prob, seed=args.seed)
+    server = FakeExchangeServer(
+        exchange, host=args.host, port=args.port, ws_port=args.ws_port,
+        latency=args.latency, jitter=args.jitter, event_delay=args.event_delay,
+    ).start()
+    logging.info(f"[FAKE] 設定 base_url={server.base_url} stream_url={server.stream_url} 即可連線 (Ctrl+C 結束)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import logging
+import pandas as pd
+from utils.database import DatabaseHandler
+from analytics import metrics
+from analytics.monte_carlo import MonteCarlo, METHODS, trade_returns
+from backtest.features import FeatureCache
+from backtest.vectorized import evaluate
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def _trades_per_year(trades_df, n_trips):
+    """ 逐筆交易報酬的年化期數：完整來回數 / 資料涵蓋的年數 """
+    ts = pd.to_datetime(trades_df['timestamp'], format='ISO8601')
+    years = (ts.max() - ts.min()).total_seconds() / (365 * 86400)
+    return n_trips / years if years > 0 else max(n_trips, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略報酬的 Monte Carlo bootstrap (回撤 / Sharpe 信賴區間)")
+    parser.add_argument('strategy', help="bars 模式填策略類別 (PriceVolume9)，trades 模式填策略名稱 (Strategy9_Mom_VROC_Shock)")
+    parser.add_argument('--source', choices=('bars', 'trades'), default='bars',
+                        help="bars: 向量化回測的逐根報酬；trades: trades 表的逐筆來回報酬")
+    parser.add_argument('--db', default="trading_data.db")
+    parser.add_argument('--symbol', default="BTCUSDT")
+    parser.add_argument('--interval', default="1h")
+    parser.add_argument('--fee', type=float, default=0.0004)
+    parser.add_argument('--paths', type=int, default=10000)
+    parser.add_argument('--method', choices=METHODS, default='stationary')
+    parser.add_argument('--block', type=float, default=None, help="區塊 (平均) 長度，預設 n^(1/3)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    db = DatabaseHandler(args.db)
+    if args.source == 'bars':
+        df = db.load_market_data_range(args.symbol, args.interval)
+        if df.empty:
+            logging.error(f"資料庫中沒有 {args.symbol} {args.interval} 的 K 線")
+            return
+        df = df.sort_values('open_time')
+        fc = FeatureCache(*(df[c].to_numpy(dtype=float) for c in ['open_time', 'open', 'high', 'low', 'close', 'volume']))
+        periods = metrics.periods_per_year(args.interval)
+        _, returns = evaluate(fc, args.strategy, {}, fee_rate=args.fee, periods=periods)
+    else:
+        trades = db.load_rows_since('trades')
+        trades = trades[(trades['symbol'] == args.symbol) & (trades['strategy'] == args.strategy)]
+        returns = trade_returns(trades)
+        if len(returns) < 2:
+            logging.error(f"{args.strategy} 的完整來回交易不足 ({len(returns)} 筆)")
+            return
+        periods = _trades_per_year(trades, len(returns))
+
+    mc = MonteCarlo(returns, method=args.method, block_len=args.block, periods=periods, workers=args.workers)
+    result = mc.run(args.paths, seed=args.seed)
+    result.log_report()
+    print(result.bands().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import json
+import logging
+from utils.database import DatabaseHandler
+from backtest.sweep import ParameterSweep, grid, random_search
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略參數網格 / 隨機搜尋")
+    parser.add_argument('strategy', help="策略類別名稱，例如 PriceVolume9")
+    parser.add_argument('--db', default="trading_data.db")
+    parser.add_argument('--symbol', default="BTCUSDT")
+    parser.add_argument('--interval', default="1h")
+    parser.add_argument('--grid', help='JSON，例如 {"window": [60, 90], "th1": [0.7, 0.8]}')
+    parser.add_argument('--random', type=int, default=0, help="隨機抽樣組數 (搭配 --space)")
+    parser.add_argument('--space', help='JSON，例如 {"window": [20, 200], "th1": [0.5, 0.95]} (兩個值代表區間)')
+    parser.add_argument('--metric', default="sharpe")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--fee', type=float, default=0.0004)
+    parser.add_argument('--out', default="sweep_results.csv")
+    args = parser.parse_args()
+
+    df = DatabaseHandler(args.db).load_market_data_range(args.symbol, args.interval)
+    if df.empty:
+        logging.error(f"資料庫中沒有 {args.symbol} {args.interval} 的 K 線")
+        return
+
+    if args.random:
+        space = {k: tuple(v) if len(v) == 2 else v for k, v in json.loads(args.space).items()}
+        param_sets = random_search(space, args.random)
+    else:
+        param_sets = grid(json.loads(args.grid))
+
+    sweep = ParameterSweep(args.strategy, df, interval=args.interval, fee_rate=args.fee, workers=args.workers)
+    table = sweep.run(param_sets, metric=args.metric)
+    sweep.save(table, args.out)
+    print(table.head(20).to_string())
+
+
+if __name__ == "__main__":
+    main()
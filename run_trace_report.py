@@ -0,0 +1,60 @@
+import argparse
+import logging
+from collections import defaultdict
+
+import numpy as np
+from utils.config_loader import ConfigLoader
+from utils.tracing import read_spans, NO_BAR
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    config = ConfigLoader("config.json")
+
+    parser = argparse.ArgumentParser(description="依追蹤檔統計最近 N 根 K 線各階段的延遲 (p50 / p95 / p99)")
+    parser.add_argument('--file', default=config.get("tracing", "path", "trace.log"))
+    parser.add_argument('--bars', type=int, default=100, help="只看最近 N 根 K 線")
+    parser.add_argument('--symbol', default=None, help="只看某個交易對 (預設全部)")
+    parser.add_argument('--bar', default=None, help="列出單一 K 線 (bar_id，例如 BTCUSDT:1m:1700000000000) 的完整時間軸")
+    args = parser.parse_args()
+
+    spans = [s for s in read_spans(args.file) if s[0] != NO_BAR]
+    if args.symbol:
+        spans = [s for s in spans if s[0].split(':', 1)[0] == args.symbol]
+    if not spans:
+        logging.warning(f"[TRACE] {args.file} 沒有任何 K 線的紀錄")
+        return
+
+    if args.bar:
+        timeline = sorted((s for s in spans if s[0] == args.bar), key=lambda s: s[2])
+        t0 = timeline[0][2] if timeline else 0.0
+        for _, name, start, duration in timeline:
+            print(f"{(start - t0) * 1000:>10.1f} ms  {duration:>10.1f} ms  {name}")
+        return
+
+    # 最近 N 根 (依 K 線開盤時間)
+    bars = sorted({s[0] for s in spans}, key=lambda b: int(b.rsplit(':', 1)[1]))[-args.bars:]
+    selected = set(bars)
+    by_stage = defaultdict(list)
+    for bar, name, _, duration in spans:
+        if bar in selected:
+            by_stage[name].append(duration)
+
+    logging.info(f"[TRACE] {len(bars)} 根 K 線 ({bars[0]} ~ {bars[-1]})")
+    print(f"{'stage':<40}{'n':>7}{'p50':>11}{'p95':>11}{'p99':>11}{'max':>11}   (ms)")
+    rows = []
+    for name, values in by_stage.items():
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        rows.append((name, len(values), p50, p95, p99, max(values)))
+    # 依 p95 排序，最慢的階段排最前面
+    for name, n, p50, p95, p99, worst in sorted(rows, key=lambda r: -r[3]):
+        print(f"{name:<40}{n:>7}{p50:>11.1f}{p95:>11.1f}{p99:>11.1f}{worst:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
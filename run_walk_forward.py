@@ -0,0 +1,49 @@
+import argparse
+import json
+import logging
+from utils.database import DatabaseHandler
+from backtest.sweep import grid
+from backtest.walk_forward import WalkForward
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="滾動 walk-forward 最佳化與樣本外驗證")
+    parser.add_argument('strategy', help="策略類別名稱，例如 PriceVolume1")
+    parser.add_argument('--db', default="trading_data.db")
+    parser.add_argument('--symbol', default="BTCUSDT")
+    parser.add_argument('--interval', default="1h")
+    parser.add_argument('--grid', required=True, help='JSON，例如 {"th1": [0.7, 0.8, 0.9]}')
+    parser.add_argument('--train-bars', type=int, default=24 * 180, help="in-sample 長度 (K 線根數)")
+    parser.add_argument('--test-bars', type=int, default=24 * 30, help="out-of-sample 長度 (K 線根數)")
+    parser.add_argument('--step', type=int, default=None)
+    parser.add_argument('--metric', default="sharpe")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--fee', type=float, default=0.0004)
+    parser.add_argument('--cache', default="backtest_cache.db")
+    parser.add_argument('--out', default="walk_forward_folds.csv")
+    args = parser.parse_args()
+
+    df = DatabaseHandler(args.db).load_market_data_range(args.symbol, args.interval)
+    if df.empty:
+        logging.error(f"資料庫中沒有 {args.symbol} {args.interval} 的 K 線")
+        return
+
+    wfo = WalkForward(args.strategy, df, symbol=args.symbol, interval=args.interval,
+                      fee_rate=args.fee, workers=args.workers, cache_db=args.cache)
+    report = wfo.run(grid(json.loads(args.grid)), args.train_bars, args.test_bars, args.step, args.metric)
+
+    folds = report.folds_table()
+    folds.to_csv(args.out, index=False)
+    print(folds.to_string(index=False))
+    for key, value in report.summary().items():
+        logging.info(f"[WFO] {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
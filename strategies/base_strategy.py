@@ -1,5 +1,4 @@
 import pandas as pd
-import talib
 from abc import ABC, abstractmethod
 
 
@@ -43,6 +42,6 @@ class BaseStrategy(ABC):
         """
         pass
     
-    # 這裡封裝常用的 talib，讓子策略寫起來更乾淨
+    # 這裡封裝常用的取值，讓子策略寫起來更乾淨 (指標計算見 indicators.py)
     def get_close(self):
         return self.kline_data['close'].values
\ No newline at end of file
@@ -0,0 +1,42 @@
+from binance.um_futures import UMFutures
+
+from utils.rate_limiter import get_limiter, endpoint_weight, endpoint_priority
+
+DEFAULT_BASE_URL = "https://fapi.binance.com"
+
+
+class RateLimitedUMFutures(UMFutures):
+    """
+    所有請求都經過共用的 WeightRateLimiter 的 UMFutures
+    - 送出前依端點權重取得額度 (下單優先於資料)
+    - 每個回應都讀 X-MBX-USED-WEIGHT-1M 校正額度，429 / 418 依 Retry-After 暫停
+    呼叫方式與 UMFutures 完全相同
+    """
+
+    def __init__(self, key=None, secret=None, limiter=None, **kwargs):
+        kwargs.setdefault("base_url", DEFAULT_BASE_URL)
+        super().__init__(key, secret, **kwargs)
+        self.limiter = limiter or get_limiter(self.base_url)
+
+    def send_request(self, http_method, url_path, payload=None, special=False):
+        self.limiter.acquire(endpoint_weight(url_path, payload), endpoint_priority(url_path))
+        return super().send_request(http_method, url_path, payload, special)
+
+    def _handle_exception(self, response):
+        headers = response.headers
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('X-MBX-USED-WEIGHT')
+        if used is not None:
+            try:
+                self.limiter.observe_used_weight(float(used))
+            except ValueError:
+                pass
+        if response.status_code in (418, 429):
+            retry_after = headers.get('Retry-After')
+            self.limiter.block_for(float(retry_after) if retry_after else 60.0,
+                                   banned=response.status_code == 418)
+        super()._handle_exception(response)
+
+
+def create_client(key=None, secret=None, base_url=DEFAULT_BASE_URL, **kwargs):
+    """ 專案內所有幣安合約連線都從這裡建立，同一個主機共用同一個 limiter """
+    return RateLimitedUMFutures(key=key, secret=secret, base_url=base_url, **kwargs)
@@ -0,0 +1,129 @@
+import time
+import logging
+from datetime import datetime
+
+
+class SystemClock:
+    """ 真實時鐘 (實盤用) """
+
+    def time(self):
+        """ 目前時間 (秒, float) """
+        return time.time()
+
+    def now(self):
+        """ 目前時間 (datetime)，給 DB 紀錄用 """
+        return datetime.now()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class SimulatedClock:
+    """
+    模擬時鐘 (回測 / 離線測試用)
+    sleep() 不會真的等待，只會把時間往前推，讓整個流程能以 CPU 極速跑完
+    """
+
+    def __init__(self, start_time=0.0):
+        self._now = float(start_time)
+
+    def time(self):
+        return self._now
+
+    def now(self):
+        return datetime.fromtimestamp(self._now)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self._now += seconds
+
+    def set_time(self, timestamp):
+        """ 直接跳到指定時間 (秒)，回測時每根 K 線收盤呼叫一次 """
+        self._now = float(timestamp)
+
+    def set_time_ms(self, timestamp_ms):
+        """ 同上，但輸入是毫秒 (K 線 open_time 的單位) """
+        self._now = timestamp_ms / 1000.0
+
+
+class ServerClock:
+    """
+    以交易所伺服器時間為準的時鐘 (本機時區 / 時間偏差都不影響 K 線邊界的判斷)
+    sync() 呼叫數次 client.time()，取來回最短的一次估計：
+        offset = serverTime - (送出 + 收到) / 2，latency = 來回時間 / 2
+    """
+
+    def __init__(self, client, base=None, samples=5):
+        self.client = client
+        self.base = base or system_clock
+        self.samples = samples
+        self.offset = 0.0   # 秒，伺服器 - 本機
+        self.latency = 0.0  # 秒，單程延遲估計
+        self.synced_at = None
+
+    def sync(self):
+        """ 更新 offset / latency；全部失敗時保留上次的值，回傳是否成功 """
+        best = None
+        for _ in range(self.samples):
+            try:
+                sent = self.base.time()
+                server = self.client.time()['serverTime'] / 1000.0
+                received = self.base.time()
+            except Exception as e:
+                logging.warning(f"[CLOCK] 查詢伺服器時間失敗: {e}")
+                continue
+            rtt = received - sent
+            if best is None or rtt < best[0]:
+                best = (rtt, server - (sent + received) / 2)
+        if best is None:
+            return False
+        self.latency, self.offset = best[0] / 2, best[1]
+        self.synced_at = self.base.time()
+        logging.info(f"[CLOCK] 伺服器時間差 {self.offset * 1000:+.1f} ms | 單程延遲 {self.latency * 1000:.1f} ms")
+        return True
+
+    def sync_if_stale(self, max_age):
+        """ 距離上次校時超過 max_age 秒 (或從未校時) 才 sync """
+        if self.synced_at is None or self.base.time() - self.synced_at >= max_age:
+            return self.sync()
+        return True
+
+    def time(self):
+        return self.base.time() + self.offset
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds):
+        self.base.sleep(seconds)
+
+
+# 預設共用實例
+system_clock = SystemClock()
+
+
+# K 線週期對應的毫秒數
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000, '3d': 259_200_000,
+    '1w': 604_800_000,
+}
+
+# 週期邊界相對 epoch 的位移：週 K 從週一 00:00 UTC 開盤，epoch (1970-01-01) 是週四，差 4 天
+# 其他週期都是 epoch 的整數倍；月 K 長度不固定，不支援
+INTERVAL_OFFSET_MS = {'1w': 345_600_000}
+
+
+def interval_to_ms(interval):
+    """ '1h' -> 3600000 """
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"不支援的 K 線週期: {interval}")
+    return INTERVAL_MS[interval]
+
+
+def interval_offset_ms(interval):
+    """ '1w' -> 345600000 (週一開盤)，其他週期為 0 """
+    interval_to_ms(interval)
+    return INTERVAL_OFFSET_MS.get(interval, 0)
@@ -8,6 +8,14 @@ class ConfigLoader:
         self._config = {}
         self.load_config()
 
+    @classmethod
+    def from_dict(cls, config):
+        """ 直接用 dict 建立設定 (回測 / 參數掃描用，不需要設定檔) """
+        instance = cls.__new__(cls)
+        instance.config_path = None
+        instance._config = config
+        return instance
+
     def load_config(self):
         """ 讀取 JSON 設定檔 """
         if not os.path.exists(self.config_path):
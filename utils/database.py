@@ -3,6 +3,7 @@ import json
 from datetime import datetime
 import logging
 import pandas as pd 
+from utils.tracing import traced
 
 class DatabaseHandler:
     def __init__(self, db_name="trading_data.db"):
@@ -89,10 +90,44 @@ class DatabaseHandler:
                 PRIMARY KEY (timestamp, symbol, metric)
             )
         ''')
+
+        # 6. 下單日誌 (Write-Ahead)：送單前先寫入，重啟時與交易所對帳
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS order_journal (
+                client_order_id TEXT PRIMARY KEY,
+                symbol TEXT,
+                side TEXT,
+                quantity REAL,
+                bar_time INTEGER,
+                plan_json TEXT,
+                status TEXT,
+                order_id TEXT,
+                executed_qty REAL DEFAULT 0,
+                avg_price REAL DEFAULT 0,
+                created_at INTEGER,
+                updated_at INTEGER
+            )
+        ''')
+
+        # 7. 執行狀態 (例如最後處理完的 K 線)，重啟時接續
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
+        # 8. 索引 (績效分析會依時間區間 / 策略讀取)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades (strategy, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_signals_timestamp ON signals (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON snapshots (timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_journal_status ON order_journal (symbol, status)')
         
         conn.commit()
         conn.close()
 
+    @traced('db.log_trade')
     def log_trade(self, strategy, symbol, side, price, quantity, order_id, notional):
         """ 紀錄一筆成交 """
         try:
@@ -108,6 +143,7 @@ class DatabaseHandler:
         except Exception as e:
             logging.error(f" [DB ERROR] 寫入交易失敗: {e}")
 
+    @traced('db.log_signal')
     def log_signal(self, strategy, symbol, action, price, reason):
         """ 紀錄策略訊號 """
         try:
@@ -122,6 +158,7 @@ class DatabaseHandler:
         except Exception as e:
             logging.error(f" [DB ERROR] 寫入訊號失敗: {e}")
 
+    @traced('db.log_snapshot')
     def log_snapshot(self, balance, unrealized_pnl, btc_price, positions):
         """ 紀錄資產快照 """
         try:
@@ -136,7 +173,128 @@ class DatabaseHandler:
         except Exception as e:
             logging.error(f" [DB ERROR] 寫入快照失敗: {e}")
 
+    @traced('db.load_strategy_positions')
+    def load_strategy_positions(self, symbol):
+        """
+        從 trades 表還原各策略的虛擬持倉 (LONG 加、其餘減)，重啟後接續淨額撮合用
+        舊資料可能出現負數 (以前的 CLOSE 會平掉整個帳戶)，一律視為 0
+        """
+        try:
+            conn = self._connect()
+            rows = conn.execute('''
+                SELECT strategy, SUM(CASE WHEN side IN ('LONG', 'BUY') THEN quantity ELSE -quantity END)
+                FROM trades WHERE symbol = ? GROUP BY strategy
+            ''', (symbol,)).fetchall()
+            conn.close()
+            return {strategy: max(0.0, qty or 0.0) for strategy, qty in rows}
+        except Exception as e:
+            logging.error(f" [DB ERROR] 讀取策略持倉失敗: {e}")
+            return {}
+
+    # --- 下單日誌 / 執行狀態 ---
+    # 寫入失敗時直接拋出例外：日誌沒寫進去就不能送單
+
+    JOURNAL_COLUMNS = ('client_order_id', 'symbol', 'side', 'quantity', 'bar_time', 'plan_json',
+                       'status', 'order_id', 'executed_qty', 'avg_price', 'created_at', 'updated_at')
+
+    @traced('db.journal_insert')
+    def journal_insert(self, entry):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f'''
+                    INSERT INTO order_journal ({', '.join(entry)}) VALUES ({', '.join('?' * len(entry))})
+                ''', tuple(entry.values()))
+        finally:
+            conn.close()
+
+    @traced('db.journal_update')
+    def journal_update(self, client_order_id, **fields):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f'''
+                    UPDATE order_journal SET {', '.join(f'{k} = ?' for k in fields)} WHERE client_order_id = ?
+                ''', (*fields.values(), client_order_id))
+        finally:
+            conn.close()
+
+    @traced('db.load_journal')
+    def load_journal(self, symbol=None, statuses=None, client_order_id=None):
+        """ 讀取下單日誌 (dict 列表)，可依交易對 / 狀態 / client id 篩選 """
+        clauses, params = [], []
+        if symbol is not None:
+            clauses.append('symbol = ?')
+            params.append(symbol)
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if client_order_id is not None:
+            clauses.append('client_order_id = ?')
+            params.append(client_order_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = self._connect()
+        try:
+            rows = conn.execute(f'''
+                SELECT {', '.join(self.JOURNAL_COLUMNS)} FROM order_journal {where} ORDER BY created_at
+            ''', params).fetchall()
+        finally:
+            conn.close()
+        return [dict(zip(self.JOURNAL_COLUMNS, row)) for row in rows]
+
+    @traced('db.save_state')
+    def save_state(self, key, value):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        finally:
+            conn.close()
+
+    @traced('db.load_state')
+    def load_state(self, key, default=None):
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value FROM bot_state WHERE key = ?', (key,)).fetchone()
+            conn.close()
+            return json.loads(row[0]) if row else default
+        except Exception as e:
+            logging.error(f" [DB ERROR] 讀取狀態 {key} 失敗: {e}")
+            return default
+
+    # 可以用 load_rows_since 增量讀取的紀錄表
+    LOG_TABLES = ('trades', 'signals', 'snapshots')
+
+    def load_rows_since(self, table, last_id=0, start_time=None, end_time=None, columns=None):
+        """
+        增量讀取 trades / signals / snapshots
+        :param last_id: 只讀 id > last_id 的新資料 (走主鍵)
+        :param start_time / end_time: 時間區間 (datetime 或字串，走 timestamp 索引)
+        :param columns: 只讀需要的欄位 (id 一定會帶上)，大表時可以省下大部分的讀取時間
+        """
+        if table not in self.LOG_TABLES:
+            raise ValueError(f"不支援的表: {table}")
+        select = '*' if not columns else ', '.join(['id'] + [c for c in columns if c != 'id'])
+        try:
+            conn = self._connect()
+            query = f'SELECT {select} FROM {table} WHERE id > ?'
+            params = [last_id]
+            if start_time is not None:
+                query += ' AND timestamp >= ?'
+                params.append(str(start_time))
+            if end_time is not None:
+                query += ' AND timestamp <= ?'
+                params.append(str(end_time))
+            query += ' ORDER BY id ASC'
+            df = pd.read_sql(query, conn, params=params)
+            conn.close()
+            return df
+        except Exception as e:
+            logging.error(f" [DB ERROR] 讀取 {table} 失敗: {e}")
+            return pd.DataFrame()
+
     # 新增：儲存 K 線數據 (批量寫入)
+    @traced('db.save_market_data')
     def save_market_data(self, symbol, interval, df):
         if df.empty: return
 
@@ -212,6 +370,7 @@ class DatabaseHandler:
             logging.error(f"[DB ERROR] 寫入市場數據失敗: {e}")
 
     #  新增：讀取 K 線數據 (給策略用)
+    @traced('db.load_market_data')
     def load_market_data(self, symbol, interval, limit=200):
         try:
             conn = self._connect()
@@ -244,7 +403,41 @@ class DatabaseHandler:
             logging.error(f" [DB ERROR] 讀取市場數據失敗: {e}")
             return pd.DataFrame()
         
+    #  新增：讀取一段時間範圍的 K 線 (給回測用)
+    def load_market_data_range(self, symbol, interval, start_time=None, end_time=None):
+        """
+        讀取 [start_time, end_time] 之間的所有 K 線 (毫秒)，None 代表不限制
+        走 (symbol, interval, open_time) 主鍵索引，一次讀出整段歷史
+        """
+        try:
+            conn = self._connect()
+            query = '''
+                SELECT open_time, open, high, low, close, volume, close_time
+                FROM market_data
+                WHERE symbol = ? AND interval = ? AND open_time >= ? AND open_time <= ?
+                ORDER BY open_time ASC
+            '''
+            params = (
+                symbol, interval,
+                start_time if start_time is not None else 0,
+                end_time if end_time is not None else 2**62
+            )
+            df = pd.read_sql(query, conn, params=params)
+            conn.close()
+
+            if df.empty:
+                return pd.DataFrame()
+
+            numeric_cols = ['open', 'high', 'low', 'close', 'volume']
+            df[numeric_cols] = df[numeric_cols].astype(float)
+            return df
+
+        except Exception as e:
+            logging.error(f" [DB ERROR] 讀取區間市場數據失敗: {e}")
+            return pd.DataFrame()
+
     #  新增：儲存外部數據的方法
+    @traced('db.save_generic_external_data')
     def save_generic_external_data(self, df):
         """
         通用的儲存函數
@@ -283,6 +476,7 @@ class DatabaseHandler:
             logging.error(f" [DB ERROR] 儲存通用外部數據失敗: {e}")
 
     # 新增：讀取外部數據
+    @traced('db.load_external_data')
     def load_external_data(self, symbol, metric, start_time=None, limit=200):
         """
         讀取外部數據 (智慧對齊版)
@@ -0,0 +1,140 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 所有啟動中的背景寫檔執行緒 (stop_logging 時一起送完、停掉)
+_listeners = []
+
+
+class SizeTimedRotatingFileHandler(RotatingFileHandler):
+    """
+    檔案超過 max_bytes，或到了輪替時間 (when='midnight' 每天 / 'H' 每小時 / None 不依時間) 就輪替
+    備份檔為 <path>.1 ~ <path>.<backups>，數字越大越舊，超過的直接刪掉，所以總大小有上限
+    """
+
+    def __init__(self, filename, max_bytes=10_000_000, backups=5, when=None, encoding='utf-8'):
+        if when not in (None, 'midnight', 'H'):
+            raise ValueError(f"不支援的輪替時間: {when}")
+        super().__init__(filename, maxBytes=max_bytes, backupCount=max(1, backups), encoding=encoding, delay=True)
+        self.when = when
+        self.rollover_at = self._next_rollover(time.time())
+
+    def _next_rollover(self, now):
+        if self.when == 'midnight':
+            t = time.localtime(now)
+            return time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+        if self.when == 'H':
+            return (int(now) // 3600 + 1) * 3600
+        return None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover(time.time())
+
+
+class JsonFormatter(logging.Formatter):
+    """ 一行一筆 JSON (JSON Lines)，給程式解析用 """
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    呼叫端只組好訊息本身 (%-參數當下就代入，之後被改掉的 dict / list 不會印出錯的值)，
+    時間 / 格式、例外堆疊的展開與寫檔都在背景執行緒做
+    (同一個行程內傳遞，不需要像預設的 prepare() 一樣把整筆紀錄格式化好再 pickle)
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def start_queue(*handlers):
+    """
+    handlers 改由背景執行緒處理
+    :return: 要掛到 logger 上的 QueueHandler
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return _LazyQueueHandler(log_queue)
+
+
+def stop_queue(handler):
+    """ 停掉 start_queue 建立的背景執行緒 (先把佇列裡剩下的紀錄寫完) """
+    log_queue = getattr(handler, 'queue', None)
+    for listener in list(_listeners):
+        if log_queue is not None and listener.queue is log_queue:
+            _listeners.remove(listener)
+            listener.stop()
+            for h in listener.handlers:
+                h.close()
+
+
+def setup_logging(path=None, level='INFO', max_bytes=10_000_000, backups=5, when='midnight',
+                  json_path=None, console=True):
+    """
+    設定 root logger：所有 handler 都掛在背景執行緒，交易執行緒只組好訊息字串再放進佇列 (寫檔等 I/O 不會卡住下單)
+    :param path: 文字 log 檔 (None 代表不寫檔)
+    :param json_path: (選填) 另外寫一份 JSON Lines
+    :param when: 依時間輪替 ('midnight' / 'H' / None)，同時也依 max_bytes 輪替
+    """
+    handlers = []
+    if console:
+        handlers.append(logging.StreamHandler())
+    if path:
+        handlers.append(SizeTimedRotatingFileHandler(path, max_bytes, backups, when))
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    if json_path:
+        handler = SizeTimedRotatingFileHandler(json_path, max_bytes, backups, when)
+        handler.setFormatter(JsonFormatter())
+        handlers.append(handler)
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+        stop_queue(old)
+        old.close()
+    root.addHandler(start_queue(*handlers))
+    root.setLevel(level)
+    return root
+
+
+def stop_logging():
+    """ 把佇列裡剩下的紀錄寫完再停掉背景執行緒 (程式結束時 atexit 會自動呼叫) """
+    while _listeners:
+        listener = _listeners.pop()
+        listener.stop()
+        for h in listener.handlers:
+            h.close()
+
+
+atexit.register(stop_logging)
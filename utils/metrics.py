@@ -0,0 +1,235 @@
+import logging
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import rate_limiter
+from utils.tracing import tracer
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# 延遲 histogram 的預設 bucket (秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if upper == float('inf') else repr(upper)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    """ 所有指標；collectors 是 scrape 時才計算的回呼 (例如 RSS、限流器額度) """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        for collect in self.collectors:
+            try:
+                collect()
+            except Exception as e:
+                logging.debug("[METRICS] collector 失敗: %s", e)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# --- 共用指標 ---
+LOOP_LAG = Gauge('qt_loop_lag_seconds', '主迴圈比預定時間晚了多久 (K 線收盤 -> 偵測到)', ['loop'])
+CLOSE_TO_ACK = Histogram('qt_close_to_ack_seconds', 'K 線收盤到下單回應的總延遲')
+FETCH_DURATION = Histogram('qt_fetch_duration_seconds', '外部數據源抓取耗時', ['source'])
+FETCH_FAILURES = Counter('qt_fetch_failures_total', '外部數據源抓取失敗次數', ['source'])
+SOURCE_BREAKER_OPEN = Gauge('qt_source_breaker_open', '外部數據源的斷路器是否跳開 (1 = 冷卻中)', ['source'])
+DB_LATENCY = Histogram('qt_db_call_seconds', 'DB 讀寫耗時', ['op'])
+STRATEGY_DURATION = Histogram('qt_strategy_compute_seconds', '單一策略計算訊號耗時', ['strategy'])
+ORDER_RTT = Histogram('qt_order_roundtrip_seconds', '下單到確認成交的耗時', ['path'])
+STAGE_DURATION = Histogram('qt_stage_seconds', '其他追蹤階段的耗時', ['stage'])
+RATE_LIMIT_USED = Gauge('qt_rate_limit_used_weight', '限流器估計的本分鐘已用權重', ['host'])
+RATE_LIMIT_WEIGHT = Gauge('qt_rate_limit_weight_total', '啟動以來送出的請求權重合計', ['host'])
+RATE_LIMIT_THROTTLED = Gauge('qt_rate_limit_throttled_total', '啟動以來被限流器延後的請求數', ['host'])
+PROCESS_RSS = Gauge('qt_process_resident_memory_bytes', '行程常駐記憶體 (RSS)')
+
+
+def _on_span(name, start, duration, bar):
+    """ tracing 的 span 依名稱前綴分到對應的指標 """
+    prefix, _, rest = name.partition('.')
+    if prefix == 'fetch':
+        FETCH_DURATION.observe(duration, source=rest)
+    elif prefix == 'db':
+        DB_LATENCY.observe(duration, op=rest)
+    elif prefix == 'strategy':
+        STRATEGY_DURATION.observe(duration, strategy=rest)
+    elif name in ('execute_order', 'confirm_order', 'execute_orders'):
+        ORDER_RTT.observe(duration, path=name)
+    elif name == 'close_to_ack':
+        CLOSE_TO_ACK.observe(duration)
+    else:
+        STAGE_DURATION.observe(duration, stage=name)
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # 沒有 /proc 時用峰值
+
+
+def _collect_process():
+    PROCESS_RSS.set(_rss_bytes())
+    with rate_limiter._limiters_lock:
+        limiters = list(rate_limiter._limiters.items())
+    for host, limiter in limiters:
+        # 讀取不加鎖：只是監控用的近似值，不能讓 scrape 卡住下單
+        RATE_LIMIT_USED.set(max(0.0, limiter.capacity - limiter.tokens), host=host)
+        RATE_LIMIT_WEIGHT.set(limiter.stats['weight'], host=host)
+        RATE_LIMIT_THROTTLED.set(limiter.stats['throttled'], host=host)
+
+
+REGISTRY.collectors.append(_collect_process)
+
+
+class MetricsServer:
+    """
+    背景執行緒的 /metrics 端點 (Prometheus text format 0.0.4)，只用標準庫
+    scrape 只會短暫拿各指標自己的鎖，不會碰到交易流程
+    端點沒有驗證，預設只聽 127.0.0.1；要給別台機器抓請自行指定 host 並用防火牆限制來源
+    """
+
+    def __init__(self, port=9108, host='127.0.0.1', registry=None):
+        self.registry = registry or REGISTRY
+        self.http = ThreadingHTTPServer((host, port), _make_handler(self.registry))
+        self.http.daemon_threads = True
+
+    @property
+    def port(self):
+        return self.http.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.http.serve_forever, name="metrics-http", daemon=True).start()
+        # 開始監聽 tracing 的 span (有沒有寫追蹤檔都一樣)
+        if _on_span not in tracer.listeners:
+            tracer.add_listener(_on_span)
+        logging.info(f"[METRICS] 指標端點: http://{self.http.server_address[0]}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+def start_metrics_server(port=9108, host='127.0.0.1'):
+    """ 啟動失敗 (例如 port 被佔用) 只記錄錯誤，不影響主程式 """
+    try:
+        return MetricsServer(port, host).start()
+    except OSError as e:
+        logging.error(f"[METRICS] 指標端點啟動失敗 (port {port}): {e}")
+        return None
+
+
+def _make_handler(registry):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            payload = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
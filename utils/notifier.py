@@ -1,38 +1,178 @@
 import requests
 import os
 import logging
-# 👇 新增這一行
+import atexit
+import queue
+import threading
+
 from dotenv import load_dotenv
 
-# 👇 在 class 定義之前，先執行載入
+from utils.clock import system_clock
+
+# 在 class 定義之前，先執行載入
 load_dotenv()
+
+# Telegram 單則訊息的字數上限
+MAX_MESSAGE_LENGTH = 4096
+
+
 class TelegramNotifier:
-    def __init__(self):
-        self.token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
+    """
+    非阻塞的 Telegram 通知
+    - send_message() 只把訊息放進有上限的佇列就返回，送出交給背景執行緒，不會拖慢下單流程
+    - 背景執行緒用同一個 requests.Session (keep-alive)，不用每則都重新建立 TCP / TLS 連線
+    - 短時間內湧入的多則訊息 (例如同一根 K 線的多筆成交) 合併成一則送出
+    - 兩次送出至少間隔 min_interval 秒；收到 429 依 retry_after 等待後重送
+    - 佇列滿了就丟掉最舊的訊息 (通知不能反過來卡住交易)
+    """
+
+    def __init__(self, token=None, chat_id=None, maxsize=100, coalesce_window=1.0, min_interval=1.0,
+                 timeout=5, max_retries=3, clock=None):
+        self.token = token or os.getenv('TELEGRAM_BOT_TOKEN')
+        self.chat_id = chat_id or os.getenv('TELEGRAM_CHAT_ID')
         self.base_url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        self.coalesce_window = coalesce_window
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.clock = clock or system_clock
+
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.session = None
+        self.stats = {'queued': 0, 'sent': 0, 'batches': 0, 'dropped': 0, 'failed': 0}
+        self._last_sent = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._warned = False
 
     def send_message(self, message):
-        """ 發送訊息到 Telegram """
+        """ 發送訊息到 Telegram (只排進佇列，立刻返回) """
         if not self.token or not self.chat_id:
-            logging.warning("⚠️ Telegram Token 或 Chat ID 未設定，無法發送通知。")
+            if not self._warned:
+                self._warned = True
+                logging.warning("⚠️ Telegram Token 或 Chat ID 未設定，無法發送通知。")
+            return
+
+        self._ensure_started()
+        while True:
+            try:
+                self.queue.put_nowait(str(message))
+                self.stats['queued'] += 1
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    self.stats['dropped'] += 1
+                except queue.Empty:
+                    pass
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=10.0):
+        """ 等佇列裡的訊息送完 (或逾時)，回傳是否送完 """
+        deadline = self.clock.time() + timeout
+        while self.queue.unfinished_tasks:
+            if self.clock.time() >= deadline:
+                return False
+            self.clock.sleep(0.05)
+        return True
+
+    def close(self, timeout=10.0):
+        """ 程式結束前呼叫：送完剩下的訊息再停掉背景執行緒 """
+        if self._thread is None:
             return
+        self.flush(timeout)
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        if self.session is not None:
+            self.session.close()
 
+    # ==========================================
+    #  背景執行緒
+    # ==========================================
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = [first]
+            # 等一小段時間，把同一波的訊息收齊 (合併後不能超過字數上限)
+            deadline = self.clock.time() + self.coalesce_window
+            length = len(first)
+            while True:
+                remaining = deadline - self.clock.time()
+                if remaining <= 0:
+                    break
+                try:
+                    message = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if length + len(message) + 2 > MAX_MESSAGE_LENGTH:
+                    self._deliver(batch)
+                    batch, length = [], 0
+                batch.append(message)
+                length += len(message) + 2
+            self._deliver(batch)
+
+    def _deliver(self, batch):
+        if not batch:
+            return
+        text = "\n\n".join(batch)[:MAX_MESSAGE_LENGTH]
         try:
-            payload = {
-                'chat_id': self.chat_id,
-                'text': message,
-                #'parse_mode': 'Markdown' # 支援粗體等格式
-            }
-            response = requests.post(self.base_url, json=payload, timeout=5)
-            
-            if response.status_code != 200:
+            if self._post(text):
+                self.stats['sent'] += len(batch)
+                self.stats['batches'] += 1
+            else:
+                self.stats['failed'] += len(batch)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+
+    def _post(self, text):
+        if self.session is None:
+            self.session = requests.Session()
+        payload = {
+            'chat_id': self.chat_id,
+            'text': text,
+            #'parse_mode': 'Markdown' # 支援粗體等格式
+        }
+        for _ in range(self.max_retries):
+            wait = self._last_sent + self.min_interval - self.clock.time()
+            if wait > 0:
+                self.clock.sleep(wait)
+            try:
+                response = self.session.post(self.base_url, json=payload, timeout=self.timeout)
+                self._last_sent = self.clock.time()
+                if response.status_code == 200:
+                    return True
+                if response.status_code == 429:
+                    # Telegram 限流：回應裡會給要等幾秒
+                    try:
+                        retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                    except ValueError:
+                        retry_after = 1
+                    logging.warning(f"[TELEGRAM] 發送太頻繁，{retry_after} 秒後重送")
+                    self.clock.sleep(float(retry_after))
+                    continue
                 logging.error(f"❌ Telegram 發送失敗: {response.text}")
-        except Exception as e:
-            logging.error(f"❌ Telegram 連線錯誤: {e}")
+                return False
+            except Exception as e:
+                self._last_sent = self.clock.time()
+                logging.error(f"❌ Telegram 連線錯誤: {e}")
+        return False
 
 # 方便外部直接調用
 notifier = TelegramNotifier()
+atexit.register(notifier.close)
 
 def send_tg_msg(msg):
-    notifier.send_message(msg)
\ No newline at end of file
+    notifier.send_message(msg)
@@ -0,0 +1,169 @@
+import logging
+import threading
+
+from utils.clock import system_clock
+
+# 優先權：下單相關的請求永遠排在資料請求前面
+PRIORITY_ORDER = 0
+PRIORITY_DATA = 1
+
+# 幣安合約 REST 各端點的 IP 權重 (依官方文件)
+ENDPOINT_WEIGHTS = {
+    '/fapi/v1/ping': 1,
+    '/fapi/v1/time': 1,
+    '/fapi/v1/exchangeInfo': 1,
+    '/fapi/v1/fundingRate': 1,
+    '/fapi/v1/premiumIndex': 1,
+    '/fapi/v1/order': 1,
+    '/fapi/v1/leverage': 1,
+    '/fapi/v1/listenKey': 1,
+    '/fapi/v1/batchOrders': 5,
+    '/fapi/v1/allOrders': 5,
+    '/fapi/v1/userTrades': 5,
+    '/fapi/v2/account': 5,
+    '/fapi/v2/balance': 5,
+    '/fapi/v2/positionRisk': 5,
+    '/fapi/v3/account': 5,
+    '/fapi/v3/balance': 5,
+    '/fapi/v3/positionRisk': 5,
+}
+
+# 權重依 limit 參數變動的 K 線類端點：(limit 上限, 權重)
+KLINE_PATHS = ('/fapi/v1/klines', '/fapi/v1/continuousKlines',
+               '/fapi/v1/indexPriceKlines', '/fapi/v1/markPriceKlines')
+KLINE_WEIGHTS = ((99, 1), (499, 2), (1000, 5))
+DEPTH_WEIGHTS = ((50, 2), (100, 5), (500, 10))
+
+# 不帶 symbol 時權重大幅提高的端點：(有 symbol, 沒有 symbol)
+SYMBOL_OPTIONAL_WEIGHTS = {
+    '/fapi/v1/ticker/24hr': (1, 40),
+    '/fapi/v1/ticker/price': (1, 2),
+    '/fapi/v2/ticker/price': (1, 2),
+    '/fapi/v1/ticker/bookTicker': (2, 5),
+    '/fapi/v1/openOrders': (1, 40),
+}
+
+# 交易相關端點 (優先權較高)；bookTicker 是掛單重新報價用的，排在資料請求後面就會掛到過時的價格
+ORDER_PATHS = ('/fapi/v1/order', '/fapi/v1/batchOrders', '/fapi/v1/allOpenOrders',
+               '/fapi/v1/leverage', '/fapi/v2/positionRisk', '/fapi/v3/positionRisk', '/fapi/v1/listenKey',
+               '/fapi/v1/ticker/bookTicker')
+
+
+def _tiered(limit, tiers, default):
+    for upper, weight in tiers:
+        if limit <= upper:
+            return weight
+    return default
+
+
+def endpoint_weight(url_path, payload=None):
+    """ 依端點與參數估算這次請求的權重 """
+    payload = payload or {}
+    path = url_path.split('?', 1)[0]
+    if path in KLINE_PATHS:
+        return _tiered(int(payload.get('limit') or 500), KLINE_WEIGHTS, 10)
+    if path == '/fapi/v1/depth':
+        return _tiered(int(payload.get('limit') or 500), DEPTH_WEIGHTS, 20)
+    if path in SYMBOL_OPTIONAL_WEIGHTS:
+        with_symbol, without_symbol = SYMBOL_OPTIONAL_WEIGHTS[path]
+        return with_symbol if payload.get('symbol') else without_symbol
+    return ENDPOINT_WEIGHTS.get(path, 1)
+
+
+def endpoint_priority(url_path):
+    return PRIORITY_ORDER if url_path.split('?', 1)[0] in ORDER_PATHS else PRIORITY_DATA
+
+
+class WeightRateLimiter:
+    """
+    以權重計算的 token bucket
+    - 容量 = 交易所每分鐘上限 x safety，按秒連續回補
+    - 資料請求必須保留 reserve 比例的額度給下單，而且有下單在排隊時資料請求一律讓路
+    - observe_used_weight() 用回應的 X-MBX-USED-WEIGHT-1M 校正 (伺服器的數字為準)
+    - 收到 429 / 418 時依 Retry-After 暫停所有請求
+    - 等待一律透過 clock.sleep，換成 SimulatedClock 就能離線測試
+    """
+
+    def __init__(self, limit=2400, window=60, safety=0.9, reserve=0.1, clock=None, max_sleep=0.5):
+        self.limit = limit
+        self.capacity = limit * safety
+        self.rate = self.capacity / window
+        self.reserve = self.capacity * reserve
+        self.clock = clock or system_clock
+        self.max_sleep = max_sleep
+
+        self.tokens = self.capacity
+        self._last = self.clock.time()
+        self._blocked_until = 0.0
+        self._order_waiters = 0
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'weight': 0, 'waited': 0.0, 'throttled': 0, 'bans': 0}
+
+    def _refill(self, now):
+        if now > self._last:
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def acquire(self, weight=1, priority=PRIORITY_DATA):
+        """ 取得 weight 的額度，不夠就等；回傳實際等待秒數 """
+        waited = 0.0
+        queued = False
+        try:
+            while True:
+                with self._lock:
+                    now = self.clock.time()
+                    self._refill(now)
+                    if now < self._blocked_until:
+                        wait = self._blocked_until - now
+                    else:
+                        floor = 0.0 if priority == PRIORITY_ORDER else self.reserve
+                        # 超過容量的單筆請求只要求桶子是滿的，否則永遠等不到
+                        need = min(weight, self.capacity - floor)
+                        yielding = priority != PRIORITY_ORDER and self._order_waiters > 0
+                        if not yielding and self.tokens - floor >= need:
+                            self.tokens -= weight
+                            self.stats['requests'] += 1
+                            self.stats['weight'] += weight
+                            self.stats['waited'] += waited
+                            if waited > 0:
+                                self.stats['throttled'] += 1
+                            return waited
+                        wait = max((need + floor - self.tokens) / self.rate, 0.001)
+                    if priority == PRIORITY_ORDER and not queued:
+                        self._order_waiters += 1
+                        queued = True
+                wait = min(wait, self.max_sleep)
+                self.clock.sleep(wait)
+                waited += wait
+        finally:
+            if queued:
+                with self._lock:
+                    self._order_waiters -= 1
+
+    def observe_used_weight(self, used):
+        """ 伺服器回報本分鐘已用權重：本地額度不能比伺服器剩下的多 """
+        with self._lock:
+            self._refill(self.clock.time())
+            self.tokens = min(self.tokens, self.capacity - float(used))
+
+    def block_for(self, seconds, banned=False):
+        """ 429 (超限) / 418 (IP 被封) 時暫停所有請求 """
+        with self._lock:
+            until = self.clock.time() + seconds
+            self._blocked_until = max(self._blocked_until, until)
+            self.tokens = min(self.tokens, 0.0)
+            if banned:
+                self.stats['bans'] += 1
+        logging.warning(f"[RATE LIMIT] 收到{'封鎖 (418)' if banned else '限流 (429)'}，暫停請求 {seconds:.0f} 秒")
+
+
+# 每個 API 主機一個共用的 limiter (實盤與測試網的額度分開計算)
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(base_url, **kwargs):
+    with _limiters_lock:
+        if base_url not in _limiters:
+            _limiters[base_url] = WeightRateLimiter(**kwargs)
+        return _limiters[base_url]
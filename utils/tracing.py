@@ -0,0 +1,163 @@
+import functools
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from utils.log_setup import start_queue, stop_queue
+
+# 追蹤檔每行一個 span (tab 分隔)：bar_id  stage  開始時間(epoch 秒)  耗時(ms)
+# bar_id = "<symbol>:<週期>:<K 線開盤時間 ms>" (同一交易對多個週期的 K 線開盤時間會重疊，要帶週期才分得開)，不屬於任何 K 線的 span 為 "-"
+NO_BAR = '-'
+
+
+def bar_id(symbol, interval, bar_time):
+    return f"{symbol}:{interval}:{int(bar_time)}"
+
+
+class Span:
+    """ 一段計時；with 區塊內可以設定 span.bar (例如偵測到新 K 線後才知道是哪一根) """
+
+    __slots__ = ('tracer', 'name', 'bar', 'start', '_t0', '_prev_bar')
+
+    def __init__(self, tracer, name, bar=None):
+        self.tracer = tracer
+        self.name = name
+        self.bar = bar
+
+    def __enter__(self):
+        local = self.tracer._local
+        self._prev_bar = getattr(local, 'bar', None)
+        if self.bar is None:
+            self.bar = self._prev_bar
+        else:
+            local.bar = self.bar # 巢狀的 span 沿用同一個 bar_id
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._t0
+        self.tracer._local.bar = self._prev_bar
+        self.tracer.record(self.name, self.start, duration, self.bar)
+        return False
+
+
+class _NullSpan:
+    """ 追蹤關閉時的 span：什麼都不做 """
+    bar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    輕量的 span 追蹤
+    - span(name, bar) 包住要計時的區塊，同一條執行緒內的巢狀 span 自動帶上外層的 bar_id
+    - 寫檔交給背景執行緒的 RotatingFileHandler (超過 max_bytes 輪替，保留 backups 份)
+    - add_listener(callback) 讓其他模組 (例如 metrics) 收到每一個 span，不必寫檔
+    - 沒有 configure() 也沒有 listener 時 span() 回傳空物件，幾乎沒有成本
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.listeners = [] # callback(name, start, duration_sec, bar)
+        self._to_file = False
+        self._local = threading.local()
+        self._logger = logging.getLogger('trace')
+        self._logger.propagate = False
+
+    def configure(self, path='trace.log', max_bytes=5_000_000, backups=3):
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for old in list(self._logger.handlers):
+            self._logger.removeHandler(old)
+            stop_queue(old)
+            old.close()
+        # 寫檔在背景執行緒做，span 結束時只把紀錄放進佇列
+        self._logger.addHandler(start_queue(handler))
+        self._logger.setLevel(logging.INFO)
+        self.path = path
+        self._to_file = True
+        self.enabled = True
+        logging.info(f"[TRACE] 延遲追蹤寫入 {os.path.abspath(path)}")
+        return self
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self._to_file = False
+        self.listeners = []
+
+    def span(self, name, bar=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, bar)
+
+    def record(self, name, start, duration, bar=None):
+        """ 直接寫入一段已知起訖的 span (例如 K 線收盤 -> 下單回應) """
+        if not self.enabled:
+            return
+        if self._to_file:
+            self._logger.info("%s\t%s\t%.3f\t%.3f", bar or NO_BAR, name, start, duration * 1000)
+        for callback in self.listeners:
+            try:
+                callback(name, start, duration, bar)
+            except Exception as e:
+                logging.debug("[TRACE] listener 失敗: %s", e)
+
+
+# 全域共用
+tracer = Tracer()
+
+
+def span(name, bar=None):
+    return tracer.span(name, bar)
+
+
+def traced(name):
+    """ 函式裝飾器版本的 span """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def read_spans(path):
+    """ 讀回追蹤檔 (含輪替出去的 .1 .2 ...，由舊到新)，回傳 [(bar, name, start, duration_ms)] """
+    files = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        files.append(f"{path}.{n}")
+        n += 1
+    files = files[::-1] + ([path] if os.path.exists(path) else [])
+
+    spans = []
+    for file in files:
+        with open(file, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) != 4:
+                    continue
+                try:
+                    spans.append((parts[0], parts[1], float(parts[2]), float(parts[3])))
+                except ValueError:
+                    continue
+    return spans